@@ -0,0 +1,200 @@
+import os
+import re
+import math
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+MATCH_THRESHOLD = float(os.environ.get('FAQ_MATCH_THRESHOLD', '0.6'))
+STEM_LENGTH = 5
+
+FAQ: List[Dict[str, Any]] = [
+    {
+        'required': (('вывод', 'вывес', 'вывед', 'выплат'),),
+        'questions': [
+            'Как вывести деньги?',
+            'Как вывести средства на карту?',
+            'Какая минимальная сумма вывода?',
+            'С какой суммы можно вывести деньги?',
+        ],
+        'answer': 'Нажмите «Вывести средства» в личном кабинете и укажите сумму. Минимальная сумма вывода — 100₽, деньги поступают на карту в течение 1-2 дней.'
+    },
+    {
+        'required': (('вывод', 'вывес', 'выплат', 'деньг'), ('сколько', 'когда', 'долго', 'срок', 'придут', 'пришл')),
+        'questions': [
+            'Сколько идёт вывод денег?',
+            'Когда придут деньги после вывода?',
+            'Как долго ждать выплату?',
+        ],
+        'answer': 'Выплата поступает на карту в течение 1-2 дней после подтверждения вывода. Если деньги не пришли за это время, напишите в поддержку.'
+    },
+    {
+        'required': (('загруз', 'выпуст', 'опублик', 'отправ', 'выпус'), ('релиз', 'трек', 'музык')),
+        'questions': [
+            'Как загрузить релиз?',
+            'Как выпустить трек?',
+            'Как опубликовать музыку?',
+            'Как отправить релиз на площадки?',
+        ],
+        'answer': 'Нажмите «Загрузить релиз», заполните данные релиза и треков, прикрепите WAV и обложку 3000×3000 и отправьте на модерацию. После проверки релиз появится на площадках за 24-48 часов.'
+    },
+    {
+        'required': (('обложк',),),
+        'questions': [
+            'Какие требования к обложке?',
+            'Какой размер обложки нужен?',
+            'Почему не загружается обложка?',
+        ],
+        'answer': 'Обложка должна быть квадратной, размером ровно 3000×3000 пикселей. Другие размеры площадки не принимают.'
+    },
+    {
+        'required': (('формат', 'mp3', 'wav'),),
+        'questions': [
+            'В каком формате загружать аудио?',
+            'Можно загрузить mp3?',
+            'Какой формат файла нужен для трека?',
+        ],
+        'answer': 'Принимаются только WAV-файлы — так площадки получают звук без потерь качества.'
+    },
+    {
+        'required': (('модерац', 'провер', 'появ'),),
+        'questions': [
+            'Сколько длится модерация?',
+            'Когда релиз появится на площадках?',
+            'Как долго проверяют релиз?',
+        ],
+        'answer': 'Модерация и доставка на площадки обычно занимают 24-48 часов. Статус релиза виден на вкладке «Релизы».'
+    },
+    {
+        'required': (('смартлинк', 'ссылк'), ('созда', 'сдела', 'такое')),
+        'questions': [
+            'Как создать смартлинк?',
+            'Что такое смартлинк?',
+            'Как сделать ссылку на все площадки?',
+        ],
+        'answer': 'Смартлинк — одна страница со ссылками на релиз во всех сервисах. Создайте его на вкладке «Смартлинки»: укажите название релиза, обложку 3000×3000 и ссылки на площадки.'
+    },
+    {
+        'required': (('площадк', 'платформ', 'spotify', 'яндекс'),),
+        'questions': [
+            'На какие площадки вы загружаете музыку?',
+            'Есть ли Spotify и Яндекс Музыка?',
+            'Сколько платформ поддерживается?',
+        ],
+        'answer': 'OLPROD доставляет музыку на 150+ площадок, включая Spotify, Apple Music, VK Музыку и Яндекс Музыку.'
+    },
+    {
+        'required': (('статистик', 'прослушив', 'доход'),),
+        'questions': [
+            'Как посмотреть статистику прослушиваний?',
+            'Где смотреть доход и прослушивания?',
+        ],
+        'answer': 'Прослушивания и доход по каждому релизу отображаются в личном кабинете и обновляются по мере поступления отчётов площадок.'
+    },
+    {
+        'required': (('удал', 'восстанов', 'корзин'), ('релиз',)),
+        'questions': [
+            'Как удалить релиз?',
+            'Как восстановить удалённый релиз?',
+        ],
+        'answer': 'Удалённые релизы попадают в «Корзину», откуда их можно восстановить или удалить навсегда. Окончательное удаление отменить нельзя.'
+    },
+]
+
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace('ё', 'е')
+    text = _PUNCTUATION.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def stems(normalized: str) -> FrozenSet[str]:
+    # Russian inflects word endings; the first STEM_LENGTH letters keep "релиз"/"релизы"/"релиза" together
+    return frozenset(word[:STEM_LENGTH] for word in normalized.split())
+
+
+def has_terms(words: List[str], required: Tuple[Tuple[str, ...], ...]) -> bool:
+    return all(any(word.startswith(prefix) for word in words for prefix in group) for group in required)
+
+
+class Entry(NamedTuple):
+    stems: FrozenSet[str]
+    required: Tuple[Tuple[str, ...], ...]
+    answer: str
+
+
+def _build_index() -> Tuple[List[Entry], Dict[str, float]]:
+    entries = [
+        Entry(stems(normalize(question)), entry['required'], entry['answer'])
+        for entry in FAQ
+        for question in entry['questions']
+    ]
+    # Inverse document frequency over the curated questions: "как" or "релиз" say little, "обложка" a lot
+    counts: Dict[str, int] = {}
+    for entry in entries:
+        for stem in entry.stems:
+            counts[stem] = counts.get(stem, 0) + 1
+    weights = {stem: math.log((len(entries) + 1) / count) for stem, count in counts.items()}
+    return entries, weights
+
+
+_INDEX, _WEIGHTS = _build_index()
+# Words no curated question uses weigh as much as the rarest ones, so off-topic detail lowers the score
+_UNKNOWN_WEIGHT = math.log(len(_INDEX) + 1)
+
+
+def match(normalized: str) -> Optional[Tuple[str, float]]:
+    '''
+    Returns (answer, score) for the closest curated question whose required terms
+    all appear in the message, when their IDF-weighted Dice similarity over word
+    stems reaches MATCH_THRESHOLD.
+    '''
+    words = normalized.split()
+    query = stems(normalized)
+    if not query:
+        return None
+    query_weight = sum(_WEIGHTS.get(stem, _UNKNOWN_WEIGHT) for stem in query)
+    best_answer, best_score = None, 0.0
+    for entry in _INDEX:
+        if not has_terms(words, entry.required):
+            continue
+        shared = sum(_WEIGHTS[stem] for stem in query & entry.stems)
+        score = 2 * shared / (query_weight + sum(_WEIGHTS[stem] for stem in entry.stems))
+        if score > best_score:
+            best_answer, best_score = entry.answer, score
+    if best_answer is None or best_score < MATCH_THRESHOLD:
+        return None
+    return best_answer, best_score
+
+
+if __name__ == '__main__':
+    import sys
+
+    # Paraphrases that must reach their curated answer, and near misses that must go to the LLM instead
+    expected = {
+        'Как загрузить релиз': 'Нажмите «Загрузить релиз»',
+        'Какой размер обложки?': 'Обложка должна быть квадратной',
+        'Можно ли загрузить mp3': 'Принимаются только WAV',
+        'Когда придут деньги?': 'Выплата поступает',
+        'Как вывести деньги на карту': 'Нажмите «Вывести средства»',
+        'Что такое смартлинк': 'Смартлинк — одна страница',
+        'Как восстановить удаленный релиз': 'Удалённые релизы',
+    }
+    unmatched = [
+        'Как восстановить пароль?', 'Как удалить аккаунт?', 'Как изменить релиз?', 'Как отменить релиз?',
+        'Можно загрузить flac?', 'Какой размер аудио?', 'Как удалить смартлинк?', 'Как вывести релиз с площадок?',
+    ]
+    failures = 0
+    for question, prefix in expected.items():
+        found = match(normalize(question))
+        if found is None or not found[0].startswith(prefix):
+            failures += 1
+            print(f'MISS  {question!r} -> {found}')
+    for question in unmatched:
+        found = match(normalize(question))
+        if found is not None:
+            failures += 1
+            print(f'WRONG {question!r} -> {found[0][:40]!r} ({found[1]:.2f})')
+    print(f'{len(expected) + len(unmatched) - failures}/{len(expected) + len(unmatched)} FAQ checks passed')
+    sys.exit(1 if failures else 0)
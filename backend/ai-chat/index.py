@@ -1,62 +1,13 @@
-import json
 import os
-from typing import Dict, Any
+import time
+import hashlib
+import threading
+from typing import Dict, Any, Optional, Tuple
+from cache import TTLCache
+from runtime import Router, Request, respond, error
+import faq
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Business: AI-powered chat support using OpenAI GPT-4
-    Args: event with httpMethod, body containing user message
-          context with request_id
-    Returns: HTTP response with AI answer
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
-    try:
-        body_data = json.loads(event.get('body', '{}'))
-        user_message: str = body_data.get('message', '')
-        
-        if not user_message:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Message is required'})
-            }
-        
-        openai_key = os.environ.get('OPENAI_API_KEY')
-        
-        if not openai_key:
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'response': 'Спасибо за ваш вопрос! Наши специалисты скоро свяжутся с вами. В среднем время ответа — 5-10 минут.'
-                })
-            }
-        
-        import openai
-        
-        client = openai.OpenAI(api_key=openai_key)
-        
-        system_prompt = """Ты — ИИ-ассистент службы поддержки OLPROD, платформы дистрибуции музыки.
+SYSTEM_PROMPT = """Ты — ИИ-ассистент службы поддержки OLPROD, платформы дистрибуции музыки.
 
 OLPROD помогает артистам:
 - Публиковать музыку на 150+ платформах (Spotify, Apple Music, VK Музыка, Яндекс Музыка и др.)
@@ -72,30 +23,166 @@ OLPROD помогает артистам:
 
 Отвечай на русском языке, максимум 2-3 предложения."""
 
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=200,
-            temperature=0.7
-        )
-        
-        ai_response = completion.choices[0].message.content
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'response': ai_response})
-        }
-        
+NO_KEY_RESPONSE = 'Спасибо за ваш вопрос! Наши специалисты скоро свяжутся с вами. В среднем время ответа — 5-10 минут.'
+FALLBACK_RESPONSE = 'Спасибо за ваш вопрос! Наши специалисты скоро свяжутся с вами.'
+
+# Used to estimate time saved until the first real completion is measured
+DEFAULT_LLM_SECONDS = 1.5
+
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_READ_TIMEOUT', '10'))
+MAX_CONCURRENT_CALLS = int(os.environ.get('OPENAI_MAX_CONCURRENCY', '4'))
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_QUEUE_TIMEOUT', '2'))
+
+BUSY_RESPONSE = 'Сейчас много обращений — попробуйте повторить вопрос через минуту.'
+
+answer_cache = TTLCache(
+    max_size=int(os.environ.get('AI_CHAT_CACHE_SIZE', '1000')),
+    ttl=float(os.environ.get('AI_CHAT_CACHE_TTL', '86400'))
+)
+
+_stats_lock = threading.Lock()
+chat_stats: Dict[str, float] = {
+    'requests': 0,
+    'faq_hits': 0,
+    'cache_hits': 0,
+    'llm_calls': 0,
+    'llm_errors': 0,
+    'llm_timeouts': 0,
+    'llm_rejected': 0,
+    'llm_seconds': 0.0,
+    'saved_seconds': 0.0,
+}
+
+_client: Optional[Any] = None
+_client_lock = threading.Lock()
+_llm_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CALLS)
+
+router = Router(route_key=lambda request: request.params.get('mode'))
+
+def record(**increments: float) -> None:
+    with _stats_lock:
+        for name, value in increments.items():
+            chat_stats[name] += value
+
+def average_llm_seconds() -> float:
+    with _stats_lock:
+        calls = chat_stats['llm_calls']
+        return chat_stats['llm_seconds'] / calls if calls else DEFAULT_LLM_SECONDS
+
+def stats_snapshot() -> Dict[str, Any]:
+    with _stats_lock:
+        snapshot = dict(chat_stats)
+    answered_locally = snapshot['faq_hits'] + snapshot['cache_hits']
+    snapshot['hit_rate'] = answered_locally / snapshot['requests'] if snapshot['requests'] else 0.0
+    snapshot['cache'] = answer_cache.stats()
+    return snapshot
+
+def create_client(api_key: str) -> Any:
+    import httpx
+    import openai
+
+    return openai.OpenAI(
+        api_key=api_key,
+        timeout=httpx.Timeout(READ_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+        max_retries=1
+    )
+
+def get_client(api_key: str) -> Any:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client(api_key)
+    return _client
+
+def is_timeout(error: Exception) -> bool:
+    return type(error).__name__ in ('APITimeoutError', 'TimeoutException', 'ReadTimeout', 'ConnectTimeout')
+
+def completion_request(user_message: str) -> Dict[str, Any]:
+    return {
+        'model': 'gpt-4o-mini',
+        'messages': [
+            {'role': 'system', 'content': SYSTEM_PROMPT},
+            {'role': 'user', 'content': user_message}
+        ],
+        'max_tokens': 200,
+        'temperature': 0.7
+    }
+
+def ask_llm(client: Any, user_message: str) -> str:
+    completion = client.chat.completions.create(**completion_request(user_message))
+    return completion.choices[0].message.content
+
+def answer(user_message: str) -> Tuple[str, str]:
+    '''
+    Resolves a message through the FAQ matcher, then the answer cache,
+    then the LLM. Returns (answer, source).
+    '''
+    record(requests=1)
+    normalized = faq.normalize(user_message)
+
+    matched = faq.match(normalized)
+    if matched:
+        record(faq_hits=1, saved_seconds=average_llm_seconds())
+        return matched[0], 'faq'
+
+    key = hashlib.sha256(normalized.encode()).hexdigest()
+    cached = answer_cache.get(key)
+    if cached is not None:
+        record(cache_hits=1, saved_seconds=average_llm_seconds())
+        return cached, 'cache'
+
+    openai_key = os.environ.get('OPENAI_API_KEY')
+    if not openai_key:
+        return NO_KEY_RESPONSE, 'fallback'
+
+    if not _llm_slots.acquire(timeout=QUEUE_TIMEOUT_SECONDS):
+        record(llm_rejected=1)
+        return BUSY_RESPONSE, 'busy'
+
+    started = time.monotonic()
+    try:
+        ai_response = ask_llm(get_client(openai_key), user_message)
     except Exception as e:
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'response': 'Спасибо за ваш вопрос! Наши специалисты скоро свяжутся с вами.'
-            })
-        }
+        if is_timeout(e):
+            record(llm_timeouts=1)
+            return FALLBACK_RESPONSE, 'timeout'
+        record(llm_errors=1)
+        return FALLBACK_RESPONSE, 'fallback'
+    finally:
+        _llm_slots.release()
+
+    record(llm_calls=1, llm_seconds=time.monotonic() - started)
+
+    if ai_response:
+        answer_cache.set(key, ai_response)
+    return ai_response, 'llm'
+
+@router.route('GET', 'stats')
+def get_stats(request: Request) -> Dict[str, Any]:
+    return respond(200, stats_snapshot())
+
+@router.route('POST')
+def chat(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    user_message: str = body_data.get('message', '')
+
+    if not user_message:
+        return error(400, 'Message is required')
+
+    try:
+        ai_response, source = answer(user_message)
+        return respond(200, {'response': ai_response, 'source': source})
+
+    except Exception:
+        return respond(200, {'response': FALLBACK_RESPONSE, 'source': 'fallback'})
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: AI-powered chat support using OpenAI GPT-4 with FAQ and answer cache
+    Args: event with httpMethod, body containing user message
+          context with request_id
+    Returns: HTTP response with AI answer
+    '''
+    return router.dispatch(event, context)
@@ -0,0 +1,170 @@
+import os
+import time
+from typing import Dict, Any, Optional, Tuple
+from datetime import date, timedelta
+from db import connection, pool
+from cache import TTLCache
+from tokens import KEYS, TokenError, token_from_event, verify_token
+from tracing import instrument_pool
+from runtime import Router, Request, BadRequest, Unauthorized, Forbidden, CORS_HEADERS, respond, error
+
+DEFAULT_WINDOW_DAYS = 30
+MAX_WINDOW_DAYS = 1096
+DEFAULT_TOP = 10
+MAX_TOP = 100
+# stats_watermark is re-read at most this often; cache hits in between cost no query
+WATERMARK_INTERVAL = float(os.environ.get('ANALYTICS_WATERMARK_INTERVAL', '5'))
+
+DASHBOARD_HEADERS: Dict[str, str] = {
+    'Content-Type': 'application/json',
+    **CORS_HEADERS,
+    'Access-Control-Expose-Headers': 'X-Cache'
+}
+
+router = Router(allow_headers=('Content-Type', 'X-Auth-Token', 'Authorization'))
+
+instrument_pool(pool)
+
+cache = TTLCache(
+    max_size=int(os.environ.get('ANALYTICS_CACHE_SIZE', '1000')),
+    ttl=float(os.environ.get('ANALYTICS_CACHE_TTL', '300'))
+)
+watermark: Optional[int] = None
+watermark_checked_at = 0.0
+
+DASHBOARD_SQL = """
+    SELECT json_build_object(
+        'userId', %(user_id)s,
+        'from', %(date_from)s::date,
+        'to', %(date_to)s::date,
+        'timeseries', COALESCE((
+            SELECT json_agg(json_build_object('date', stat_date, 'streams', streams, 'revenue', revenue) ORDER BY stat_date)
+            FROM (
+                SELECT stat_date, sum(streams) AS streams, sum(revenue) AS revenue
+                FROM analytics_user_daily
+                WHERE user_id = %(user_id)s AND stat_date BETWEEN %(date_from)s AND %(date_to)s
+                GROUP BY stat_date
+            ) days
+        ), '[]'::json),
+        'platforms', COALESCE((
+            SELECT json_agg(json_build_object('platform', platform, 'streams', streams, 'revenue', revenue) ORDER BY streams DESC)
+            FROM (
+                SELECT platform, sum(streams) AS streams, sum(revenue) AS revenue
+                FROM analytics_user_daily
+                WHERE user_id = %(user_id)s AND stat_date BETWEEN %(date_from)s AND %(date_to)s
+                GROUP BY platform
+            ) platforms
+        ), '[]'::json),
+        'topReleases', COALESCE((
+            SELECT json_agg(json_build_object('releaseId', release_id, 'title', title, 'streams', streams, 'revenue', revenue) ORDER BY streams DESC, release_id)
+            FROM (
+                SELECT a.release_id, r.title, sum(a.streams) AS streams, sum(a.revenue) AS revenue
+                FROM analytics_release_daily a
+                JOIN releases r ON r.id = a.release_id
+                WHERE a.user_id = %(user_id)s AND a.stat_date BETWEEN %(date_from)s AND %(date_to)s
+                GROUP BY a.release_id, r.title
+                ORDER BY streams DESC, a.release_id
+                LIMIT %(top)s
+            ) top_releases
+        ), '[]'::json)
+    )::text
+"""
+
+def parse_window(params: Dict[str, Any]) -> Tuple[date, date]:
+    try:
+        date_to = date.fromisoformat(params['to']) if params.get('to') else date.today()
+        date_from = date.fromisoformat(params['from']) if params.get('from') else date_to - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    except ValueError:
+        raise BadRequest('from/to must be YYYY-MM-DD')
+    if date_from > date_to:
+        raise BadRequest('from must not be after to')
+    if (date_to - date_from).days >= MAX_WINDOW_DAYS:
+        raise BadRequest(f'Window is limited to {MAX_WINDOW_DAYS} days')
+    return date_from, date_to
+
+def parse_top(raw: Optional[str]) -> int:
+    if not raw:
+        return DEFAULT_TOP
+    try:
+        top = int(raw)
+    except ValueError:
+        raise BadRequest('top must be an integer')
+    return max(1, min(top, MAX_TOP))
+
+def authenticate(request: Request) -> Optional[int]:
+    token = token_from_event(request.event)
+    try:
+        if token:
+            return verify_token(token)
+        if KEYS:
+            raise TokenError('Session token required')
+    except TokenError as e:
+        raise Unauthorized(str(e))
+    return None
+
+def resolve_user_id(request: Request, claimed: Any) -> Any:
+    session_user_id = authenticate(request)
+    if session_user_id is None:
+        return claimed
+    if claimed not in (None, '') and str(claimed) != str(session_user_id):
+        raise Forbidden('userId does not match session')
+    return session_user_id
+
+def watermark_due() -> bool:
+    return watermark is None or time.monotonic() - watermark_checked_at >= WATERMARK_INTERVAL
+
+def refresh_watermark(cur: Any) -> None:
+    '''
+    Re-reads stats_watermark, which every ingest bumps on commit. Cached dashboards are
+    keyed on it, so a new report retires them and cache hits need no query in between.
+    '''
+    global watermark, watermark_checked_at
+    cur.execute("SELECT version FROM stats_watermark")
+    row = cur.fetchone()
+    watermark, watermark_checked_at = (row[0] if row else 0), time.monotonic()
+
+@router.route('GET')
+def get_dashboard(request: Request) -> Dict[str, Any]:
+    params = request.params
+    user_id = resolve_user_id(request, params.get('userId'))
+
+    if not user_id:
+        return error(400, 'userId required')
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        raise BadRequest('userId must be an integer')
+    date_from, date_to = parse_window(params)
+    top = parse_top(params.get('top'))
+
+    if not watermark_due():
+        body = cache.get((watermark, user_id, date_from, date_to, top))
+        if body is not None:
+            return respond(200, headers={**DASHBOARD_HEADERS, 'X-Cache': 'HIT'}, body=body)
+
+    with connection() as conn, conn.cursor() as cur:
+        if watermark_due():
+            refresh_watermark(cur)
+        key = (watermark, user_id, date_from, date_to, top)
+        body = cache.get(key)
+        cache_status = 'HIT'
+        if body is None:
+            cache_status = 'MISS'
+            cur.execute(DASHBOARD_SQL, {
+                'user_id': user_id,
+                'date_from': date_from,
+                'date_to': date_to,
+                'top': top
+            })
+            body = cur.fetchone()[0]
+            cache.set(key, body)
+
+    return respond(200, headers={**DASHBOARD_HEADERS, 'X-Cache': cache_status}, body=body)
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Artist analytics dashboard (streams/revenue by day, platform and release)
+    Args: event with httpMethod, headers (X-Auth-Token session token), queryStringParameters (userId, from, to, top)
+    Returns: HTTP response with timeseries, platform breakdown and top releases
+    '''
+    return router.dispatch(event, context)
@@ -0,0 +1,209 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+ENABLED = os.environ.get('REQUEST_TRACE', '') == '1'
+SLOW_QUERY_MS = float(os.environ.get('TRACE_SLOW_QUERY_MS', '200'))
+EXPLAIN_SLOW = os.environ.get('TRACE_EXPLAIN', '') == '1'
+MAX_QUERY_TEXT = 2000
+
+_local = threading.local()
+_noop = nullcontext()
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r'(\([^()]*\))(?:\s*,\s*\([^()]*\))+')
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete', 'declare')
+
+
+class Trace:
+    __slots__ = ('route', 'started', 'phases', 'queries', 'slow')
+
+    def __init__(self, route: str) -> None:
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.queries: Dict[str, Dict[str, Any]] = {}
+        self.slow: List[Dict[str, Any]] = []
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+def current() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+
+def phase(name: str) -> Any:
+    '''
+    Times a block into the current request's phase totals. Outside a traced
+    request this is a shared no-op context manager.
+    '''
+    trace = current() if ENABLED else None
+    if trace is None:
+        return _noop
+    return _timed(trace, name)
+
+
+@contextmanager
+def _timed(trace: Trace, name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def normalize_sql(query: Any) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    text = _LITERALS.sub('?', str(query))
+    text = _VALUE_LISTS.sub(r'\1, ...', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def record_query(conn: Any, query: Any, vars: Any, seconds: float) -> None:
+    trace = current()
+    if trace is None:
+        return
+    trace.add('query', seconds)
+    text = normalize_sql(query)
+    key = fingerprint(text)
+    entry = trace.queries.get(key)
+    if entry is None:
+        entry = trace.queries[key] = {'fingerprint': key, 'sql': text[:120], 'calls': 0, 'ms': 0.0}
+    entry['calls'] += 1
+    entry['ms'] += seconds * 1000
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow: Dict[str, Any] = {'fingerprint': key, 'ms': round(seconds * 1000, 2), 'sql': text[:MAX_QUERY_TEXT]}
+        if EXPLAIN_SLOW:
+            slow['plan'] = explain(conn, query, vars)
+        trace.slow.append(slow)
+
+
+def explain(conn: Any, query: Any, vars: Any) -> Any:
+    '''
+    Plans (without executing) a slow statement on the same connection. A savepoint
+    keeps a failing EXPLAIN from aborting the handler's transaction.
+    '''
+    import psycopg2
+    import psycopg2.extensions
+
+    if isinstance(query, bytes):
+        query = query.decode('utf-8')
+    elif not isinstance(query, str):
+        query = query.as_string(conn)
+    if not query.lstrip().lower().startswith(_EXPLAINABLE):
+        return None
+    in_transaction = conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    cur = psycopg2.extensions.connection.cursor(conn)
+    try:
+        if in_transaction:
+            cur.execute('SAVEPOINT trace_explain')
+        try:
+            cur.execute('EXPLAIN (FORMAT JSON) ' + query, vars)
+            plan = cur.fetchone()[0]
+        except psycopg2.Error as e:
+            if in_transaction:
+                cur.execute('ROLLBACK TO SAVEPOINT trace_explain')
+            return {'error': str(e).strip()}
+        if in_transaction:
+            cur.execute('RELEASE SAVEPOINT trace_explain')
+        return plan
+    finally:
+        cur.close()
+
+
+def instrument_pool(pool: Any) -> None:
+    '''
+    Makes a db.ConnectionPool report acquire time as the "connect" phase and hand
+    out connections whose cursors time every statement. No-op unless REQUEST_TRACE=1.
+    '''
+    if not ENABLED:
+        return
+    import psycopg2.extensions
+
+    class TracingCursorMixin:
+        def execute(self, query: Any, vars: Any = None) -> Any:
+            started = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                record_query(self.connection, query, vars, time.perf_counter() - started)
+
+        def executemany(self, query: Any, vars_list: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                record_query(self.connection, query, None, time.perf_counter() - started)
+
+        def copy_expert(self, sql: Any, file: Any, size: int = 8192) -> Any:
+            started = time.perf_counter()
+            try:
+                return super().copy_expert(sql, file, size)
+            finally:
+                record_query(self.connection, sql, None, time.perf_counter() - started)
+
+    cursor_classes: Dict[type, type] = {}
+
+    class TracingConnection(psycopg2.extensions.connection):
+        def cursor(self, *args: Any, **kwargs: Any) -> Any:
+            factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+            traced = cursor_classes.get(factory)
+            if traced is None:
+                traced = cursor_classes[factory] = type(f'Tracing{factory.__name__}', (TracingCursorMixin, factory), {})
+            kwargs['cursor_factory'] = traced
+            return super().cursor(*args, **kwargs)
+
+    acquire = pool.acquire
+
+    def traced_acquire() -> Any:
+        with phase('connect'):
+            return acquire()
+
+    pool.connection_factory = TracingConnection
+    pool.acquire = traced_acquire
+
+
+def begin(route: str) -> Trace:
+    trace = _local.trace = Trace(route)
+    return trace
+
+
+def finish(trace: Trace, response: Dict[str, Any], request_id: Optional[str] = None) -> None:
+    '''
+    Writes one JSON line per request to stdout, where the platform collects function logs.
+    '''
+    _local.trace = None
+    total = time.perf_counter() - trace.started
+    queries = sorted(trace.queries.values(), key=lambda q: -q['ms'])
+    phases = dict(trace.phases, app=max(0.0, total - sum(trace.phases.values())))
+    line = {
+        'trace': 'request',
+        'requestId': request_id,
+        'route': trace.route,
+        'status': response.get('statusCode'),
+        'totalMs': round(total * 1000, 2),
+        'phasesMs': {name: round(seconds * 1000, 2) for name, seconds in phases.items()},
+        'queryCount': sum(q['calls'] for q in queries),
+        'queries': [dict(q, ms=round(q['ms'], 2)) for q in queries],
+        'responseBytes': len((response.get('body') or '').encode()),
+    }
+    if trace.slow:
+        line['slowQueries'] = trace.slow
+    try:
+        sys.stdout.write(json.dumps(line, ensure_ascii=False, default=str) + '\n')
+        sys.stdout.flush()
+    except (OSError, ValueError):
+        pass
@@ -1,188 +1,107 @@
-import json
-import os
 import hashlib
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import pool, connection
+from tokens import ACTIVE_KID, issue_token
+from runtime import Router, Request, respond, error
+from tracing import instrument_pool
+
+router = Router(route_key=lambda request: request.json.get('action'))
+
+instrument_pool(pool)
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
+def session_response(user: Dict[str, Any]) -> Dict[str, Any]:
+    return respond(200, {
+        'success': True,
+        'user': {
+            'id': user['id'],
+            'email': user['email'],
+            'artistName': user['artist_name']
+        },
+        'token': issue_token(user['id']) if ACTIVE_KID else None
+    })
+
+@router.route('POST', 'register')
+def register(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    email = body_data.get('email', '').strip()
+    password = body_data.get('password', '')
+    artist_name = body_data.get('artistName', '').strip()
+
+    if not email or not password or not artist_name:
+        return error(400, 'Заполните все поля')
+
+    password_hash = hash_password(password)
+
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id FROM users WHERE email = %s", (email,))
+        existing_user = cur.fetchone()
+
+        if existing_user:
+            return error(400, 'Email уже зарегистрирован')
+
+        cur.execute(
+            "INSERT INTO users (email, password_hash, artist_name) VALUES (%s, %s, %s) RETURNING id, email, artist_name",
+            (email, password_hash, artist_name)
+        )
+        user = cur.fetchone()
+        conn.commit()
+
+    return session_response(user)
+
+@router.route('POST', 'reset_password')
+def reset_password(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    email = body_data.get('email', '').strip()
+    new_password = body_data.get('newPassword', '')
+
+    if not email or not new_password:
+        return error(400, 'Заполните все поля')
+
+    password_hash = hash_password(new_password)
+
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id FROM users WHERE email = %s", (email,))
+        user = cur.fetchone()
+
+        if not user:
+            return error(400, 'Email не зарегистрирован')
+
+        cur.execute("UPDATE users SET password_hash = %s WHERE email = %s", (password_hash, email))
+        conn.commit()
+
+    return respond(200, {'success': True, 'message': 'Пароль успешно изменён'})
+
+@router.route('POST', 'login')
+def login(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    email = body_data.get('email', '').strip()
+    password = body_data.get('password', '')
+
+    if not email or not password:
+        return error(400, 'Заполните все поля')
+
+    password_hash = hash_password(password)
+
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id, email, artist_name, password_hash FROM users WHERE email = %s", (email,))
+        user = cur.fetchone()
+
+    if not user:
+        return error(400, 'Email не зарегистрирован')
+
+    if user['password_hash'] != password_hash:
+        return error(400, 'Неверный пароль')
+
+    return session_response(user)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: User authentication and registration
     Args: event with httpMethod, body (email, password, artistName for register)
-    Returns: HTTP response with user data or error
+    Returns: HTTP response with user data and signed session token, or error
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    body_data = json.loads(event.get('body', '{}'))
-    action = body_data.get('action')
-    
-    database_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(database_url)
-    
-    try:
-        if action == 'register':
-            email = body_data.get('email', '').strip()
-            password = body_data.get('password', '')
-            artist_name = body_data.get('artistName', '').strip()
-            
-            if not email or not password or not artist_name:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Заполните все поля'}),
-                    'isBase64Encoded': False
-                }
-            
-            password_hash = hash_password(password)
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id FROM users WHERE email = %s", (email,))
-                existing_user = cur.fetchone()
-                
-                if existing_user:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Email уже зарегистрирован'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cur.execute(
-                    "INSERT INTO users (email, password_hash, artist_name) VALUES (%s, %s, %s) RETURNING id, email, artist_name",
-                    (email, password_hash, artist_name)
-                )
-                user = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'success': True,
-                        'user': {
-                            'id': user['id'],
-                            'email': user['email'],
-                            'artistName': user['artist_name']
-                        }
-                    }),
-                    'isBase64Encoded': False
-                }
-        
-        elif action == 'reset_password':
-            email = body_data.get('email', '').strip()
-            new_password = body_data.get('newPassword', '')
-            
-            if not email or not new_password:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Заполните все поля'}),
-                    'isBase64Encoded': False
-                }
-            
-            password_hash = hash_password(new_password)
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id FROM users WHERE email = %s", (email,))
-                user = cur.fetchone()
-                
-                if not user:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Email не зарегистрирован'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cur.execute("UPDATE users SET password_hash = %s WHERE email = %s", (password_hash, email))
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'message': 'Пароль успешно изменён'}),
-                    'isBase64Encoded': False
-                }
-        
-        elif action == 'login':
-            email = body_data.get('email', '').strip()
-            password = body_data.get('password', '')
-            
-            if not email or not password:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Заполните все поля'}),
-                    'isBase64Encoded': False
-                }
-            
-            password_hash = hash_password(password)
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id, email, artist_name, password_hash FROM users WHERE email = %s", (email,))
-                user = cur.fetchone()
-                
-                if not user:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Email не зарегистрирован'}),
-                        'isBase64Encoded': False
-                    }
-                
-                if user['password_hash'] != password_hash:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Неверный пароль'}),
-                        'isBase64Encoded': False
-                    }
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'success': True,
-                        'user': {
-                            'id': user['id'],
-                            'email': user['email'],
-                            'artistName': user['artist_name']
-                        }
-                    }),
-                    'isBase64Encoded': False
-                }
-        
-        else:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid action'}),
-                'isBase64Encoded': False
-            }
-    
-    finally:
-        conn.close()
\ No newline at end of file
+    return router.dispatch(event, context)
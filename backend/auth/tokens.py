@@ -0,0 +1,106 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+from typing import Any, Dict, Optional, Tuple
+
+TOKEN_VERSION = 'v1'
+TOKEN_TTL_SECONDS = int(os.environ.get('SESSION_TOKEN_TTL', str(7 * 24 * 3600)))
+
+
+class TokenError(ValueError):
+    pass
+
+
+def load_keys() -> Tuple[Optional[str], Dict[str, bytes]]:
+    '''
+    Reads signing keys from SESSION_KEYS ("kid:secret,kid:secret"). The first key
+    signs new tokens; every listed key is accepted so old ones can be rotated out.
+    SESSION_SECRET alone is treated as a single key with kid "k0".
+    '''
+    raw = os.environ.get('SESSION_KEYS', '')
+    keys: Dict[str, bytes] = {}
+    active: Optional[str] = None
+    for item in raw.split(','):
+        kid, _, secret = item.strip().partition(':')
+        if kid and secret:
+            keys[kid] = secret.encode()
+            active = active or kid
+    if not keys and os.environ.get('SESSION_SECRET'):
+        keys['k0'] = os.environ['SESSION_SECRET'].encode()
+        active = 'k0'
+    return active, keys
+
+
+ACTIVE_KID, KEYS = load_keys()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(key: bytes, message: str) -> str:
+    return _b64encode(hmac.new(key, message.encode(), hashlib.sha256).digest()[:24])
+
+
+def issue_token(user_id: int, ttl: int = TOKEN_TTL_SECONDS) -> str:
+    if not ACTIVE_KID:
+        raise TokenError('Session keys are not configured')
+    payload = _b64encode(json.dumps({'sub': user_id, 'exp': int(time.time()) + ttl}, separators=(',', ':')).encode())
+    message = f'{TOKEN_VERSION}.{ACTIVE_KID}.{payload}'
+    return f'{message}.{_sign(KEYS[ACTIVE_KID], message)}'
+
+
+def verify_token(token: str) -> int:
+    '''
+    Checks signature and expiry in memory and returns the user id.
+    '''
+    # Tokens are base64url segments; anything else would reach compare_digest as a non-ASCII str
+    if not token.isascii():
+        raise TokenError('Malformed token')
+    try:
+        version, kid, payload, signature = token.split('.')
+    except ValueError:
+        raise TokenError('Malformed token')
+    key = KEYS.get(kid)
+    if version != TOKEN_VERSION or key is None:
+        raise TokenError('Unknown token key')
+    if not hmac.compare_digest(signature, _sign(key, f'{version}.{kid}.{payload}')):
+        raise TokenError('Invalid token signature')
+    try:
+        claims: Dict[str, Any] = json.loads(_b64decode(payload))
+        user_id, expires_at = int(claims['sub']), int(claims['exp'])
+    except (ValueError, KeyError, TypeError):
+        raise TokenError('Malformed token')
+    if expires_at < time.time():
+        raise TokenError('Token expired')
+    return user_id
+
+
+def token_from_event(event: Dict[str, Any]) -> Optional[str]:
+    for key, value in (event.get('headers') or {}).items():
+        name = key.lower()
+        if name == 'x-auth-token' and value:
+            return value
+        if name == 'authorization' and value and value.lower().startswith('bearer '):
+            return value[7:].strip()
+    return None
+
+
+if __name__ == '__main__':
+    import timeit
+
+    if not ACTIVE_KID:
+        KEYS['bench'] = os.urandom(32)
+        ACTIVE_KID = 'bench'
+    sample = issue_token(42)
+    runs = 100000
+    seconds = timeit.timeit(lambda: verify_token(sample), number=runs)
+    print(f'token: {sample} ({len(sample)} bytes)')
+    print(f'verify_token: {seconds / runs * 1e6:.2f} us per call over {runs} runs')
@@ -0,0 +1,85 @@
+import os
+import time
+import random
+import hashlib
+import threading
+from typing import Any, Dict
+
+DEFAULT_PLATFORMS = (
+    'Spotify', 'Apple Music', 'Яндекс Музыка', 'VK Музыка', 'YouTube Music',
+    'Deezer', 'Tidal', 'Amazon Music', 'Звук', 'МТС Музыка',
+)
+
+STUB_LATENCY_SECONDS = float(os.environ.get('DISTRIBUTION_STUB_LATENCY_MS', '50')) / 1000
+STUB_FAILURE_RATE = float(os.environ.get('DISTRIBUTION_STUB_FAILURE_RATE', '0.05'))
+DEFAULT_RATE_PER_SECOND = float(os.environ.get('DISTRIBUTION_RATE_PER_SECOND', '20'))
+
+
+class DeliveryError(Exception):
+    '''
+    Delivery failed but may succeed later (timeouts, 5xx, throttling on the platform side).
+    '''
+
+
+class PermanentDeliveryError(DeliveryError):
+    '''
+    The platform rejected the release; retrying the same payload will not help.
+    '''
+
+
+class PlatformAdapter:
+    '''
+    Delivers one release to one platform. deliver() must be idempotent per key:
+    a retried or re-leased job sends the same key and gets the original delivery id.
+    '''
+
+    def __init__(self, name: str, rate_per_second: float = DEFAULT_RATE_PER_SECOND) -> None:
+        self.name = name
+        self.rate_per_second = rate_per_second
+
+    def deliver(self, release: Dict[str, Any], idempotency_key: str) -> str:
+        raise NotImplementedError
+
+
+class StubAdapter(PlatformAdapter):
+    '''
+    Local stand-in for a platform API: sleeps for the configured latency, fails
+    transiently at the configured rate and remembers deliveries by idempotency key.
+    '''
+
+    def __init__(self, name: str, rate_per_second: float = DEFAULT_RATE_PER_SECOND,
+                 latency: float = STUB_LATENCY_SECONDS, failure_rate: float = STUB_FAILURE_RATE) -> None:
+        super().__init__(name, rate_per_second)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.deliveries: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def deliver(self, release: Dict[str, Any], idempotency_key: str) -> str:
+        if not release.get('title'):
+            raise PermanentDeliveryError('Release title is required')
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise DeliveryError(f'{self.name} timed out')
+        with self._lock:
+            self.deliveries[idempotency_key] = self.deliveries.get(idempotency_key, 0) + 1
+        return hashlib.sha1(f'{self.name}:{idempotency_key}'.encode()).hexdigest()[:16]
+
+
+def load_adapters() -> Dict[str, PlatformAdapter]:
+    '''
+    Platforms come from DISTRIBUTION_PLATFORMS ("name:rate,name:rate", rate per second
+    optional). Only stub adapters exist until platform credentials are configured.
+    '''
+    raw = os.environ.get('DISTRIBUTION_PLATFORMS', '')
+    adapters: Dict[str, PlatformAdapter] = {}
+    for item in raw.split(','):
+        name, _, rate = item.strip().partition(':')
+        if name:
+            adapters[name] = StubAdapter(name, float(rate) if rate else DEFAULT_RATE_PER_SECOND)
+    if not adapters:
+        adapters = {name: StubAdapter(name) for name in DEFAULT_PLATFORMS}
+    return adapters
+
+
+ADAPTERS = load_adapters()
@@ -0,0 +1,97 @@
+import os
+import hmac
+from typing import Dict, Any, List, Optional
+from db import pool
+from adapters import ADAPTERS
+from jobs import enqueue, release_jobs
+from worker import WorkerPool
+from tokens import KEYS, TokenError, token_from_event, verify_token
+from tracing import instrument_pool
+from runtime import Router, Request, BadRequest, Unauthorized, Forbidden, NotFound, HttpError, respond, error
+
+WORKER_KEY = os.environ.get('DISTRIBUTION_WORKER_KEY', '')
+# A scheduled mode=work call drains the queue for this long, leaving headroom under the function timeout
+WORK_SECONDS = float(os.environ.get('DISTRIBUTION_WORK_SECONDS', '20'))
+
+router = Router(
+    route_key=lambda request: request.params.get('mode'),
+    allow_headers=('Content-Type', 'X-Auth-Token', 'Authorization', 'X-Worker-Key')
+)
+
+instrument_pool(pool)
+
+workers = WorkerPool()
+
+def authenticate(request: Request) -> Optional[int]:
+    token = token_from_event(request.event)
+    try:
+        if token:
+            return verify_token(token)
+        if KEYS:
+            raise TokenError('Session token required')
+    except TokenError as e:
+        raise Unauthorized(str(e))
+    return None
+
+def resolve_user_id(request: Request, claimed: Any) -> Any:
+    session_user_id = authenticate(request)
+    if session_user_id is None:
+        return claimed
+    if claimed not in (None, '') and str(claimed) != str(session_user_id):
+        raise Forbidden('userId does not match session')
+    return session_user_id
+
+def parse_platforms(raw: Any) -> List[str]:
+    if raw is None:
+        return list(ADAPTERS)
+    if not isinstance(raw, list) or not raw:
+        raise BadRequest('platforms must be a non-empty list')
+    unknown = [name for name in raw if name not in ADAPTERS]
+    if unknown:
+        raise BadRequest(f"Unknown platforms: {', '.join(map(str, unknown))}")
+    return list(dict.fromkeys(raw))
+
+@router.route('POST', 'work')
+def work_queue(request: Request) -> Dict[str, Any]:
+    if not WORKER_KEY:
+        raise HttpError('Worker key is not configured', 503)
+    if not hmac.compare_digest((request.header('X-Worker-Key') or '').encode(), WORKER_KEY.encode()):
+        raise Forbidden('Worker key required')
+    return respond(200, {'stats': workers.run(WORK_SECONDS, drain=True), 'pool': pool.stats()})
+
+@router.route('POST')
+def submit_release(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    release_id = body_data.get('releaseId')
+    user_id = resolve_user_id(request, body_data.get('userId'))
+
+    if not release_id or not user_id:
+        return error(400, 'releaseId and userId required')
+
+    queued = enqueue(user_id, release_id, parse_platforms(body_data.get('platforms')))
+    if queued is None:
+        raise NotFound('Release not found')
+
+    return respond(200, {'success': True, 'queued': queued})
+
+@router.route('GET')
+def get_jobs(request: Request) -> Dict[str, Any]:
+    params = request.params
+    release_id = params.get('releaseId')
+    user_id = resolve_user_id(request, params.get('userId'))
+
+    if not release_id or not user_id:
+        return error(400, 'releaseId and userId required')
+    if not release_id.isdigit():
+        raise BadRequest('releaseId must be an integer')
+
+    return respond(200, {'releaseId': int(release_id), 'jobs': release_jobs(user_id, release_id)})
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Queue releases for delivery to streaming platforms and run the delivery workers
+    Args: event with httpMethod, headers (X-Auth-Token session token; X-Worker-Key for mode=work),
+          queryStringParameters (releaseId, userId for GET; mode=work), body (userId, releaseId, optional platforms)
+    Returns: HTTP response with queued job count, per-platform job statuses or worker run stats
+    '''
+    return router.dispatch(event, context)
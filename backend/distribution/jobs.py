@@ -0,0 +1,193 @@
+import os
+from typing import Any, Dict, List, Optional
+from psycopg2.extras import RealDictCursor
+from cache import SharedTier
+from db import autocommit, connection
+
+# The releases function's shared listing cache; a status change here changes the account's
+# listing. Instances' in-process copies still lag by up to RELEASES_CACHE_TTL seconds
+listings = SharedTier.from_env(ttl=int(os.environ.get('RELEASES_CACHE_TTL', '30')))
+
+# Jobs for the release's current content share a key per platform, so re-submitting an
+# unchanged release only retries failed deliveries; older queued or failed revisions are superseded.
+# Reverting to an earlier revision re-queues its superseded jobs (a delivered job is superseded
+# once a newer revision reaches that platform). The release goes back to moderation only when a
+# job was actually queued; when nothing was and every live job is delivered, for instance a revert
+# that only cancels a pending revision, it is published again rather than left in moderation
+ENQUEUE_SQL = """
+    WITH release AS (
+        SELECT id, md5(concat_ws('|', title, genre, release_date, music_author, lyrics_author, audio_url, cover_url)) AS revision
+        FROM releases
+        WHERE id = %(release_id)s AND user_id = %(user_id)s AND status <> 'Удалён'
+        FOR UPDATE
+    ), keys AS (
+        SELECT release.id AS release_id, platform, release.id || ':' || platform || ':' || release.revision AS idempotency_key
+        FROM release, unnest(%(platforms)s::text[]) AS platform
+    ), superseded AS (
+        UPDATE distribution_jobs j SET status = 'superseded', updated_at = CURRENT_TIMESTAMP
+        FROM keys
+        WHERE j.release_id = keys.release_id AND j.platform = keys.platform
+          AND j.idempotency_key <> keys.idempotency_key AND j.status IN ('queued', 'failed')
+    ), queued AS (
+        INSERT INTO distribution_jobs (release_id, platform, idempotency_key)
+        SELECT release_id, platform, idempotency_key FROM keys
+        ON CONFLICT (idempotency_key) DO UPDATE
+        SET status = 'queued', attempts = 0, run_at = CURRENT_TIMESTAMP, last_error = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE distribution_jobs.status IN ('failed', 'superseded')
+        RETURNING id
+    ), moderated AS (
+        UPDATE releases r SET status = 'На модерации', updated_at = CURRENT_TIMESTAMP
+        FROM release
+        WHERE r.id = release.id AND EXISTS (SELECT 1 FROM queued)
+    ), published AS (
+        UPDATE releases r SET status = 'Опубликован', updated_at = CURRENT_TIMESTAMP
+        FROM release
+        WHERE r.id = release.id AND r.status = 'На модерации' AND NOT EXISTS (SELECT 1 FROM queued)
+          AND NOT EXISTS (
+              SELECT 1 FROM distribution_jobs j
+              WHERE j.release_id = release.id AND j.status NOT IN ('delivered', 'superseded')
+                AND NOT EXISTS (
+                    SELECT 1 FROM keys
+                    WHERE keys.platform = j.platform AND keys.idempotency_key <> j.idempotency_key
+                      AND j.status IN ('queued', 'failed')
+                )
+          )
+    )
+    SELECT (SELECT count(*) FROM release) AS found, (SELECT count(*) FROM queued) AS queued
+"""
+
+# Oldest due jobs first; SKIP LOCKED lets every worker claim a disjoint batch without waiting
+CLAIM_SQL = """
+    WITH claimed AS (
+        SELECT j.id, r.title, r.genre, r.release_date, r.music_author, r.lyrics_author, r.audio_url, r.cover_url
+        FROM distribution_jobs j
+        LEFT JOIN releases r ON r.id = j.release_id
+        WHERE j.status = 'queued' AND j.run_at <= CURRENT_TIMESTAMP AND j.platform <> ALL(%(throttled)s::text[])
+        ORDER BY j.run_at
+        LIMIT %(limit)s
+        FOR UPDATE OF j SKIP LOCKED
+    )
+    UPDATE distribution_jobs j
+    SET status = 'running', attempts = j.attempts + 1,
+        locked_until = CURRENT_TIMESTAMP + %(lease)s * interval '1 second', updated_at = CURRENT_TIMESTAMP
+    FROM claimed
+    WHERE j.id = claimed.id
+    RETURNING j.id, j.release_id, j.platform, j.idempotency_key, j.attempts, j.max_attempts,
+              claimed.title, claimed.genre, claimed.release_date, claimed.music_author,
+              claimed.lyrics_author, claimed.audio_url, claimed.cover_url
+"""
+
+# attempts counts claims, so a job whose worker keeps dying fails once they are used up
+REQUEUE_EXPIRED_SQL = """
+    UPDATE distribution_jobs
+    SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+        last_error = CASE WHEN attempts >= max_attempts THEN 'Worker lease expired on every attempt' ELSE last_error END,
+        locked_until = NULL, updated_at = CURRENT_TIMESTAMP
+    WHERE status = 'running' AND locked_until < CURRENT_TIMESTAMP
+    RETURNING status
+"""
+
+# attempts fences the update: a worker whose lease expired and was re-claimed changes nothing.
+# The platform now holds this revision, so earlier deliveries there are superseded
+COMPLETE_SQL = """
+    WITH done AS (
+        UPDATE distribution_jobs
+        SET status = 'delivered', external_id = %(external_id)s, locked_until = NULL,
+            last_error = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %(job_id)s AND attempts = %(attempts)s AND status = 'running'
+        RETURNING release_id, platform
+    ), replaced AS (
+        UPDATE distribution_jobs j SET status = 'superseded', updated_at = CURRENT_TIMESTAMP
+        FROM done
+        WHERE j.release_id = done.release_id AND j.platform = done.platform
+          AND j.id <> %(job_id)s AND j.status = 'delivered'
+    )
+    UPDATE releases r SET status = 'Опубликован', updated_at = CURRENT_TIMESTAMP
+    FROM done
+    WHERE r.id = done.release_id AND r.status = 'На модерации'
+      AND NOT EXISTS (
+          SELECT 1 FROM distribution_jobs j
+          WHERE j.release_id = r.id AND j.id <> %(job_id)s AND j.status NOT IN ('delivered', 'superseded')
+      )
+    RETURNING r.user_id
+"""
+
+FAIL_SQL = """
+    UPDATE distribution_jobs
+    SET status = CASE WHEN %(permanent)s OR attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+        run_at = CURRENT_TIMESTAMP + %(delay)s * interval '1 second',
+        locked_until = NULL, last_error = %(error)s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(job_id)s AND attempts = %(attempts)s AND status = 'running'
+    RETURNING status
+"""
+
+JOBS_SQL = """
+    SELECT j.platform, j.status, j.attempts, j.external_id, j.last_error, j.run_at, j.updated_at
+    FROM distribution_jobs j
+    JOIN releases r ON r.id = j.release_id
+    WHERE j.release_id = %s AND r.user_id = %s AND j.status <> 'superseded'
+    ORDER BY j.platform, j.id
+"""
+
+
+def enqueue(user_id: Any, release_id: Any, platforms: List[str]) -> Optional[int]:
+    '''
+    Queues one job per platform and, if any job was queued, moves the release to
+    moderation, in a single statement. Returns the number of new jobs, or None if the
+    release is not the user's.
+    '''
+    with autocommit() as conn, conn.cursor() as cur:
+        cur.execute(ENQUEUE_SQL, {'user_id': user_id, 'release_id': release_id, 'platforms': platforms})
+        found, queued = cur.fetchone()
+    if found and listings:
+        listings.delete(f'releases:{user_id}')
+    return queued if found else None
+
+
+def claim(limit: int, lease_seconds: float, throttled: List[str]) -> List[Dict[str, Any]]:
+    with autocommit() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(CLAIM_SQL, {'limit': limit, 'lease': lease_seconds, 'throttled': throttled})
+        return cur.fetchall()
+
+
+def requeue_expired() -> int:
+    '''
+    Returns expired leases to the queue, failing jobs that have no attempts left.
+    Returns the number re-queued.
+    '''
+    with autocommit() as conn, conn.cursor() as cur:
+        cur.execute(REQUEUE_EXPIRED_SQL)
+        return sum(1 for (status,) in cur.fetchall() if status == 'queued')
+
+
+def complete(job: Dict[str, Any], external_id: str) -> bool:
+    '''
+    Marks the job delivered and publishes the release once every platform has it.
+    The release row is locked first so the last two deliveries of a release cannot
+    both miss each other and leave it unpublished. Returns True if it was published.
+    '''
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM releases WHERE id = %s FOR UPDATE", (job['release_id'],))
+        cur.execute(COMPLETE_SQL, {'job_id': job['id'], 'attempts': job['attempts'], 'external_id': external_id})
+        row = cur.fetchone()
+        conn.commit()
+    if row and listings:
+        listings.delete(f'releases:{row[0]}')
+    return row is not None
+
+
+def fail(job: Dict[str, Any], error: str, permanent: bool, delay: float) -> Optional[str]:
+    '''
+    Schedules a retry after delay seconds, or marks the job failed when the error is
+    permanent or attempts are exhausted. Returns the new status.
+    '''
+    with autocommit() as conn, conn.cursor() as cur:
+        cur.execute(FAIL_SQL, {'job_id': job['id'], 'attempts': job['attempts'], 'error': error[:1000], 'permanent': permanent, 'delay': delay})
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def release_jobs(user_id: Any, release_id: Any) -> List[Dict[str, Any]]:
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(JOBS_SQL, (release_id, user_id))
+        return cur.fetchall()
@@ -0,0 +1,166 @@
+import os
+import time
+import random
+import threading
+from typing import Any, Dict, List, Optional
+import psycopg2
+from db import pool
+from adapters import ADAPTERS, PermanentDeliveryError, PlatformAdapter
+import jobs
+
+WORKERS = int(os.environ.get('DISTRIBUTION_WORKERS', '8'))
+CLAIM_BATCH = int(os.environ.get('DISTRIBUTION_CLAIM_BATCH', '4'))
+LEASE_SECONDS = float(os.environ.get('DISTRIBUTION_LEASE_SECONDS', '120'))
+POLL_SECONDS = float(os.environ.get('DISTRIBUTION_POLL_SECONDS', '1'))
+BACKOFF_BASE_SECONDS = float(os.environ.get('DISTRIBUTION_BACKOFF_BASE', '30'))
+BACKOFF_MAX_SECONDS = float(os.environ.get('DISTRIBUTION_BACKOFF_MAX', '3600'))
+
+
+class RateLimiter:
+    '''
+    Token bucket: rate tokens per second, holding at most burst tokens.
+    '''
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def ready(self) -> bool:
+        with self._lock:
+            self._refill()
+            return self._tokens >= 1
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff(attempts: int) -> float:
+    '''
+    Exponential backoff with jitter, so a platform outage does not come back as a thundering herd.
+    '''
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class WorkerPool:
+    '''
+    Threads that claim jobs with FOR UPDATE SKIP LOCKED and deliver them through the
+    platform adapters. Several pools (function instances, CLI runs) can share one queue:
+    a job is only ever leased to one worker, and an expired lease is re-queued.
+    Rate limits are per platform and per pool.
+    '''
+
+    def __init__(self, adapters: Dict[str, PlatformAdapter] = ADAPTERS, workers: int = WORKERS,
+                 batch: int = CLAIM_BATCH, lease_seconds: float = LEASE_SECONDS, poll_seconds: float = POLL_SECONDS) -> None:
+        self.adapters = adapters
+        self.workers = workers
+        self.batch = batch
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.limiters = {name: RateLimiter(adapter.rate_per_second) for name, adapter in adapters.items()}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._stats: Dict[str, int] = {'claimed': 0, 'delivered': 0, 'retried': 0, 'failed': 0, 'published': 0, 'requeued': 0, 'errors': 0}
+        pool.max_size = max(pool.max_size, workers)
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += value
+
+    def throttled(self) -> List[str]:
+        return [name for name, limiter in self.limiters.items() if not limiter.ready()]
+
+    def process(self, job: Dict[str, Any]) -> None:
+        adapter = self.adapters.get(job['platform'])
+        try:
+            if adapter is None:
+                raise PermanentDeliveryError(f"No adapter for platform {job['platform']}")
+            self.limiters[job['platform']].acquire()
+            external_id = adapter.deliver(job, job['idempotency_key'])
+        except Exception as e:
+            # Anything but a PermanentDeliveryError (adapter bugs included) is retried with backoff
+            status = jobs.fail(job, f'{type(e).__name__}: {e}', isinstance(e, PermanentDeliveryError), backoff(job['attempts']))
+            self._count('failed' if status == 'failed' else 'retried')
+            return
+        self._count('delivered')
+        if jobs.complete(job, external_id):
+            self._count('published')
+
+    def _work(self, deadline: float, drain: bool) -> None:
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            throttled = self.throttled()
+            try:
+                claimed = jobs.claim(self.batch, self.lease_seconds, throttled)
+            except psycopg2.Error:
+                self._count('errors')
+                claimed = []
+            if not claimed:
+                # Busy workers may still schedule retries, so draining waits for them
+                with self._lock:
+                    idle = self._active == 0
+                if drain and idle and not throttled:
+                    return
+                self._stop.wait(self.poll_seconds)
+                continue
+            with self._lock:
+                self._active += 1
+                self._stats['claimed'] += len(claimed)
+            try:
+                for job in claimed:
+                    try:
+                        self.process(job)
+                    except psycopg2.Error:
+                        # The job stays leased and is re-queued once the lease expires
+                        self._count('errors')
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def run(self, seconds: float, drain: bool = False) -> Dict[str, int]:
+        '''
+        Works the queue for up to seconds. With drain, each worker stops as soon
+        as nothing is due instead of polling until the deadline.
+        '''
+        self._stop.clear()
+        self._count('requeued', jobs.requeue_expired())
+        deadline = time.monotonic() + seconds
+        threads = [threading.Thread(target=self._work, args=(deadline, drain), daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.stats()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run distribution workers against DATABASE_URL')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--drain', action='store_true', help='stop once nothing is due')
+    args = parser.parse_args()
+    print(WorkerPool(workers=args.workers).run(args.seconds, args.drain))
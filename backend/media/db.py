@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+import psycopg2
+import psycopg2.extensions
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+PING_AFTER_IDLE_SECONDS = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+
+class ConnectionPool:
+    '''
+    Keeps up to max_size idle Postgres connections alive between warm invocations.
+    Connections are checked before reuse and rolled back when returned mid-transaction.
+    '''
+
+    def __init__(self, max_size: int = POOL_MAX_SIZE, connection_factory: Optional[type] = None) -> None:
+        self.max_size = max_size
+        self.connection_factory = connection_factory
+        self._idle: List[Tuple[psycopg2.extensions.connection, float]] = []
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            'connects': 0,
+            'reuses': 0,
+            'discards': 0,
+            'rollbacks': 0,
+        }
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        conn = psycopg2.connect(os.environ.get('DATABASE_URL'), connection_factory=self.connection_factory)
+        with self._lock:
+            self._stats['connects'] += 1
+        return conn
+
+    def _is_healthy(self, conn: psycopg2.extensions.connection, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < PING_AFTER_IDLE_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: psycopg2.extensions.connection) -> None:
+        with self._lock:
+            self._stats['discards'] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self) -> psycopg2.extensions.connection:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, idle_since = self._idle.pop()
+            if self._is_healthy(conn, idle_since):
+                with self._lock:
+                    self._stats['reuses'] += 1
+                return conn
+            self._discard(conn)
+        return self._connect()
+
+    def release(self, conn: psycopg2.extensions.connection) -> None:
+        if conn.closed:
+            self._discard(conn)
+            return
+        status = conn.info.transaction_status
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            self._discard(conn)
+            return
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn)
+                return
+            with self._lock:
+                self._stats['rollbacks'] += 1
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._discard(conn)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle))
+
+
+pool = ConnectionPool()
+
+
+def get_connection() -> psycopg2.extensions.connection:
+    return pool.acquire()
+
+
+def put_connection(conn: Optional[psycopg2.extensions.connection]) -> None:
+    if conn is not None:
+        pool.release(conn)
+
+
+@contextmanager
+def connection() -> Iterator[psycopg2.extensions.connection]:
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def autocommit() -> Iterator[psycopg2.extensions.connection]:
+    '''
+    Connection for single-statement writes: no BEGIN/COMMIT round trips, and row
+    locks are held only while that statement runs.
+    '''
+    conn = pool.acquire()
+    conn.autocommit = True
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            conn.autocommit = False
+        pool.release(conn)
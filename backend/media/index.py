@@ -0,0 +1,183 @@
+import os
+import re
+import uuid
+import base64
+import binascii
+from typing import Dict, Any, List, Optional
+from db import pool
+from pipeline import describe, process
+from store import store
+from tokens import KEYS, TokenError, token_from_event, verify_token
+from tracing import instrument_pool
+from runtime import Router, Request, BadRequest, Unauthorized, Forbidden, NotFound, respond, error
+import uploads
+
+# Gateway bodies are capped at a few MB and chunks arrive base64-encoded, so 2 MiB of raw bytes fits with headroom
+CHUNK_BYTES = int(os.environ.get('MEDIA_CHUNK_BYTES', str(2 * 1024 * 1024)))
+MAX_BYTES = {
+    'cover': int(os.environ.get('MEDIA_MAX_COVER_BYTES', str(20 * 1024 * 1024))),
+    'audio': int(os.environ.get('MEDIA_MAX_AUDIO_BYTES', str(1024 * 1024 * 1024))),
+}
+MAX_COMPLETE_UPLOADS = 20
+# An upload stuck in processing this long belongs to a crashed invocation and may be completed again
+STALE_SECONDS = float(os.environ.get('MEDIA_STALE_SECONDS', '300'))
+SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+router = Router(
+    route_key=lambda request: request.params.get('mode'),
+    allow_headers=('Content-Type', 'X-Auth-Token', 'Authorization')
+)
+
+instrument_pool(pool)
+
+def authenticate(request: Request) -> Optional[int]:
+    token = token_from_event(request.event)
+    try:
+        if token:
+            return verify_token(token)
+        if KEYS:
+            raise TokenError('Session token required')
+    except TokenError as e:
+        raise Unauthorized(str(e))
+    return None
+
+def resolve_user_id(request: Request, claimed: Any) -> Any:
+    session_user_id = authenticate(request)
+    if session_user_id is None:
+        return claimed
+    if claimed not in (None, '') and str(claimed) != str(session_user_id):
+        raise Forbidden('userId does not match session')
+    return session_user_id
+
+def parse_upload_id(raw: Any) -> str:
+    try:
+        return str(uuid.UUID(str(raw)))
+    except ValueError:
+        raise BadRequest('uploadId must be a UUID')
+
+def parse_upload_ids(body_data: Dict[str, Any]) -> List[str]:
+    raw = body_data.get('uploadIds')
+    if raw is None:
+        raw = [body_data['uploadId']] if body_data.get('uploadId') else []
+    if not isinstance(raw, list) or not raw:
+        raise BadRequest('uploadId or uploadIds required')
+    if len(raw) > MAX_COMPLETE_UPLOADS:
+        raise BadRequest(f'At most {MAX_COMPLETE_UPLOADS} uploadIds per request')
+    return list(dict.fromkeys(parse_upload_id(upload_id) for upload_id in raw))
+
+def chunk_bytes(request: Request) -> bytes:
+    # Binary bodies arrive base64-encoded by the gateway; text-only clients base64 the chunk themselves
+    try:
+        return base64.b64decode(request.event.get('body') or '', validate=True)
+    except (binascii.Error, ValueError):
+        raise BadRequest('Chunk body must be binary or base64')
+
+def upload_state(upload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'uploadId': upload['id'], 'status': upload['status'], 'sizeBytes': upload['size_bytes'],
+        'receivedBytes': upload['received_bytes'], 'chunkSize': CHUNK_BYTES, 'error': upload['error'],
+    }
+
+@router.route('POST', 'complete')
+def complete_uploads(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    user_id = resolve_user_id(request, body_data.get('userId'))
+    upload_ids = parse_upload_ids(body_data)
+
+    if not user_id:
+        return error(400, 'userId required')
+
+    claimed = uploads.claim(user_id, upload_ids, STALE_SECONDS)
+    claimed_ids = {upload['id'] for upload in claimed}
+    return respond(200, {
+        'results': process(claimed),
+        'notReady': [upload_id for upload_id in upload_ids if upload_id not in claimed_ids],
+    })
+
+@router.route('POST')
+def start_upload(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    user_id = resolve_user_id(request, body_data.get('userId'))
+    release_id = body_data.get('releaseId')
+    track_id = body_data.get('trackId')
+    kind = body_data.get('kind')
+    file_name = str(body_data.get('fileName') or '').strip()
+    size = body_data.get('size')
+    sha256 = str(body_data.get('sha256') or '').lower()
+
+    if not release_id or not user_id or not file_name:
+        return error(400, 'releaseId, userId and fileName required')
+    if kind not in MAX_BYTES:
+        raise BadRequest('kind must be cover or audio')
+    if track_id is not None and (kind != 'audio' or not isinstance(track_id, int)):
+        raise BadRequest('trackId must be an integer and only applies to audio')
+    if not isinstance(size, int) or not 0 < size <= MAX_BYTES[kind]:
+        raise BadRequest(f'size must be between 1 and {MAX_BYTES[kind]} bytes')
+    if sha256 and not SHA256.match(sha256):
+        raise BadRequest('sha256 must be a hex SHA-256 digest')
+
+    upload = uploads.start(user_id, release_id, track_id, kind, file_name[:500], size)
+    if upload is None:
+        raise NotFound('Release or track not found')
+
+    media = uploads.owned_object(user_id, sha256, kind) if sha256 else None
+    if media and media['size_bytes'] == size:
+        # Already stored: attach the existing object and skip the transfer entirely
+        url = store.url(media['storage_key'])
+        uploads.finish(upload, 'duplicate', media, url)
+        return respond(200, describe(dict(upload, status='duplicate'), media, url))
+
+    return respond(200, upload_state(upload))
+
+@router.route('PUT')
+def upload_chunk(request: Request) -> Dict[str, Any]:
+    params = request.params
+    user_id = resolve_user_id(request, params.get('userId'))
+    upload_id = parse_upload_id(params.get('uploadId'))
+    offset = params.get('offset', '')
+
+    if not user_id:
+        return error(400, 'userId required')
+    if not offset.isdigit():
+        raise BadRequest('offset must be a non-negative integer')
+    offset = int(offset)
+    data = chunk_bytes(request)
+    if not data or len(data) > CHUNK_BYTES:
+        raise BadRequest(f'Chunk must be between 1 and {CHUNK_BYTES} bytes')
+
+    upload = uploads.write_chunk(upload_id, user_id, offset, data)
+    if upload is None:
+        raise NotFound('Upload not found')
+    if upload['received_bytes'] >= offset + len(data):
+        # Written now, or a retry of a chunk that already landed: either way the client moves on
+        return respond(200, upload_state(upload))
+    if upload['status'] != 'uploading':
+        return respond(409, dict(upload_state(upload), error=f"Upload is {upload['status']}"))
+    if offset + len(data) > upload['size_bytes']:
+        raise BadRequest('Chunk runs past the declared size')
+    # The client is ahead of what was stored; it resumes from receivedBytes
+    return respond(409, dict(upload_state(upload), error='Chunk does not start at receivedBytes'))
+
+@router.route('GET')
+def get_upload(request: Request) -> Dict[str, Any]:
+    params = request.params
+    user_id = resolve_user_id(request, params.get('userId'))
+    upload_id = parse_upload_id(params.get('uploadId'))
+
+    if not user_id:
+        return error(400, 'userId required')
+
+    upload = uploads.get(upload_id, user_id)
+    if upload is None:
+        raise NotFound('Upload not found')
+    return respond(200, upload_state(upload))
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Resumable chunked uploads of release covers and audio, with validation, checksums, metadata and thumbnails
+    Args: event with httpMethod, headers (X-Auth-Token session token), queryStringParameters (uploadId, userId, offset
+          for PUT; mode=complete), body (POST: userId, releaseId, trackId, kind, fileName, size, optional sha256;
+          PUT: chunk bytes; mode=complete: userId, uploadId or uploadIds)
+    Returns: HTTP response with upload state (receivedBytes to resume from) or processed media per upload
+    '''
+    return router.dispatch(event, context)
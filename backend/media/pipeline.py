@@ -0,0 +1,75 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+from processing import analyze
+from store import store, object_key
+import uploads
+
+PROCESSES = int(os.environ.get('MEDIA_PROCESSES', str(min(4, os.cpu_count() or 1))))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def executor() -> ProcessPoolExecutor:
+    '''
+    One pool per warm instance. Workers are forked: they only read upload files
+    and never touch the database connections they inherit.
+    '''
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(PROCESSES, mp_context=multiprocessing.get_context('fork'))
+    return _executor
+
+
+def describe(upload: Dict[str, Any], media: Optional[Dict[str, Any]] = None, url: Optional[str] = None) -> Dict[str, Any]:
+    result: Dict[str, Any] = {'uploadId': upload['id'], 'status': upload['status'], 'error': upload.get('error')}
+    if media:
+        thumbnail = media.get('thumbnail_key')
+        result.update({
+            'sha256': media['sha256'], 'url': url, 'thumbnailUrl': store.url(thumbnail) if thumbnail else None,
+            'format': media['format'], 'sizeBytes': media['size_bytes'], 'width': media.get('width'),
+            'height': media.get('height'), 'durationSeconds': media.get('duration_seconds'),
+            'sampleRate': media.get('sample_rate'), 'channels': media.get('channels'),
+            'bitsPerSample': media.get('bits_per_sample'), 'rmsDbfs': media.get('rms_dbfs'), 'peakDbfs': media.get('peak_dbfs'),
+        })
+    return result
+
+
+def store_result(upload: Dict[str, Any], media: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Promotes an analysed upload to its content address and attaches it. Content that
+    is already stored is dropped, and the release points at the existing object.
+    '''
+    if 'error' in media:
+        store.discard(upload['id'])
+        uploads.finish(upload, 'rejected', error=media['error'])
+        return describe(dict(upload, status='rejected', error=media['error']))
+
+    media['storage_key'] = object_key(media['sha256'], media['extension'])
+    status = 'done' if store.promote(upload['id'], media['storage_key']) else 'duplicate'
+    url = store.url(media['storage_key'])
+    uploads.finish(upload, status, media, url)
+    return describe(dict(upload, status=status), media, url)
+
+
+def process(claimed: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    '''
+    Analyses claimed uploads in parallel: hashing, validation, metadata and thumbnails
+    run in the process pool, the database writes stay in this process.
+    '''
+    global _executor
+    # The row may count bytes another instance stored; those uploads go back to uploading
+    incomplete = [upload for upload in claimed if store.received(upload['id']) != upload['size_bytes']]
+    results = {upload['id']: describe(dict(uploads.resume(upload), error='Upload is incomplete; resume from receivedBytes'))
+               for upload in incomplete}
+    futures = [(upload, executor().submit(analyze, store.upload_path(upload['id']), upload['kind']))
+               for upload in claimed if upload['id'] not in results]
+    try:
+        results.update((upload['id'], store_result(upload, future.result())) for upload, future in futures)
+        return [results[upload['id']] for upload in claimed]
+    except BrokenProcessPool:
+        # A worker died (out of memory on a hostile image, say); the claims go stale and can be retried
+        _executor = None
+        raise
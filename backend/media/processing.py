@@ -0,0 +1,263 @@
+import os
+import math
+import struct
+import hashlib
+import warnings
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+with warnings.catch_warnings():
+    # Deprecated since 3.11 and gone in 3.13; loudness is simply left out without it
+    warnings.simplefilter('ignore', DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+from store import store, thumbnail_key
+
+READ_SIZE = 1024 * 1024
+THUMBNAIL_SIZE = int(os.environ.get('MEDIA_THUMBNAIL_SIZE', '600'))
+MIN_COVER_PIXELS = int(os.environ.get('MEDIA_MIN_COVER_PIXELS', '1400'))
+MAX_COVER_PIXELS = int(os.environ.get('MEDIA_MAX_COVER_PIXELS', '6000'))
+MIN_SAMPLE_RATE = 44100
+MIN_BITS_PER_SAMPLE = 16
+
+EXTENSIONS = {'png': '.png', 'jpeg': '.jpg', 'wav': '.wav', 'flac': '.flac'}
+KIND_FORMATS = {'cover': ('png', 'jpeg'), 'audio': ('wav', 'flac')}
+
+if Image is not None:
+    # Pillow's own bomb check backs up the header check in cover_info: it warns past this
+    # many pixels and raises DecompressionBombError past twice as many
+    Image.MAX_IMAGE_PIXELS = MAX_COVER_PIXELS * MAX_COVER_PIXELS
+    DECODE_ERRORS: Tuple[type, ...] = (Image.DecompressionBombError,)
+else:
+    DECODE_ERRORS = ()
+
+# WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT and WAVE_FORMAT_EXTENSIBLE (24-bit masters use the latter)
+WAV_PCM, WAV_FLOAT, WAV_EXTENSIBLE = 1, 3, 0xFFFE
+# JPEG start-of-frame markers; C4, C8 and CC share the range but are not frames
+JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class MediaError(Exception):
+    '''
+    The file is not a cover or audio file we accept; the message is shown to the user.
+    '''
+
+
+def sniff(head: bytes) -> Optional[str]:
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head.startswith(b'fLaC'):
+        return 'flac'
+    return None
+
+
+def checksums(path: str) -> Tuple[str, str]:
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                break
+            sha256.update(block)
+            md5.update(block)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def png_size(f: BinaryIO) -> Tuple[int, int]:
+    f.seek(16)
+    return struct.unpack('>II', f.read(8))
+
+
+def jpeg_size(f: BinaryIO) -> Tuple[int, int]:
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise MediaError('Corrupt JPEG file')
+        if marker[1] in (0x01, 0xFF) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker[1] in JPEG_SOF:
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def make_thumbnail(path: str, sha256: str) -> Optional[str]:
+    if Image is None:
+        return None
+    key = thumbnail_key(sha256, THUMBNAIL_SIZE)
+    target = store.path(key)
+    if os.path.exists(target):
+        return key
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Image.open(path) as image:
+        # draft() lets JPEG decode at reduced scale instead of inflating a 3000px master
+        image.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        image = image.convert('RGB')
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        image.save(target + '.tmp', 'JPEG', quality=85, optimize=True)
+    os.replace(target + '.tmp', target)
+    return key
+
+
+def cover_info(path: str, fmt: str) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        width, height = png_size(f) if fmt == 'png' else jpeg_size(f)
+    if width != height:
+        raise MediaError(f'Cover must be square, got {width}x{height}')
+    if width < MIN_COVER_PIXELS:
+        raise MediaError(f'Cover must be at least {MIN_COVER_PIXELS}x{MIN_COVER_PIXELS}, got {width}x{height}')
+    if width > MAX_COVER_PIXELS:
+        raise MediaError(f'Cover must be at most {MAX_COVER_PIXELS}x{MAX_COVER_PIXELS}, got {width}x{height}')
+    return {'width': width, 'height': height}
+
+
+def wav_chunks(f: BinaryIO) -> Tuple[Dict[str, int], int, int]:
+    '''
+    Walks the RIFF chunks and returns the fmt fields plus the offset and size of the
+    sample data, without reading the samples themselves.
+    '''
+    f.seek(12)
+    fmt: Optional[Dict[str, int]] = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise MediaError('WAV file has no data chunk')
+        chunk_id, size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            raw = f.read(size)
+            tag, channels, rate, _, block_align, bits = struct.unpack('<HHIIHH', raw[:16])
+            if tag == WAV_EXTENSIBLE and len(raw) >= 26:
+                tag = struct.unpack('<H', raw[24:26])[0]
+            fmt = {'tag': tag, 'channels': channels, 'rate': rate, 'block_align': block_align, 'bits': bits}
+            f.seek(size % 2, os.SEEK_CUR)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise MediaError('WAV data chunk precedes its format chunk')
+            return fmt, f.tell(), size
+        else:
+            f.seek(size + size % 2, os.SEEK_CUR)
+
+
+def loudness(f: BinaryIO, offset: int, size: int, width: int) -> Tuple[Optional[float], Optional[float]]:
+    '''
+    RMS and peak level in dBFS, accumulated block by block so memory stays flat
+    whatever the length of the track.
+    '''
+    if audioop is None:
+        return None, None
+    full_scale = float(1 << (8 * width - 1))
+    block = READ_SIZE - READ_SIZE % width
+    squares, samples, peak = 0.0, 0, 0
+    f.seek(offset)
+    remaining = size - size % width
+    while remaining > 0:
+        data = f.read(min(block, remaining))
+        if not data:
+            break
+        data = data[:len(data) - len(data) % width]
+        remaining -= len(data)
+        if width == 1:
+            # 8-bit WAV samples are unsigned
+            data = audioop.bias(data, 1, -128)
+        count = len(data) // width
+        squares += float(audioop.rms(data, width)) ** 2 * count
+        samples += count
+        peak = max(peak, audioop.max(data, width))
+    if not samples:
+        return None, None
+
+    def dbfs(level: float) -> float:
+        return round(20 * math.log10(level / full_scale), 2) if level else -120.0
+
+    return dbfs(math.sqrt(squares / samples)), dbfs(peak)
+
+
+def wav_info(path: str) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        fmt, offset, size = wav_chunks(f)
+        if fmt['tag'] not in (WAV_PCM, WAV_FLOAT) or not fmt['block_align'] or not fmt['rate']:
+            raise MediaError('WAV must be uncompressed PCM')
+        size = min(size, os.path.getsize(path) - offset)
+        width = fmt['bits'] // 8
+        rms, peak = loudness(f, offset, size, width) if fmt['tag'] == WAV_PCM and 1 <= width <= 4 else (None, None)
+    return {
+        'duration_seconds': round(size / fmt['block_align'] / fmt['rate'], 3),
+        'sample_rate': fmt['rate'], 'channels': fmt['channels'], 'bits_per_sample': fmt['bits'],
+        'rms_dbfs': rms, 'peak_dbfs': peak,
+    }
+
+
+def flac_info(path: str) -> Dict[str, Any]:
+    '''
+    Reads STREAMINFO, which FLAC requires to be the first metadata block. Loudness
+    needs a decoder and is left empty.
+    '''
+    with open(path, 'rb') as f:
+        f.seek(4)
+        block_type, length = f.read(1)[0] & 0x7F, int.from_bytes(f.read(3), 'big')
+        if block_type != 0 or length < 34:
+            raise MediaError('FLAC file has no STREAMINFO block')
+        info = int.from_bytes(f.read(34)[10:18], 'big')
+    rate = info >> 44
+    channels = ((info >> 41) & 0x7) + 1
+    bits = ((info >> 36) & 0x1F) + 1
+    total = info & 0xFFFFFFFFF
+    if not rate:
+        raise MediaError('FLAC STREAMINFO has no sample rate')
+    return {
+        'duration_seconds': round(total / rate, 3) if total else None,
+        'sample_rate': rate, 'channels': channels, 'bits_per_sample': bits,
+        'rms_dbfs': None, 'peak_dbfs': None,
+    }
+
+
+def audio_info(path: str, fmt: str) -> Dict[str, Any]:
+    info = wav_info(path) if fmt == 'wav' else flac_info(path)
+    if info['sample_rate'] < MIN_SAMPLE_RATE or info['bits_per_sample'] < MIN_BITS_PER_SAMPLE:
+        raise MediaError(f"Audio must be at least {MIN_SAMPLE_RATE} Hz / {MIN_BITS_PER_SAMPLE}-bit, "
+                         f"got {info['sample_rate']} Hz / {info['bits_per_sample']}-bit")
+    return info
+
+
+def analyze(path: str, kind: str) -> Dict[str, Any]:
+    '''
+    Runs in a worker process: validates the file, hashes it and extracts metadata.
+    Returns {'error': ...} instead of raising, so one bad file in a batch does not
+    cost the others their results. Covers also get a JPEG thumbnail when Pillow is
+    installed.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            fmt = sniff(f.read(16))
+        if fmt not in KIND_FORMATS[kind]:
+            raise MediaError('Cover must be PNG or JPEG' if kind == 'cover' else 'Audio must be WAV or FLAC')
+        sha256, md5 = checksums(path)
+        result: Dict[str, Any] = {'sha256': sha256, 'md5': md5, 'format': fmt, 'extension': EXTENSIONS[fmt],
+                                  'size_bytes': os.path.getsize(path)}
+        if kind == 'cover':
+            result.update(cover_info(path, fmt))
+            result['thumbnail_key'] = make_thumbnail(path, sha256)
+        else:
+            result.update(audio_info(path, fmt))
+        return result
+    except MediaError as e:
+        return {'error': str(e)}
+    except DECODE_ERRORS:
+        # Not an OSError: a cover whose header lies about its size would otherwise escape
+        # the worker and leave the upload stuck in processing
+        return {'error': f'Cover is too large to decode, at most {MAX_COVER_PIXELS}x{MAX_COVER_PIXELS} is accepted'}
+    except (OSError, struct.error, ValueError) as e:
+        return {'error': f'Unreadable {kind} file: {e}'}
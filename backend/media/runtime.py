@@ -0,0 +1,211 @@
+import json
+import base64
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+import tracing
+
+CORS_HEADERS: Dict[str, str] = {'Access-Control-Allow-Origin': '*'}
+JSON_HEADERS: Dict[str, str] = {'Content-Type': 'application/json', **CORS_HEADERS}
+
+
+class HttpError(Exception):
+    status = 500
+
+    def __init__(self, message: str, status: Optional[int] = None) -> None:
+        super().__init__(message)
+        if status is not None:
+            self.status = status
+
+
+class BadRequest(HttpError):
+    status = 400
+
+
+class Unauthorized(HttpError):
+    status = 401
+
+
+class Forbidden(HttpError):
+    status = 403
+
+
+class NotFound(HttpError):
+    status = 404
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload: Any) -> str:
+    '''
+    Serializes with orjson when it is installed, stdlib json otherwise.
+    Decimal and date/datetime values are handled in both cases.
+    '''
+    with tracing.phase('serialize'):
+        if orjson is not None:
+            return orjson.dumps(payload, default=_default).decode()
+        return json.dumps(payload, default=_default)
+
+
+def respond(status: int, payload: Any = None, headers: Optional[Dict[str, str]] = None, body: Optional[str] = None) -> Dict[str, Any]:
+    if body is None:
+        body = '' if payload is None else dumps(payload)
+    return {
+        'statusCode': status,
+        'headers': headers or JSON_HEADERS,
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+
+def error(status: int, message: str) -> Dict[str, Any]:
+    return respond(status, {'error': message})
+
+
+class Request:
+    '''
+    Parsed view of a cloud function event. Headers are lower-cased once and
+    the JSON body is decoded at most once, on first access.
+    '''
+
+    __slots__ = ('event', 'context', 'method', 'params', 'headers', '_body', '_json')
+
+    def __init__(self, event: Dict[str, Any], context: Any) -> None:
+        self.event = event
+        self.context = context
+        self.method: str = event.get('httpMethod', 'GET')
+        self.params: Dict[str, str] = event.get('queryStringParameters') or {}
+        self.headers: Dict[str, str] = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        self._body: Optional[str] = None
+        self._json: Optional[Dict[str, Any]] = None
+
+    def header(self, name: str) -> Optional[str]:
+        return self.headers.get(name.lower())
+
+    @property
+    def body(self) -> str:
+        if self._body is None:
+            body = self.event.get('body') or ''
+            if self.event.get('isBase64Encoded'):
+                body = base64.b64decode(body).decode('utf-8')
+            self._body = body
+        return self._body
+
+    @property
+    def json(self) -> Dict[str, Any]:
+        if self._json is None:
+            try:
+                data = json.loads(self.body or '{}') if orjson is None else orjson.loads(self.body or '{}')
+            except ValueError:
+                raise BadRequest('Invalid JSON body')
+            if not isinstance(data, dict):
+                raise BadRequest('JSON body must be an object')
+            self._json = data
+        return self._json
+
+
+RouteHandler = Callable[[Request], Dict[str, Any]]
+
+
+class Router:
+    '''
+    Dispatches requests through a (method, route key) table. route_key picks the
+    sub-route (an action or mode) for a request; routes registered without a
+    name catch everything else for that method.
+    '''
+
+    def __init__(self, route_key: Optional[Callable[[Request], Optional[str]]] = None, allow_headers: Iterable[str] = ('Content-Type',)) -> None:
+        self.route_key = route_key
+        self.allow_headers = ', '.join(allow_headers)
+        self.routes: Dict[Tuple[str, Optional[str]], RouteHandler] = {}
+        self._preflight: Optional[Dict[str, Any]] = None
+
+    def route(self, method: str, name: Optional[str] = None) -> Callable[[RouteHandler], RouteHandler]:
+        def register(func: RouteHandler) -> RouteHandler:
+            self.routes[(method, name)] = func
+            self._preflight = None
+            return func
+        return register
+
+    def preflight(self) -> Dict[str, Any]:
+        if self._preflight is None:
+            methods = sorted({method for method, _ in self.routes} | {'OPTIONS'})
+            self._preflight = respond(200, headers={
+                **CORS_HEADERS,
+                'Access-Control-Allow-Methods': ', '.join(methods),
+                'Access-Control-Allow-Headers': self.allow_headers,
+                'Access-Control-Max-Age': '86400'
+            })
+        return self._preflight
+
+    def handle(self, request: Request) -> Dict[str, Any]:
+        if request.method == 'OPTIONS':
+            return self.preflight()
+        try:
+            name = self.route_key(request) if self.route_key else None
+            func = self.routes.get((request.method, name)) or self.routes.get((request.method, None))
+            if func is None:
+                if any(method == request.method for method, _ in self.routes):
+                    return error(400, 'Invalid action')
+                return error(405, 'Method not allowed')
+            if tracing.ENABLED:
+                tracing.current().route = func.__name__
+            return func(request)
+        except HttpError as e:
+            return error(e.status, str(e))
+
+    def dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        request = Request(event, context)
+        if not tracing.ENABLED:
+            return self.handle(request)
+        trace = tracing.begin(request.method)
+        response: Dict[str, Any] = {}
+        try:
+            response = self.handle(request)
+            return response
+        finally:
+            tracing.finish(trace, response, getattr(context, 'request_id', None))
+
+
+if __name__ == '__main__':
+    import timeit
+
+    rows = [
+        {
+            'id': i, 'title': f'Release {i}', 'genre': 'Pop', 'releaseDate': date(2024, 1, 1),
+            'description': '', 'musicAuthor': 'Author', 'lyricsAuthor': 'Author',
+            'audioUrl': None, 'coverUrl': None, 'status': 'Черновик',
+            'streams': i * 10, 'revenue': Decimal('12.34')
+        }
+        for i in range(100)
+    ]
+
+    def legacy() -> Dict[str, Any]:
+        converted = [dict(r, releaseDate=r['releaseDate'].isoformat(), revenue=float(r['revenue'])) for r in rows]
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'releases': converted}),
+            'isBase64Encoded': False
+        }
+
+    router = Router()
+    router.route('GET')(lambda request: respond(200, {'releases': rows}))
+    event = {'httpMethod': 'GET', 'queryStringParameters': {'userId': '1'}, 'headers': {'Content-Type': 'application/json'}}
+
+    runs = 2000
+    for label, func in (('legacy', legacy), ('runtime', lambda: router.dispatch(event, None))):
+        seconds = timeit.timeit(func, number=runs)
+        print(f'{label:8s} {seconds / runs * 1e6:8.1f} us per request (100 releases, orjson={orjson is not None})')
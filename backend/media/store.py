@@ -0,0 +1,84 @@
+import os
+
+# Local stand-in for the object store; keys map to paths under the root
+STORE_DIR = os.environ.get('MEDIA_STORE_DIR', '/tmp/media-store')
+PUBLIC_URL = os.environ.get('MEDIA_PUBLIC_URL', 'file://' + STORE_DIR).rstrip('/')
+
+
+class ObjectStore:
+    '''
+    Uploads are appended chunk by chunk to uploads/<id>.part, then promoted to a
+    content-addressed key (objects/ab/<sha256>.ext), so a file is never held in
+    memory and the same bytes are stored once however often they are uploaded.
+    '''
+
+    def __init__(self, root: str = STORE_DIR, public_url: str = PUBLIC_URL) -> None:
+        self.root = root
+        self.public_url = public_url
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def url(self, key: str) -> str:
+        return f'{self.public_url}/{key}'
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def upload_path(self, upload_id: str) -> str:
+        return self.path(f'uploads/{upload_id}.part')
+
+    def received(self, upload_id: str) -> int:
+        try:
+            return os.path.getsize(self.upload_path(upload_id))
+        except FileNotFoundError:
+            return 0
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes) -> int:
+        '''
+        Writes data at offset, dropping anything after it first: a chunk retried after
+        a partial write replaces the torn tail instead of following it. Returns the new size.
+        Refuses an offset past the end of the file, which would otherwise leave a zero-filled gap.
+        '''
+        path = self.upload_path(upload_id)
+        if self.received(upload_id) < offset:
+            raise ValueError(f'Upload {upload_id} holds fewer than {offset} bytes')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def promote(self, upload_id: str, key: str) -> bool:
+        '''
+        Moves a finished upload to key. Returns False (and drops the upload) when the
+        key already holds the same content.
+        '''
+        source = self.upload_path(upload_id)
+        if self.exists(key):
+            self.discard(upload_id)
+            return False
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+        return True
+
+    def discard(self, upload_id: str) -> None:
+        try:
+            os.remove(self.upload_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+
+def object_key(sha256: str, extension: str) -> str:
+    return f'objects/{sha256[:2]}/{sha256}{extension}'
+
+
+def thumbnail_key(sha256: str, size: int) -> str:
+    return f'thumbnails/{sha256[:2]}/{sha256}_{size}.jpg'
+
+
+store = ObjectStore()
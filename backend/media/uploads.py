@@ -0,0 +1,188 @@
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+from psycopg2.extras import RealDictCursor
+from cache import SharedTier
+from db import autocommit, connection
+from store import store
+
+# The releases function's shared listing cache; attaching a file changes the account's listing.
+# Instances' in-process copies still lag by up to RELEASES_CACHE_TTL seconds
+listings = SharedTier.from_env(ttl=int(os.environ.get('RELEASES_CACHE_TTL', '30')))
+
+UPLOAD_COLUMNS = 'id, user_id, release_id, track_id, kind, file_name, size_bytes, received_bytes, status, sha256, error'
+
+# The release (and track) must belong to the user; nothing is inserted otherwise
+START_SQL = f"""
+    INSERT INTO media_uploads (id, user_id, release_id, track_id, kind, file_name, size_bytes)
+    SELECT %(id)s, r.user_id, r.id, %(track_id)s, %(kind)s, %(file_name)s, %(size)s
+    FROM releases r
+    WHERE r.id = %(release_id)s AND r.user_id = %(user_id)s AND r.status <> 'Удалён'
+      AND (%(track_id)s::int IS NULL OR EXISTS (
+          SELECT 1 FROM release_tracks t WHERE t.id = %(track_id)s AND t.release_id = r.id
+      ))
+    RETURNING {UPLOAD_COLUMNS}
+"""
+
+UPLOAD_SQL = f"SELECT {UPLOAD_COLUMNS} FROM media_uploads WHERE id = %s AND user_id = %s"
+
+RECEIVED_SQL = "UPDATE media_uploads SET received_bytes = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s"
+
+RESUME_SQL = f"""
+    UPDATE media_uploads SET status = 'uploading', received_bytes = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %s
+    RETURNING {UPLOAD_COLUMNS}
+"""
+
+# A processing claim older than the stale interval belongs to a crashed invocation and is taken over
+CLAIM_SQL = f"""
+    UPDATE media_uploads
+    SET status = 'processing', updated_at = CURRENT_TIMESTAMP
+    WHERE id = ANY(%(ids)s::uuid[]) AND user_id = %(user_id)s AND received_bytes = size_bytes
+      AND (status = 'uploading' OR (status = 'processing' AND updated_at < CURRENT_TIMESTAMP - %(stale)s * interval '1 second'))
+    RETURNING {UPLOAD_COLUMNS}
+"""
+
+# Skipping an upload by hash alone is only offered for content the user has uploaded before:
+# knowing a checksum must not be enough to attach someone else's master to your release
+OWNED_OBJECT_SQL = """
+    SELECT o.* FROM media_objects o
+    WHERE o.sha256 = %(sha256)s AND o.kind = %(kind)s AND EXISTS (
+        SELECT 1 FROM media_uploads u
+        WHERE u.sha256 = o.sha256 AND u.user_id = %(user_id)s AND u.status IN ('done', 'duplicate')
+    )
+"""
+
+INSERT_OBJECT_SQL = """
+    INSERT INTO media_objects (sha256, md5, kind, storage_key, size_bytes, format, width, height, thumbnail_key,
+                               duration_seconds, sample_rate, channels, bits_per_sample, rms_dbfs, peak_dbfs)
+    VALUES (%(sha256)s, %(md5)s, %(kind)s, %(storage_key)s, %(size_bytes)s, %(format)s, %(width)s, %(height)s,
+            %(thumbnail_key)s, %(duration_seconds)s, %(sample_rate)s, %(channels)s, %(bits_per_sample)s,
+            %(rms_dbfs)s, %(peak_dbfs)s)
+    ON CONFLICT (sha256) DO NOTHING
+"""
+
+ATTACH_COVER_SQL = """
+    UPDATE releases SET cover_url = %(url)s, cover_sha256 = %(sha256)s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(release_id)s AND user_id = %(user_id)s
+"""
+
+ATTACH_RELEASE_AUDIO_SQL = """
+    UPDATE releases SET audio_url = %(url)s, audio_sha256 = %(sha256)s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(release_id)s AND user_id = %(user_id)s
+"""
+
+# Track edits bump the release too, so listing ETags and caches with include=tracks see them
+ATTACH_TRACK_AUDIO_SQL = """
+    WITH track AS (
+        UPDATE release_tracks t SET audio_file_name = %(file_name)s, audio_sha256 = %(sha256)s
+        FROM releases r
+        WHERE t.id = %(track_id)s AND t.release_id = r.id AND r.id = %(release_id)s AND r.user_id = %(user_id)s
+        RETURNING t.release_id
+    )
+    UPDATE releases SET updated_at = CURRENT_TIMESTAMP
+    WHERE id IN (SELECT release_id FROM track)
+"""
+
+FINISH_SQL = """
+    UPDATE media_uploads SET status = %(status)s, sha256 = %(sha256)s, error = %(error)s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s
+"""
+
+OBJECT_FIELDS = ('md5', 'storage_key', 'size_bytes', 'format', 'width', 'height', 'thumbnail_key', 'duration_seconds',
+                 'sample_rate', 'channels', 'bits_per_sample', 'rms_dbfs', 'peak_dbfs')
+
+
+def start(user_id: Any, release_id: Any, track_id: Optional[int], kind: str, file_name: str, size: int) -> Optional[Dict[str, Any]]:
+    '''
+    Registers an upload against the user's release. Returns None if the release or
+    track is not theirs.
+    '''
+    params = {'id': str(uuid.uuid4()), 'user_id': user_id, 'release_id': release_id, 'track_id': track_id,
+              'kind': kind, 'file_name': file_name, 'size': size}
+    with autocommit() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(START_SQL, params)
+        return cur.fetchone()
+
+
+def get(upload_id: str, user_id: Any) -> Optional[Dict[str, Any]]:
+    with autocommit() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(UPLOAD_SQL, (upload_id, user_id))
+        return cur.fetchone()
+
+
+def write_chunk(upload_id: str, user_id: Any, offset: int, data: bytes) -> Optional[Dict[str, Any]]:
+    '''
+    Appends a chunk under the upload's row lock, so a client retrying a chunk while
+    the first attempt is still running cannot interleave the two. The chunk is only
+    written when it starts exactly at received_bytes and fits the declared size;
+    either way the returned row carries the current received_bytes.
+
+    Chunks of one upload may land on different instances. When this instance's
+    file holds fewer bytes than the row counts, received_bytes drops back to what
+    the file holds and the client resumes from there.
+    '''
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(UPLOAD_SQL + ' FOR UPDATE', (upload_id, user_id))
+        upload = cur.fetchone()
+        if upload is not None and upload['status'] == 'uploading':
+            stored = store.received(upload_id)
+            if stored < upload['received_bytes']:
+                upload['received_bytes'] = stored
+                cur.execute(RECEIVED_SQL, (stored, upload_id))
+            if offset == upload['received_bytes'] and offset + len(data) <= upload['size_bytes']:
+                upload['received_bytes'] = store.write_chunk(upload_id, offset, data)
+                cur.execute(RECEIVED_SQL, (upload['received_bytes'], upload_id))
+        conn.commit()
+    return upload
+
+
+def resume(upload: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Returns a claimed upload whose file is incomplete on this instance to uploading,
+    at the bytes the file does hold.
+    '''
+    with autocommit() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(RESUME_SQL, (store.received(upload['id']), upload['id']))
+        return cur.fetchone()
+
+
+def owned_object(user_id: Any, sha256: str, kind: str) -> Optional[Dict[str, Any]]:
+    with autocommit() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(OWNED_OBJECT_SQL, {'user_id': user_id, 'sha256': sha256, 'kind': kind})
+        return cur.fetchone()
+
+
+def claim(user_id: Any, upload_ids: List[str], stale_seconds: float) -> List[Dict[str, Any]]:
+    with autocommit() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(CLAIM_SQL, {'ids': upload_ids, 'user_id': user_id, 'stale': stale_seconds})
+        return cur.fetchall()
+
+
+def attach(cur: Any, upload: Dict[str, Any], sha256: str, url: str) -> None:
+    params = {'url': url, 'sha256': sha256, 'file_name': upload['file_name'], 'user_id': upload['user_id'],
+              'release_id': upload['release_id'], 'track_id': upload['track_id']}
+    if upload['kind'] == 'cover':
+        cur.execute(ATTACH_COVER_SQL, params)
+    elif upload['track_id'] is not None:
+        cur.execute(ATTACH_TRACK_AUDIO_SQL, params)
+    else:
+        cur.execute(ATTACH_RELEASE_AUDIO_SQL, params)
+
+
+def finish(upload: Dict[str, Any], status: str, media: Optional[Dict[str, Any]] = None, url: Optional[str] = None,
+           error: Optional[str] = None) -> None:
+    '''
+    Records the object (first upload of that content only), points the release or
+    track at it and closes the upload, all in one transaction. media is None for
+    rejected uploads.
+    '''
+    sha256 = media['sha256'] if media else None
+    with connection() as conn, conn.cursor() as cur:
+        if media:
+            cur.execute(INSERT_OBJECT_SQL, {'kind': upload['kind'], 'sha256': sha256, **{name: media.get(name) for name in OBJECT_FIELDS}})
+            attach(cur, upload, sha256, url)
+        cur.execute(FINISH_SQL, {'id': upload['id'], 'status': status, 'sha256': sha256, 'error': error})
+        conn.commit()
+    if media and listings:
+        listings.delete(f"releases:{upload['user_id']}")
@@ -0,0 +1,210 @@
+import io
+import json
+from datetime import date
+from typing import Dict, Any, List, Iterator, Tuple, Optional
+from psycopg2.extras import execute_values
+
+MAX_BULK_ITEMS = 5000
+PAGE_SIZE = 1000
+
+RELEASE_COLUMNS = (
+    'id', 'user_id', 'title', 'genre', 'release_date', 'description',
+    'music_author', 'lyrics_author', 'audio_url', 'cover_url', 'status'
+)
+
+# Column widths of the target tables; None is unbounded TEXT. Checked per item so one
+# oversized value fails its own line instead of raising DataError for the whole import
+RELEASE_FIELDS = {
+    'title': 255, 'genre': 100, 'description': None, 'musicAuthor': 255,
+    'lyricsAuthor': 255, 'audioUrl': None, 'coverUrl': None,
+}
+TRACK_FIELDS = {
+    'title': 500, 'lyricsAuthor': 255, 'musicAuthor': 255, 'producer': 255, 'isrc': 50,
+    'audioFileName': 500, 'lyricsText': None, 'artistName': 255, 'additionalArtists': None,
+}
+MAX_TRACK_ORDER = 2 ** 31 - 1
+
+TRACK_COLUMNS = (
+    'release_id', 'title', 'lyrics_author', 'music_author', 'producer',
+    'additional_artists', 'isrc', 'has_explicit_content', 'audio_file_name',
+    'lyrics_text', 'artist_name', 'track_order', 'created_at'
+)
+
+
+def iter_ndjson(body: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    '''
+    Yields (index, item, error) for every non-empty NDJSON line without
+    materialising the whole payload as Python objects.
+    '''
+    index = 0
+    for line in io.StringIO(body):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield index, None, 'Invalid JSON'
+        else:
+            if isinstance(item, dict):
+                yield index, item, None
+            else:
+                yield index, None, 'Release must be an object'
+        index += 1
+
+
+def _text(item: Dict[str, Any], key: str) -> str:
+    value = item.get(key)
+    return value.strip() if isinstance(value, str) else ''
+
+
+def _check_fields(item: Dict[str, Any], fields: Dict[str, Optional[int]], label: str) -> Optional[str]:
+    for key, limit in fields.items():
+        value = item.get(key)
+        if key == 'additionalArtists' and isinstance(value, list):
+            if not all(isinstance(a, str) or a is None for a in value):
+                return f'{label}{key} must be a string or a list of strings'
+            value = ', '.join(a for a in value if a)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            return f'{label}{key} must be a string'
+        if '\x00' in value:
+            return f'{label}{key} must not contain NUL characters'
+        if limit is not None and len(value) > limit:
+            return f'{label}{key} must be at most {limit} characters'
+    return None
+
+
+def release_row(user_id: int, item: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        user_id,
+        _text(item, 'title'),
+        _text(item, 'genre'),
+        item.get('releaseDate') or None,
+        _text(item, 'description'),
+        _text(item, 'musicAuthor'),
+        _text(item, 'lyricsAuthor'),
+        item.get('audioUrl'),
+        item.get('coverUrl'),
+        'Черновик'
+    )
+
+
+def track_rows(release_id: int, tracks: List[Dict[str, Any]]) -> List[Tuple[Any, ...]]:
+    rows = []
+    for order, track in enumerate(tracks, start=1):
+        additional = track.get('additionalArtists')
+        if isinstance(additional, list):
+            additional = ', '.join(a for a in additional if a)
+        rows.append((
+            release_id,
+            _text(track, 'title'),
+            _text(track, 'lyricsAuthor'),
+            _text(track, 'musicAuthor'),
+            _text(track, 'producer'),
+            additional or None,
+            _text(track, 'isrc') or None,
+            track.get('hasExplicitContent') is True,
+            track.get('audioFileName'),
+            track.get('lyricsText'),
+            track.get('artistName'),
+            track.get('trackOrder') or order
+        ))
+    return rows
+
+
+def validate(item: Dict[str, Any]) -> Optional[str]:
+    '''
+    Checks one release line against what the INSERTs accept: types, the date format
+    and column widths. Returns the error for that line, or None.
+    '''
+    error = _check_fields(item, RELEASE_FIELDS, '')
+    if error:
+        return error
+    if not _text(item, 'title') or not _text(item, 'genre'):
+        return 'Заполните все обязательные поля'
+    release_date = item.get('releaseDate')
+    if release_date:
+        if not isinstance(release_date, str):
+            return 'releaseDate must be YYYY-MM-DD'
+        try:
+            date.fromisoformat(release_date)
+        except ValueError:
+            return 'releaseDate must be YYYY-MM-DD'
+    tracks = item.get('tracks') or []
+    if not isinstance(tracks, list):
+        return 'tracks must be a list'
+    for number, track in enumerate(tracks, start=1):
+        if not isinstance(track, dict):
+            return 'Каждый трек должен иметь название'
+        error = _check_fields(track, TRACK_FIELDS, f'tracks[{number}].')
+        if error:
+            return error
+        if not _text(track, 'title'):
+            return 'Каждый трек должен иметь название'
+        explicit = track.get('hasExplicitContent')
+        if explicit is not None and not isinstance(explicit, bool):
+            return f'tracks[{number}].hasExplicitContent must be true or false'
+        order = track.get('trackOrder')
+        if order is not None and (isinstance(order, bool) or not isinstance(order, int) or not 0 < order <= MAX_TRACK_ORDER):
+            return f'tracks[{number}].trackOrder must be a positive integer'
+    return None
+
+
+def import_releases(conn: Any, user_id: int, body: str) -> List[Dict[str, Any]]:
+    '''
+    Loads an NDJSON catalog (one release per line, tracks nested under "tracks")
+    in a single transaction: ids are reserved up front, then releases and tracks
+    go in as paged multi-row INSERTs. Returns one result entry per input line.
+    '''
+    results: List[Dict[str, Any]] = []
+    accepted: List[Tuple[int, Dict[str, Any]]] = []
+
+    for index, item, error in iter_ndjson(body):
+        if index >= MAX_BULK_ITEMS:
+            raise ValueError(f'Too many releases, max {MAX_BULK_ITEMS}')
+        if error is None:
+            error = validate(item)
+        if error:
+            results.append({'index': index, 'success': False, 'error': error})
+            continue
+        results.append({'index': index, 'success': True})
+        accepted.append((index, item))
+
+    if not accepted:
+        return results
+
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT nextval(pg_get_serial_sequence('releases', 'id')) FROM generate_series(1, %s)",
+            (len(accepted),)
+        )
+        ids = [row[0] for row in cur.fetchall()]
+
+        releases = []
+        tracks = []
+        for release_id, (index, item) in zip(ids, accepted):
+            results[index]['id'] = release_id
+            releases.append((release_id,) + release_row(user_id, item))
+            tracks.extend(track_rows(release_id, item.get('tracks') or []))
+
+        execute_values(
+            cur,
+            f"INSERT INTO releases ({', '.join(RELEASE_COLUMNS)}) VALUES %s",
+            releases,
+            page_size=PAGE_SIZE
+        )
+        if tracks:
+            execute_values(
+                cur,
+                f"INSERT INTO release_tracks ({', '.join(TRACK_COLUMNS)}) VALUES %s",
+                tracks,
+                template='(' + ', '.join(['%s'] * (len(TRACK_COLUMNS) - 1)) + ', CURRENT_TIMESTAMP)',
+                page_size=PAGE_SIZE
+            )
+        conn.commit()
+
+    for index, item in accepted:
+        results[index]['tracks'] = len(item.get('tracks') or [])
+    return results
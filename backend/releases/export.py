@@ -0,0 +1,198 @@
+import io
+import csv
+import zlib
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from psycopg2.extras import RealDictCursor
+from runtime import dumps
+
+FETCH_SIZE = 2000
+FORMATS = ('csv', 'ndjson')
+
+RELEASE_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('releaseId', 'release_id'),
+    ('title', 'title'),
+    ('genre', 'genre'),
+    ('releaseDate', 'release_date'),
+    ('status', 'status'),
+    ('musicAuthor', 'music_author'),
+    ('lyricsAuthor', 'lyrics_author'),
+    ('streams', 'streams'),
+    ('revenue', 'revenue'),
+    ('createdAt', 'created_at'),
+)
+
+TRACK_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('trackId', 'track_id'),
+    ('trackOrder', 'track_order'),
+    ('trackTitle', 'track_title'),
+    ('isrc', 'isrc'),
+    ('trackMusicAuthor', 'track_music_author'),
+    ('trackLyricsAuthor', 'track_lyrics_author'),
+    ('producer', 'producer'),
+    ('additionalArtists', 'additional_artists'),
+    ('hasExplicitContent', 'has_explicit_content'),
+    ('trackStreams', 'track_streams'),
+    ('trackRevenue', 'track_revenue'),
+)
+
+# Same order and cursor predicate as the listing, so idx_releases_user_created drives the
+# scan and tracks arrive in idx_release_tracks_release order for each release
+EXPORT_SQL = """
+    SELECT r.id AS release_id, r.title, r.genre, r.release_date, r.status,
+           r.music_author, r.lyrics_author, r.streams, r.revenue, r.created_at,
+           t.id AS track_id, t.track_order, t.title AS track_title, t.isrc,
+           t.music_author AS track_music_author, t.lyrics_author AS track_lyrics_author,
+           t.producer, t.additional_artists, t.has_explicit_content,
+           s.streams AS track_streams, s.revenue AS track_revenue
+    FROM releases r
+    LEFT JOIN release_tracks t ON t.release_id = r.id
+    LEFT JOIN LATERAL (
+        SELECT sum(d.streams) AS streams, sum(d.revenue) AS revenue
+        FROM release_stats_daily d
+        WHERE d.release_id = r.id AND d.isrc = t.isrc
+    ) s ON t.isrc IS NOT NULL
+    WHERE r.user_id = %s{after}
+    ORDER BY r.created_at DESC, r.id DESC, t.track_order, t.id
+"""
+
+Position = Tuple[Optional[datetime], int]
+
+
+def after_position(after: Position, alias: str = '') -> Tuple[str, Tuple[Any, ...]]:
+    '''
+    Keyset predicate for the rows past a position in created_at DESC, id DESC order.
+    NULL created_at sorts first there, so a position on one continues with the
+    remaining undated rows and then every dated one.
+    '''
+    created_at, release_id = after
+    if created_at is None:
+        return f' AND ({alias}created_at IS NOT NULL OR {alias}id < %s)', (release_id,)
+    return f' AND ({alias}created_at, {alias}id) < (%s, %s)', (created_at, release_id)
+
+
+def iter_rows(conn: Any, user_id: Any, after: Optional[Position] = None) -> Iterator[Dict[str, Any]]:
+    '''
+    Reads the catalog through a server-side cursor, FETCH_SIZE rows per round trip,
+    so only one batch is ever held in memory.
+    '''
+    predicate, params = after_position(after, 'r.') if after else ('', ())
+    with conn.cursor(name='catalog_export', cursor_factory=RealDictCursor) as cur:
+        cur.itersize = FETCH_SIZE
+        cur.execute(EXPORT_SQL.format(after=predicate), (user_id, *params))
+        yield from cur
+
+
+def iter_releases(rows: Iterator[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    '''
+    Groups consecutive rows into one list per release (a release has at least one row).
+    '''
+    group: List[Dict[str, Any]] = []
+    for row in rows:
+        if group and row['release_id'] != group[0]['release_id']:
+            yield group
+            group = []
+        group.append(row)
+    if group:
+        yield group
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class CsvEncoder:
+    def __init__(self) -> None:
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _line(self, values: List[Any]) -> bytes:
+        self._writer.writerow(values)
+        line = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return line.encode('utf-8')
+
+    def header(self) -> bytes:
+        return self._line([name for name, _ in RELEASE_COLUMNS + TRACK_COLUMNS])
+
+    def release(self, rows: List[Dict[str, Any]]) -> bytes:
+        return b''.join(self._line([_csv_value(row[column]) for _, column in RELEASE_COLUMNS + TRACK_COLUMNS]) for row in rows)
+
+
+class NdjsonEncoder:
+    def header(self) -> bytes:
+        return b''
+
+    def release(self, rows: List[Dict[str, Any]]) -> bytes:
+        first = rows[0]
+        item = {name: first[column] for name, column in RELEASE_COLUMNS}
+        item['tracks'] = [
+            {name: row[column] for name, column in TRACK_COLUMNS}
+            for row in rows if row['track_id'] is not None
+        ]
+        return dumps(item).encode('utf-8') + b'\n'
+
+
+def write_export(conn: Any, user_id: Any, out: BinaryIO, fmt: str = 'csv', after: Optional[Position] = None,
+                 compress: bool = False, max_bytes: Optional[int] = None) -> Optional[Position]:
+    '''
+    Streams the catalog to out release by release, optionally as a gzip stream.
+    Stops at the first release boundary past max_bytes of uncompressed output and
+    returns the position to resume after; returns None once the catalog is complete.
+    '''
+    encoder = CsvEncoder() if fmt == 'csv' else NdjsonEncoder()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def emit(chunk: bytes) -> None:
+        out.write(compressor.compress(chunk) if compressor else chunk)
+
+    written = 0
+    last: Optional[Dict[str, Any]] = None
+    resume: Optional[Position] = None
+    if after is None:
+        emit(encoder.header())
+    rows = iter_rows(conn, user_id, after)
+    try:
+        for release in iter_releases(rows):
+            if last is not None and max_bytes is not None and written >= max_bytes:
+                resume = (last['created_at'], last['release_id'])
+                break
+            chunk = encoder.release(release)
+            emit(chunk)
+            written += len(chunk)
+            last = release[0]
+    finally:
+        rows.close()
+
+    if compressor:
+        out.write(compressor.flush())
+    return resume
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import time
+    import argparse
+    import tracemalloc
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='Export a catalog to stdout and report peak Python memory')
+    parser.add_argument('user_id', type=int)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--max-bytes', type=int)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    tracemalloc.start()
+    started = time.perf_counter()
+    resume = write_export(conn, args.user_id, sys.stdout.buffer, args.format, compress=args.gzip, max_bytes=args.max_bytes)
+    sys.stdout.buffer.flush()
+    _, peak = tracemalloc.get_traced_memory()
+    print(f'{time.perf_counter() - started:.2f}s, peak {peak / 1024:.0f} KiB traced, resume after {resume}', file=sys.stderr)
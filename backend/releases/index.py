@@ -1,251 +1,587 @@
-import json
+import io
 import os
-from typing import Dict, Any
+import re
+import base64
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import pool, connection, autocommit
+from bulk import import_releases
+from export import FORMATS, Position, after_position, write_export
+from cache import TTLCache, SharedTier
+from tokens import KEYS, TokenError, token_from_event, verify_token
+from tracing import instrument_pool
+from runtime import (
+    Router, Request, BadRequest, Unauthorized, Forbidden, NotFound,
+    CORS_HEADERS, JSON_HEADERS, respond, error, dumps
+)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_BATCH_IDS = 1000
+# Uncompressed bytes per export response; larger catalogs continue via X-Export-Cursor
+EXPORT_MAX_BYTES = int(os.environ.get('RELEASES_EXPORT_MAX_BYTES', str(4 * 1024 * 1024)))
+
+MAX_SEARCH_WORDS = 8
+# Shorter words match exactly: a one- or two-letter prefix expands to most of the catalog
+MIN_PREFIX_LENGTH = 3
+# Matches taken from each search branch before ranking; bounds very broad queries
+SEARCH_CANDIDATES = int(os.environ.get('RELEASES_SEARCH_CANDIDATES', '250'))
+
+RELEASE_FIELDS: Dict[str, str] = {
+    'id': 'id',
+    'title': 'title',
+    'genre': 'genre',
+    'releaseDate': 'release_date',
+    'description': 'description',
+    'musicAuthor': 'music_author',
+    'lyricsAuthor': 'lyrics_author',
+    'audioUrl': 'audio_url',
+    'coverUrl': 'cover_url',
+    'status': 'status',
+    'streams': 'streams',
+    'revenue': 'revenue',
+}
+
+# body key -> (column, skip when empty)
+UPDATABLE_FIELDS: Dict[str, Tuple[str, bool]] = {
+    'title': ('title', True),
+    'genre': ('genre', True),
+    'releaseDate': ('release_date', False),
+    'description': ('description', False),
+    'musicAuthor': ('music_author', False),
+    'lyricsAuthor': ('lyrics_author', False),
+    'audioUrl': ('audio_url', False),
+    'coverUrl': ('cover_url', False),
+    'status': ('status', False),
+}
+
+CACHE_TTL_SECONDS = int(os.environ.get('RELEASES_CACHE_TTL', '30'))
+
+# Writes made here drop both tiers. Stats ingestion, media attachments and distribution status
+# changes drop only the shared tier (releases:<user id>), so a listing this instance already holds
+# can trail them by up to CACHE_TTL_SECONDS; without REDIS_URL that is the whole window.
+listing_cache = TTLCache(max_size=int(os.environ.get('RELEASES_CACHE_SIZE', '512')), ttl=CACHE_TTL_SECONDS)
+shared_cache = SharedTier.from_env(ttl=CACHE_TTL_SECONDS)
+
+LISTING_HEADERS = {**JSON_HEADERS, 'Access-Control-Expose-Headers': 'ETag, X-Cache'}
+NOT_MODIFIED_HEADERS = {**CORS_HEADERS, 'Access-Control-Expose-Headers': 'ETag, X-Cache'}
+EXPORT_HEADERS: Dict[str, Dict[str, str]] = {
+    'csv': {**CORS_HEADERS, 'Content-Type': 'text/csv; charset=utf-8', 'Access-Control-Expose-Headers': 'X-Export-Cursor'},
+    'ndjson': {**CORS_HEADERS, 'Content-Type': 'application/x-ndjson', 'Access-Control-Expose-Headers': 'X-Export-Cursor'},
+}
+
+INCLUDES = ('tracks',)
+
+# Listing filters; the active predicate matches idx_releases_user_active (V0006)
+SCOPES: Dict[str, str] = {
+    'all': '',
+    'active': " AND status <> 'Удалён'",
+    'deleted': " AND status = 'Удалён'",
+}
+
+TRACKS_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+                   'id', t.id, 'title', t.title, 'lyricsAuthor', t.lyrics_author,
+                   'musicAuthor', t.music_author, 'producer', t.producer,
+                   'additionalArtists', t.additional_artists, 'isrc', t.isrc,
+                   'hasExplicitContent', t.has_explicit_content,
+                   'audioFileName', t.audio_file_name, 'lyricsText', t.lyrics_text,
+                   'artistName', t.artist_name, 'trackOrder', t.track_order
+               ) ORDER BY t.track_order, t.id) AS tracks
+        FROM release_tracks t
+        WHERE t.release_id = releases.id
+    ) release_tracks_agg ON true
+"""
+
+SEARCH_TOKEN = re.compile(r"[^\s&|!():*<>'\\]+")
+SEARCH_WORD = re.compile(r'\w')
+
+# Full-text hits on search_vector plus trigram word_similarity hits on titles (V0007).
+# Each branch takes SEARCH_CANDIDATES matches unordered and scores only those, so a broad
+# term costs a bounded pool rather than ranking every match. Release pools hang off the
+# account row so the planner reads them through the per-account indexes (V0013) instead of
+# guessing from catalog-wide frequencies; tracks carry no account, so theirs start from the
+# track indexes with the literal id. Full-text ranks are offset past 1 and fuzzy ones halved:
+# any full-text hit outranks every fuzzy one. Duplicates keep their best rank
+SEARCH_SQL = """
+    WITH account AS (
+        SELECT id FROM users WHERE id = %(user_id)s
+    ), matches AS (
+        SELECT 'release' AS kind, c.id, c.id AS release_id,
+               1 + ts_rank(c.search_vector, to_tsquery('simple', %(tsquery)s)) AS rank
+        FROM account a CROSS JOIN LATERAL (
+            SELECT r.id, r.search_vector
+            FROM releases r
+            WHERE r.user_id = a.id AND r.search_vector @@ to_tsquery('simple', %(tsquery)s){scope}
+            LIMIT %(candidates)s) c
+        UNION ALL
+        SELECT 'track', c.id, c.release_id,
+               1 + ts_rank(c.search_vector, to_tsquery('simple', %(tsquery)s))
+        FROM (SELECT t.id, t.release_id, t.search_vector
+              FROM release_tracks t JOIN releases r ON r.id = t.release_id
+              WHERE r.user_id = %(user_id)s AND t.search_vector @@ to_tsquery('simple', %(tsquery)s){scope}
+              LIMIT %(candidates)s) c
+        UNION ALL
+        SELECT 'release', c.id, c.id, word_similarity(%(text)s, c.title) * 0.5
+        FROM account a CROSS JOIN LATERAL (
+            SELECT r.id, r.title
+            FROM releases r
+            WHERE r.user_id = a.id AND %(text)s <%% r.title{scope}
+            LIMIT %(candidates)s) c
+        UNION ALL
+        SELECT 'track', c.id, c.release_id, word_similarity(%(text)s, c.title) * 0.5
+        FROM (SELECT t.id, t.release_id, t.title
+              FROM release_tracks t JOIN releases r ON r.id = t.release_id
+              WHERE r.user_id = %(user_id)s AND %(text)s <%% t.title{scope}
+              LIMIT %(candidates)s) c
+    ), ranked AS (
+        SELECT kind, id, release_id, max(rank)::real AS rank
+        FROM matches
+        GROUP BY kind, id, release_id
+    )
+    SELECT ranked.kind, ranked.id, ranked.release_id, ranked.rank,
+           r.title AS release_title, r.status, t.title AS track_title, t.isrc
+    FROM ranked
+    JOIN releases r ON r.id = ranked.release_id
+    LEFT JOIN release_tracks t ON ranked.kind = 'track' AND t.id = ranked.id
+    {after}
+    ORDER BY ranked.rank DESC, ranked.kind DESC, ranked.id DESC
+    LIMIT %(limit)s
+"""
+
+# Mutations lock the caller's rows in id order first, so concurrent batches never deadlock,
+# and run as one autocommit statement: a single round trip and no lock held across trips
+LOCK_RELEASES = """
+    WITH target AS (
+        SELECT id FROM releases
+        WHERE id = ANY(%(release_ids)s) AND user_id = %(user_id)s
+        ORDER BY id
+        FOR UPDATE
+    )
+"""
+
+UPDATE_RELEASES_SQL = LOCK_RELEASES + """
+    UPDATE releases SET {assignments}, updated_at = CURRENT_TIMESTAMP
+    FROM target
+    WHERE releases.id = target.id
+    RETURNING releases.id
+"""
+
+SOFT_DELETE_SQL = LOCK_RELEASES + """
+    UPDATE releases SET status = 'Удалён', updated_at = CURRENT_TIMESTAMP
+    FROM target
+    WHERE releases.id = target.id
+    RETURNING releases.id
+"""
+
+PERMANENT_DELETE_SQL = LOCK_RELEASES + """
+    , deleted_tracks AS (
+        DELETE FROM release_tracks WHERE release_id IN (SELECT id FROM target)
+    )
+    DELETE FROM releases
+    USING target
+    WHERE releases.id = target.id
+    RETURNING releases.id
+"""
+
+router = Router(
+    route_key=lambda request: request.params.get('mode'),
+    allow_headers=('Content-Type', 'If-None-Match', 'X-Auth-Token', 'Authorization')
+)
+
+instrument_pool(pool)
+
+def parse_includes(raw: Optional[str]) -> List[str]:
+    includes = [name.strip() for name in (raw or '').split(',') if name.strip()]
+    for name in includes:
+        if name not in INCLUDES:
+            raise BadRequest(f'Unknown include: {name}')
+    return includes
+
+def parse_fields(raw: Optional[str]) -> List[str]:
+    if not raw:
+        return list(RELEASE_FIELDS)
+    fields = ['id']
+    for name in raw.split(','):
+        name = name.strip()
+        if not name or name in fields:
+            continue
+        if name not in RELEASE_FIELDS:
+            raise BadRequest(f'Unknown field: {name}')
+        fields.append(name)
+    return fields
+
+def parse_limit(raw: Optional[str]) -> int:
+    if not raw:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise BadRequest('limit must be an integer')
+    if limit < 1:
+        raise BadRequest('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+def encode_cursor(created_at: Optional[datetime], release_id: int) -> str:
+    # created_at is nullable (V0002); a cursor on an undated row leaves the timestamp empty
+    raw = f"{created_at.isoformat() if created_at else ''}|{release_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Position:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, release_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at) if created_at else None, int(release_id)
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest('Invalid cursor')
+
+def parse_search(raw: Optional[str]) -> Tuple[str, str]:
+    words = [w for w in SEARCH_TOKEN.findall((raw or '').lower()) if SEARCH_WORD.search(w)][:MAX_SEARCH_WORDS]
+    if not words:
+        raise BadRequest('q required')
+    # The exact term beside the prefix matches nothing more, but gives the planner the word's real
+    # frequency: prefix matches are estimated blind, and a common word then probes the whole GIN index
+    tsquery = ' & '.join(f"('{w}' | '{w}':*)" if len(w) >= MIN_PREFIX_LENGTH else f"'{w}'" for w in words)
+    return tsquery, ' '.join(words)
+
+def encode_search_cursor(rank: float, kind: str, item_id: int) -> str:
+    raw = f'{rank!r}|{kind}|{item_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_search_cursor(cursor: str) -> Tuple[float, str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        rank, kind, item_id = raw.split('|')
+        return float(rank), kind, int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest('Invalid cursor')
+
+def parse_release_ids(body_data: Dict[str, Any]) -> Tuple[List[int], bool]:
+    '''
+    Returns the sorted ids to change and whether the request used the batch form (releaseIds).
+    '''
+    batch = 'releaseIds' in body_data
+    raw = body_data['releaseIds'] if batch else [body_data.get('releaseId')]
+    if not isinstance(raw, list) or not all(raw):
+        return [], batch
+    if len(raw) > MAX_BATCH_IDS:
+        raise BadRequest(f'At most {MAX_BATCH_IDS} releaseIds per request')
+    try:
+        return sorted({int(release_id) for release_id in raw}), batch
+    except (TypeError, ValueError):
+        raise BadRequest('releaseIds must be integers')
+
+def mutation_response(release_ids: List[int], changed: List[int], batch: bool) -> Dict[str, Any]:
+    if not batch:
+        if not changed:
+            raise NotFound('Release not found')
+        return respond(200, {'success': True})
+    found = set(changed)
+    return respond(200, {
+        'success': len(found) == len(release_ids),
+        'changed': sorted(found),
+        'notFound': [release_id for release_id in release_ids if release_id not in found]
+    })
+
+def make_etag(total: int, last_updated: Optional[datetime], checksum: Any, *variant: Any) -> str:
+    digest = hashlib.sha1(repr((total, last_updated, checksum, variant)).encode()).hexdigest()[:16]
+    return f'W/"{total}-{digest}"'
+
+def get_cached_listing(user_id: str, variant: str) -> Optional[Tuple[str, str]]:
+    cached = listing_cache.get((user_id, variant))
+    if cached is None and shared_cache:
+        raw = shared_cache.get(f'releases:{user_id}', variant)
+        if raw:
+            etag, body = raw.split('\n', 1)
+            cached = (etag, body)
+            listing_cache.set((user_id, variant), cached)
+    return cached
+
+def cache_listing(user_id: str, variant: str, etag: str, body: str) -> None:
+    listing_cache.set((user_id, variant), (etag, body))
+    if shared_cache:
+        shared_cache.set(f'releases:{user_id}', variant, f'{etag}\n{body}')
+
+def invalidate_listing(user_id: Any) -> None:
+    listing_cache.delete_group(str(user_id))
+    if shared_cache:
+        shared_cache.delete(f'releases:{user_id}')
+
+def authenticate(request: Request) -> Optional[int]:
+    token = token_from_event(request.event)
+    try:
+        if token:
+            return verify_token(token)
+        if KEYS:
+            raise TokenError('Session token required')
+    except TokenError as e:
+        raise Unauthorized(str(e))
+    return None
+
+def resolve_user_id(request: Request, claimed: Any) -> Any:
+    session_user_id = authenticate(request)
+    if session_user_id is None:
+        return claimed
+    if claimed not in (None, '') and str(claimed) != str(session_user_id):
+        raise Forbidden('userId does not match session')
+    return session_user_id
+
+def listing_response(status: int, etag: str, cache_status: str, body: str = '') -> Dict[str, Any]:
+    if status == 304:
+        return respond(304, headers={**NOT_MODIFIED_HEADERS, 'ETag': etag, 'X-Cache': cache_status})
+    return respond(status, headers={**LISTING_HEADERS, 'ETag': etag, 'X-Cache': cache_status}, body=body)
+
+@router.route('GET', 'stats')
+def get_stats(request: Request) -> Dict[str, Any]:
+    authenticate(request)
+    return respond(200, {'pool': pool.stats(), 'cache': listing_cache.stats()})
+
+@router.route('GET', 'search')
+def search_catalog(request: Request) -> Dict[str, Any]:
+    params = request.params
+    user_id = resolve_user_id(request, params.get('userId'))
+
+    if not user_id:
+        return error(400, 'userId required')
+
+    tsquery, text = parse_search(params.get('q'))
+    limit = parse_limit(params.get('limit'))
+    scope = params.get('scope') or 'all'
+    if scope not in SCOPES:
+        raise BadRequest(f'Unknown scope: {scope}')
+
+    query_params: Dict[str, Any] = {
+        'user_id': user_id, 'tsquery': tsquery, 'text': text,
+        'candidates': SEARCH_CANDIDATES, 'limit': limit + 1
+    }
+    after = ''
+    if params.get('cursor'):
+        query_params['rank'], query_params['kind'], query_params['after_id'] = decode_search_cursor(params['cursor'])
+        after = "WHERE (ranked.rank, ranked.kind, ranked.id) < (%(rank)s::real, %(kind)s, %(after_id)s)"
+
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(SEARCH_SQL.format(scope=SCOPES[scope], after=after), query_params)
+        rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(rows[-1]['rank'], rows[-1]['kind'], rows[-1]['id'])
+
+    results = [{
+        'kind': row['kind'],
+        'id': row['id'],
+        'releaseId': row['release_id'],
+        'title': row['track_title'] if row['kind'] == 'track' else row['release_title'],
+        'releaseTitle': row['release_title'],
+        'isrc': row['isrc'],
+        'status': row['status'],
+        'rank': round(row['rank'], 4)
+    } for row in rows]
+    return respond(200, {'results': results, 'nextCursor': next_cursor})
+
+@router.route('GET', 'export')
+def export_catalog(request: Request) -> Dict[str, Any]:
+    params = request.params
+    user_id = resolve_user_id(request, params.get('userId'))
+
+    if not user_id:
+        return error(400, 'userId required')
+
+    fmt = params.get('format') or 'csv'
+    if fmt not in FORMATS:
+        raise BadRequest(f'Unknown format: {fmt}')
+    after = decode_cursor(params.get('cursor')) if params.get('cursor') else None
+    compress = params.get('gzip') == '1'
+
+    out = io.BytesIO()
+    with connection() as conn:
+        resume = write_export(conn, user_id, out, fmt, after, compress, EXPORT_MAX_BYTES)
+
+    headers = dict(EXPORT_HEADERS[fmt])
+    if resume:
+        headers['X-Export-Cursor'] = encode_cursor(*resume)
+    if not compress:
+        return respond(200, headers=headers, body=out.getvalue().decode('utf-8'))
+    headers['Content-Encoding'] = 'gzip'
+    response = respond(200, headers=headers, body=base64.b64encode(out.getvalue()).decode())
+    response['isBase64Encoded'] = True
+    return response
+
+@router.route('GET')
+def list_releases(request: Request) -> Dict[str, Any]:
+    params = request.params
+    user_id = resolve_user_id(request, params.get('userId'))
+
+    if not user_id:
+        return error(400, 'userId required')
+
+    fields = parse_fields(params.get('fields'))
+    limit = parse_limit(params.get('limit'))
+    cursor = decode_cursor(params.get('cursor')) if params.get('cursor') else None
+    includes = parse_includes(params.get('include'))
+    scope = params.get('scope') or 'all'
+    if scope not in SCOPES:
+        raise BadRequest(f'Unknown scope: {scope}')
+
+    variant = repr((fields, includes, limit, params.get('cursor'), scope))
+    cached = get_cached_listing(str(user_id), variant)
+    if cached:
+        etag, body = cached
+        if request.header('If-None-Match') == etag:
+            return listing_response(304, etag, 'HIT')
+        return listing_response(200, etag, 'HIT', body)
+
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # updated_at is the writing transaction's start time, so a write that commits late can land
+        # below max(updated_at); the exact sum still moves. Track writes bump their release's updated_at
+        cur.execute(
+            "SELECT count(*) AS total, max(updated_at) AS last_updated, sum(extract(epoch FROM updated_at)) AS checksum"
+            " FROM releases WHERE user_id = %s" + SCOPES[scope],
+            (user_id,)
+        )
+        version = cur.fetchone()
+        etag = make_etag(version['total'], version['last_updated'], version['checksum'], variant)
+
+        if request.header('If-None-Match') == etag:
+            return listing_response(304, etag, 'MISS')
+
+        columns = ['id', 'created_at'] + [RELEASE_FIELDS[f] for f in fields if RELEASE_FIELDS[f] not in ('id', 'created_at')]
+        if 'tracks' in includes:
+            columns.append("COALESCE(release_tracks_agg.tracks, '[]'::json) AS tracks")
+        query = f"SELECT {', '.join(columns)} FROM releases"
+        if 'tracks' in includes:
+            query += TRACKS_JOIN
+        query += " WHERE user_id = %s" + SCOPES[scope]
+        query_params: List[Any] = [user_id]
+        if cursor:
+            predicate, after_params = after_position(cursor)
+            query += predicate
+            query_params.extend(after_params)
+        query += " ORDER BY created_at DESC, id DESC LIMIT %s"
+        query_params.append(limit + 1)
+
+        cur.execute(query, query_params)
+        releases = cur.fetchall()
+
+    next_cursor = None
+    if len(releases) > limit:
+        releases = releases[:limit]
+        next_cursor = encode_cursor(releases[-1]['created_at'], releases[-1]['id'])
+
+    projection = [(f, RELEASE_FIELDS[f]) for f in fields]
+    if 'tracks' in includes:
+        projection.append(('tracks', 'tracks'))
+    releases_list = [{name: r[column] for name, column in projection} for r in releases]
+
+    body = dumps({'releases': releases_list, 'nextCursor': next_cursor})
+    cache_listing(str(user_id), variant, etag, body)
+    return listing_response(200, etag, 'MISS', body)
+
+@router.route('POST', 'bulk')
+def bulk_import(request: Request) -> Dict[str, Any]:
+    user_id = resolve_user_id(request, request.params.get('userId'))
+
+    if not user_id:
+        return error(400, 'userId required')
+
+    if not str(user_id).isascii() or not str(user_id).isdigit():
+        raise BadRequest('userId must be an integer')
+
+    with connection() as conn:
+        try:
+            results = import_releases(conn, int(user_id), request.body)
+        except ValueError as e:
+            raise BadRequest(str(e))
+    invalidate_listing(user_id)
+
+    imported = sum(1 for r in results if r['success'])
+    return respond(200, {
+        'success': imported == len(results),
+        'imported': imported,
+        'failed': len(results) - imported,
+        'results': results
+    })
+
+@router.route('POST')
+def create_release(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    user_id = resolve_user_id(request, body_data.get('userId'))
+    title = body_data.get('title', '').strip()
+    genre = body_data.get('genre', '').strip()
+    release_date = body_data.get('releaseDate')
+    description = body_data.get('description', '').strip()
+    music_author = body_data.get('musicAuthor', '').strip()
+    lyrics_author = body_data.get('lyricsAuthor', '').strip()
+    audio_url = body_data.get('audioUrl')
+    cover_url = body_data.get('coverUrl')
+
+    if not user_id or not title or not genre:
+        return error(400, 'Заполните все обязательные поля')
+
+    with autocommit() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            INSERT INTO releases
+            (user_id, title, genre, release_date, description, music_author, lyrics_author, audio_url, cover_url, status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id, title, genre, status, streams, COALESCE(revenue, 0) AS revenue
+        """, (user_id, title, genre, release_date, description, music_author, lyrics_author, audio_url, cover_url, 'Черновик'))
+        release = cur.fetchone()
+    invalidate_listing(user_id)
+
+    return respond(200, {'success': True, 'release': release})
+
+@router.route('PUT')
+def update_release(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    release_ids, batch = parse_release_ids(body_data)
+    user_id = resolve_user_id(request, body_data.get('userId'))
+
+    if not release_ids or not user_id:
+        return error(400, 'releaseId and userId required')
+
+    assignments = []
+    params: Dict[str, Any] = {'release_ids': release_ids, 'user_id': user_id}
+    for key, (column, skip_empty) in UPDATABLE_FIELDS.items():
+        if key in body_data and (body_data[key] or not skip_empty):
+            assignments.append(f'{column} = %({column})s')
+            params[column] = body_data[key]
+
+    if not assignments:
+        return error(400, 'No fields to update')
+
+    with autocommit() as conn, conn.cursor() as cur:
+        cur.execute(UPDATE_RELEASES_SQL.format(assignments=', '.join(assignments)), params)
+        changed = [row[0] for row in cur.fetchall()]
+    invalidate_listing(user_id)
+
+    return mutation_response(release_ids, changed, batch)
+
+@router.route('DELETE')
+def delete_release(request: Request) -> Dict[str, Any]:
+    body_data = request.json
+    release_ids, batch = parse_release_ids(body_data)
+    user_id = resolve_user_id(request, body_data.get('userId'))
+    permanent = body_data.get('permanent', False)
+
+    if not release_ids or not user_id:
+        return error(400, 'releaseId and userId required')
+
+    with autocommit() as conn, conn.cursor() as cur:
+        cur.execute(PERMANENT_DELETE_SQL if permanent else SOFT_DELETE_SQL, {'release_ids': release_ids, 'user_id': user_id})
+        changed = [row[0] for row in cur.fetchall()]
+    invalidate_listing(user_id)
+
+    return mutation_response(release_ids, changed, batch)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Manage user releases (create, read, update, delete)
-    Args: event with httpMethod, body (userId, releaseId, title, genre, etc.)
+    Args: event with httpMethod, headers (X-Auth-Token session token), queryStringParameters (userId, limit, cursor, fields, include, scope=all|active|deleted, q with mode=search, format=csv|ndjson and gzip=1 with mode=export, mode=bulk|stats),
+          body (userId, releaseId or releaseIds for batch PUT/DELETE, title, genre, etc.; NDJSON releases when mode=bulk)
     Returns: HTTP response with release data or error
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    database_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(database_url)
-    
-    try:
-        if method == 'GET':
-            params = event.get('queryStringParameters', {})
-            user_id = params.get('userId')
-            
-            if not user_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'userId required'}),
-                    'isBase64Encoded': False
-                }
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT id, title, genre, release_date, description, 
-                           music_author, lyrics_author, audio_url, cover_url,
-                           status, streams, revenue, created_at, updated_at
-                    FROM releases 
-                    WHERE user_id = %s 
-                    ORDER BY created_at DESC
-                """, (user_id,))
-                releases = cur.fetchall()
-                
-                releases_list = []
-                for r in releases:
-                    releases_list.append({
-                        'id': r['id'],
-                        'title': r['title'],
-                        'genre': r['genre'],
-                        'releaseDate': r['release_date'].isoformat() if r['release_date'] else None,
-                        'description': r['description'],
-                        'musicAuthor': r['music_author'],
-                        'lyricsAuthor': r['lyrics_author'],
-                        'audioUrl': r['audio_url'],
-                        'coverUrl': r['cover_url'],
-                        'status': r['status'],
-                        'streams': r['streams'],
-                        'revenue': float(r['revenue']) if r['revenue'] else 0
-                    })
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'releases': releases_list}),
-                    'isBase64Encoded': False
-                }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            user_id = body_data.get('userId')
-            title = body_data.get('title', '').strip()
-            genre = body_data.get('genre', '').strip()
-            release_date = body_data.get('releaseDate')
-            description = body_data.get('description', '').strip()
-            music_author = body_data.get('musicAuthor', '').strip()
-            lyrics_author = body_data.get('lyricsAuthor', '').strip()
-            audio_url = body_data.get('audioUrl')
-            cover_url = body_data.get('coverUrl')
-            
-            if not user_id or not title or not genre:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Заполните все обязательные поля'}),
-                    'isBase64Encoded': False
-                }
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    INSERT INTO releases 
-                    (user_id, title, genre, release_date, description, music_author, lyrics_author, audio_url, cover_url, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id, title, genre, status, streams, revenue
-                """, (user_id, title, genre, release_date, description, music_author, lyrics_author, audio_url, cover_url, 'Черновик'))
-                release = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'success': True,
-                        'release': {
-                            'id': release['id'],
-                            'title': release['title'],
-                            'genre': release['genre'],
-                            'status': release['status'],
-                            'streams': release['streams'],
-                            'revenue': float(release['revenue']) if release['revenue'] else 0
-                        }
-                    }),
-                    'isBase64Encoded': False
-                }
-        
-        elif method == 'PUT':
-            body_data = json.loads(event.get('body', '{}'))
-            release_id = body_data.get('releaseId')
-            user_id = body_data.get('userId')
-            
-            if not release_id or not user_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'releaseId and userId required'}),
-                    'isBase64Encoded': False
-                }
-            
-            updates = []
-            params = []
-            
-            if 'title' in body_data and body_data['title']:
-                updates.append('title = %s')
-                params.append(body_data['title'])
-            if 'genre' in body_data and body_data['genre']:
-                updates.append('genre = %s')
-                params.append(body_data['genre'])
-            if 'releaseDate' in body_data:
-                updates.append('release_date = %s')
-                params.append(body_data['releaseDate'])
-            if 'description' in body_data:
-                updates.append('description = %s')
-                params.append(body_data['description'])
-            if 'musicAuthor' in body_data:
-                updates.append('music_author = %s')
-                params.append(body_data['musicAuthor'])
-            if 'lyricsAuthor' in body_data:
-                updates.append('lyrics_author = %s')
-                params.append(body_data['lyricsAuthor'])
-            if 'audioUrl' in body_data:
-                updates.append('audio_url = %s')
-                params.append(body_data['audioUrl'])
-            if 'coverUrl' in body_data:
-                updates.append('cover_url = %s')
-                params.append(body_data['coverUrl'])
-            if 'status' in body_data:
-                updates.append('status = %s')
-                params.append(body_data['status'])
-            
-            if not updates:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'No fields to update'}),
-                    'isBase64Encoded': False
-                }
-            
-            updates.append('updated_at = CURRENT_TIMESTAMP')
-            params.extend([release_id, user_id])
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                query = f"UPDATE releases SET {', '.join(updates)} WHERE id = %s AND user_id = %s RETURNING id"
-                cur.execute(query, params)
-                result = cur.fetchone()
-                conn.commit()
-                
-                if not result:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Release not found'}),
-                        'isBase64Encoded': False
-                    }
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
-                    'isBase64Encoded': False
-                }
-        
-        elif method == 'DELETE':
-            body_data = json.loads(event.get('body', '{}'))
-            release_id = body_data.get('releaseId')
-            user_id = body_data.get('userId')
-            permanent = body_data.get('permanent', False)
-            
-            if not release_id or not user_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'releaseId and userId required'}),
-                    'isBase64Encoded': False
-                }
-            
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                if permanent:
-                    cur.execute("DELETE FROM release_tracks WHERE release_id = %s", (release_id,))
-                    cur.execute("DELETE FROM releases WHERE id = %s AND user_id = %s RETURNING id", (release_id, user_id))
-                    result = cur.fetchone()
-                    
-                    if not result:
-                        return {
-                            'statusCode': 404,
-                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': 'Release not found'}),
-                            'isBase64Encoded': False
-                        }
-                else:
-                    cur.execute("UPDATE releases SET status = 'Удалён' WHERE id = %s AND user_id = %s", (release_id, user_id))
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
-                    'isBase64Encoded': False
-                }
-        
-        else:
-            return {
-                'statusCode': 405,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Method not allowed'}),
-                'isBase64Encoded': False
-            }
-    
-    finally:
-        conn.close()
\ No newline at end of file
+    return router.dispatch(event, context)
@@ -0,0 +1,103 @@
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import numpy as np
+
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+# Header: signature, int32 flags, int32 extension length; every tuple starts with an int16 field count
+HEADER_SIZE = len(COPY_SIGNATURE) + 8
+TRAILER = b'\xff\xff'
+CHUNK_ROWS = 1_000_000
+
+WIDTHS = {'int4': ('>i4', 4), 'int8': ('>i8', 8)}
+
+Columns = Dict[str, np.ndarray]
+
+
+def row_dtype(columns: Sequence[Tuple[str, str]]) -> np.dtype:
+    '''
+    COPY BINARY tuple layout for NOT NULL fixed-width columns: the field count, then a
+    length word and big-endian value per column. Every row has the same size, so a
+    block of rows is one numpy record array.
+    '''
+    fields: List[Tuple[str, str]] = [('_fields', '>i2')]
+    for name, kind in columns:
+        fields += [(f'_{name}_len', '>i4'), (name, WIDTHS[kind][0])]
+    return np.dtype(fields)
+
+
+class ColumnSink:
+    '''
+    File-like target for copy_expert. Buffers the COPY stream and hands decoded blocks
+    of up to chunk_rows rows to consume as native int64 columns, so a result of any
+    size is processed in constant memory.
+    '''
+
+    def __init__(self, columns: Sequence[Tuple[str, str]], consume: Callable[[Columns], None],
+                 chunk_rows: int = CHUNK_ROWS) -> None:
+        self.columns = columns
+        self.consume = consume
+        self.dtype = row_dtype(columns)
+        self.chunk_bytes = chunk_rows * self.dtype.itemsize
+        self.rows = 0
+        self._buffer = bytearray()
+        self._header = False
+        self._done = False
+
+    def _decode(self, final: bool) -> None:
+        if not self._header:
+            if len(self._buffer) < HEADER_SIZE:
+                return
+            if bytes(self._buffer[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+                raise ValueError('Not a binary COPY stream')
+            extension = int.from_bytes(self._buffer[HEADER_SIZE - 4:HEADER_SIZE], 'big')
+            del self._buffer[:HEADER_SIZE + extension]
+            self._header = True
+        if final and len(self._buffer) % self.dtype.itemsize == len(TRAILER) and self._buffer.endswith(TRAILER):
+            del self._buffer[-len(TRAILER):]
+            self._done = True
+        count = len(self._buffer) // self.dtype.itemsize
+        if not count:
+            return
+        rows = np.frombuffer(self._buffer, dtype=self.dtype, count=count)
+        if (rows['_fields'] != len(self.columns)).any() or any(
+                (rows[f'_{name}_len'] != WIDTHS[kind][1]).any() for name, kind in self.columns):
+            raise ValueError('COPY row is not fixed-width; the query must select NOT NULL int4/int8 columns')
+        block = {name: rows[name].astype(np.int64) for name, _ in self.columns}
+        del rows
+        del self._buffer[:count * self.dtype.itemsize]
+        self.rows += count
+        self.consume(block)
+
+    def write(self, data: Any) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_bytes:
+            self._decode(final=False)
+        return len(data)
+
+    def close(self) -> None:
+        self._decode(final=True)
+        if not self._done or self._buffer:
+            raise ValueError('Truncated COPY stream')
+
+
+def copy_columns(cur: Any, sql: str, columns: Sequence[Tuple[str, str]], consume: Callable[[Columns], None],
+                 chunk_rows: int = CHUNK_ROWS) -> int:
+    '''
+    Streams a query through COPY ... TO STDOUT (FORMAT binary) into consume, one block
+    of int64 columns at a time. sql must already have its parameters bound
+    (cur.mogrify). Returns the row count.
+    '''
+    sink = ColumnSink(columns, consume, chunk_rows)
+    cur.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT binary)', sink, size=1 << 20)
+    sink.close()
+    return sink.rows
+
+
+def fetch_columns(cur: Any, sql: str, columns: Sequence[Tuple[str, str]]) -> Columns:
+    '''
+    copy_columns for results small enough to hold whole: returns the concatenated columns.
+    '''
+    blocks: List[Columns] = []
+    copy_columns(cur, sql, columns, blocks.append)
+    if not blocks:
+        return {name: np.zeros(0, dtype=np.int64) for name, _ in columns}
+    return {name: np.concatenate([block[name] for block in blocks]) for name, _ in columns}
@@ -0,0 +1,139 @@
+import os
+from typing import Tuple
+import numpy as np
+from columns import Columns
+
+BASIS_POINTS = 10_000
+# ₽100: smaller balances are carried forward to the next statement instead of paid out
+MIN_PAYOUT_KOPECKS = int(os.environ.get('ROYALTY_MIN_PAYOUT_KOPECKS', '10000'))
+DENSE_ID_LIMIT = 50_000_000
+# A direct table is used while the id range is at most this many times the id count, so it
+# never takes more than twice the memory of the sorted ids (int32 slots against int64 ids)
+DENSE_ID_SPREAD = 4
+
+
+def sorted_unique(values: np.ndarray) -> np.ndarray:
+    # Sort-and-compare; np.unique's hash path is several times slower on millions of ids
+    values = np.sort(values)
+    if not len(values):
+        return values
+    return values[np.concatenate(([True], values[1:] != values[:-1]))]
+
+
+class IdIndex:
+    '''
+    Maps ids to their positions in the sorted array ids. Serial ids are usually dense,
+    and then a direct table (one int32 per id up to the largest) makes a lookup a single
+    gather; a few ids spread over a wide range fall back to binary search.
+    '''
+
+    def __init__(self, ids: np.ndarray) -> None:
+        self.ids = ids
+        self.table = None
+        if len(ids) and 0 <= ids[0] and ids[-1] <= min(DENSE_ID_LIMIT, DENSE_ID_SPREAD * len(ids)):
+            self.table = np.full(int(ids[-1]) + 1, -1, dtype=np.int32)
+            self.table[ids] = np.arange(len(ids), dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def find(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Positions of values and a mask of the values found; missing values get position 0.
+        '''
+        if not len(self.ids):
+            return np.zeros(len(values), dtype=np.intp), np.zeros(len(values), dtype=bool)
+        if self.table is not None:
+            clipped = np.clip(values, 0, len(self.table) - 1)
+            positions = self.table[clipped].astype(np.intp)
+            found = (positions >= 0) & (clipped == values)
+        else:
+            positions = np.searchsorted(self.ids, values)
+            positions[positions == len(self.ids)] = 0
+            found = self.ids[positions] == values
+        positions[~found] = 0
+        return positions, found
+
+    def positions(self, values: np.ndarray, what: str) -> np.ndarray:
+        positions, found = self.find(values)
+        if not found.all():
+            raise ValueError(f'{int((~found).sum())} {what} reference unknown ids')
+        return positions
+
+
+class Ledger:
+    '''
+    One period's royalties, computed on columns instead of rows. Stat rows are summed
+    per release and per credited track as they stream in (add), and the split runs
+    once per credit at the end (close): a contributor gets floor(track revenue *
+    share / 10000) kopecks and the release owner gets the rest, so every kopeck of
+    revenue lands with exactly one payee and no rounding drifts across rows.
+
+    releases: id, payee_id (the owner's payee)
+    credits: track_id, release_id, payee_id, share_bps
+    payees: id, balance_kopecks (opening balances carried from the last statement)
+    '''
+
+    def __init__(self, releases: Columns, credits: Columns, payees: Columns) -> None:
+        order = np.argsort(releases['id'], kind='stable')
+        self.releases = IdIndex(releases['id'][order])
+        order_payees = np.argsort(payees['id'], kind='stable')
+        self.payees = IdIndex(payees['id'][order_payees])
+        self.opening = payees['balance_kopecks'][order_payees]
+        self.release_owner = self.payees.positions(releases['payee_id'][order], 'releases')
+
+        self.tracks = IdIndex(sorted_unique(credits['track_id']))
+        self.credit_track = self.tracks.positions(credits['track_id'], 'credits')
+        self.credit_release = self.releases.positions(credits['release_id'], 'credits')
+        self.credit_payee = self.payees.positions(credits['payee_id'], 'credits')
+        self.credit_bps = credits['share_bps']
+        credited = np.zeros(len(self.tracks), dtype=np.int64)
+        np.add.at(credited, self.credit_track, self.credit_bps)
+        if (self.credit_bps < 0).any() or (credited > BASIS_POINTS).any():
+            raise ValueError('Track credits must be non-negative and share at most 10000 basis points')
+
+        self.release_kopecks = np.zeros(len(self.releases), dtype=np.int64)
+        self.track_kopecks = np.zeros(len(self.tracks), dtype=np.int64)
+        self.rows = 0
+        self.unmatched_kopecks = 0
+
+    def add(self, stats: Columns) -> None:
+        '''
+        Accumulates a block of stat rows: release_id, track_id (0 when the ISRC matched
+        no track) and kopecks. Rows of unknown releases are counted as unmatched.
+        '''
+        kopecks = stats['kopecks']
+        release, matched = self.releases.find(stats['release_id'])
+        track, credited = self.tracks.find(stats['track_id'])
+        credited &= matched
+        # add.at is unbuffered, so repeated indexes accumulate; integer sums stay exact
+        np.add.at(self.release_kopecks, release[matched], kopecks[matched])
+        np.add.at(self.track_kopecks, track[credited], kopecks[credited])
+        self.unmatched_kopecks += int(kopecks[~matched].sum())
+        self.rows += len(kopecks)
+
+    def close(self, min_payout: int = MIN_PAYOUT_KOPECKS) -> Columns:
+        '''
+        Splits the period's revenue and settles balances. Returns one row per payee
+        with activity: payee_id, opening, earned, paid and closing kopecks. A balance
+        of at least min_payout is paid out whole; anything smaller carries forward.
+        '''
+        shares = self.track_kopecks[self.credit_track] * self.credit_bps // BASIS_POINTS
+        credited = np.zeros(len(self.releases), dtype=np.int64)
+        np.add.at(credited, self.credit_release, shares)
+        earned = np.zeros(len(self.payees), dtype=np.int64)
+        np.add.at(earned, self.credit_payee, shares)
+        np.add.at(earned, self.release_owner, self.release_kopecks - credited)
+        if int(earned.sum()) != int(self.release_kopecks.sum()):
+            raise ArithmeticError('Split does not add up to the period revenue')
+
+        balance = self.opening + earned
+        paid = np.where(balance >= min_payout, balance, 0)
+        active = np.flatnonzero((earned != 0) | (paid != 0))
+        return {
+            'payee_id': self.payees.ids[active],
+            'opening': self.opening[active],
+            'earned': earned[active],
+            'paid': paid[active],
+            'closing': (balance - paid)[active],
+        }
@@ -0,0 +1,84 @@
+import os
+import hmac
+from typing import Dict, Any, Optional
+from db import connection, pool
+from statements import StatementError, month_start, run_statement, user_statement
+from tokens import KEYS, TokenError, token_from_event, verify_token
+from tracing import instrument_pool
+from runtime import Router, Request, BadRequest, Unauthorized, Forbidden, HttpError, respond, error
+
+WORKER_KEY = os.environ.get('ROYALTY_WORKER_KEY', '')
+
+router = Router(
+    route_key=lambda request: request.params.get('mode'),
+    allow_headers=('Content-Type', 'X-Auth-Token', 'Authorization', 'X-Worker-Key')
+)
+
+instrument_pool(pool)
+
+def authenticate(request: Request) -> Optional[int]:
+    token = token_from_event(request.event)
+    try:
+        if token:
+            return verify_token(token)
+        if KEYS:
+            raise TokenError('Session token required')
+    except TokenError as e:
+        raise Unauthorized(str(e))
+    return None
+
+def resolve_user_id(request: Request, claimed: Any) -> Any:
+    session_user_id = authenticate(request)
+    if session_user_id is None:
+        return claimed
+    if claimed not in (None, '') and str(claimed) != str(session_user_id):
+        raise Forbidden('userId does not match session')
+    return session_user_id
+
+def parse_month(raw: Any) -> Any:
+    try:
+        return month_start(str(raw))
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+@router.route('POST', 'run')
+def run_month(request: Request) -> Dict[str, Any]:
+    # Settling zeroes payee balances and cannot be undone, so an unconfigured key refuses the run
+    if not WORKER_KEY:
+        raise HttpError('Worker key is not configured', 503)
+    if not hmac.compare_digest((request.header('X-Worker-Key') or '').encode(), WORKER_KEY.encode()):
+        raise Forbidden('Worker key required')
+    month = request.json.get('month')
+    if not month:
+        return error(400, 'month required')
+
+    start = parse_month(month)
+    with connection() as conn:
+        try:
+            summary = run_statement(conn, start)
+        except StatementError as e:
+            raise HttpError(str(e), 409)
+    return respond(200, {'success': True, **summary})
+
+@router.route('GET')
+def get_statement(request: Request) -> Dict[str, Any]:
+    params = request.params
+    user_id = resolve_user_id(request, params.get('userId'))
+
+    if not user_id:
+        return error(400, 'userId required')
+    if not str(user_id).isdigit():
+        raise BadRequest('userId must be an integer')
+
+    start = parse_month(params['month']) if params.get('month') else None
+    with connection() as conn:
+        return respond(200, user_statement(conn, user_id, start))
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Monthly royalty statements: split track revenue between the account and its credited contributors and settle payouts
+    Args: event with httpMethod, headers (X-Auth-Token session token; X-Worker-Key for mode=run),
+          queryStringParameters (userId, optional month=YYYY-MM for GET; mode=run), body (month for mode=run)
+    Returns: HTTP response with the account's statement lines and balances, or the run summary
+    '''
+    return router.dispatch(event, context)
@@ -0,0 +1,302 @@
+import io
+import os
+import sys
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional
+import numpy as np
+from psycopg2.extras import RealDictCursor
+from columns import copy_columns, fetch_columns
+from engine import Ledger, MIN_PAYOUT_KOPECKS, BASIS_POINTS
+
+ROLES = ('music_author', 'lyrics_author', 'producer', 'additional_artists')
+# Default split of each track's revenue by credit, in basis points; the release owner keeps the rest.
+# Names within a role share it equally (additional_artists is a comma-separated list)
+DEFAULT_ROLE_SHARES = os.environ.get(
+    'ROYALTY_ROLE_SHARES', 'music_author:2500,lyrics_author:2500,producer:1000,additional_artists:1000'
+)
+
+STAT_COLUMNS = (('release_id', 'int4'), ('track_id', 'int4'), ('kopecks', 'int8'))
+RELEASE_COLUMNS = (('id', 'int4'), ('payee_id', 'int4'))
+CREDIT_COLUMNS = (('track_id', 'int4'), ('release_id', 'int4'), ('payee_id', 'int4'), ('share_bps', 'int4'))
+PAYEE_COLUMNS = (('id', 'int4'), ('balance_kopecks', 'int8'))
+LINE_COLUMNS = ('payee_id', 'opening', 'earned', 'paid', 'closing')
+
+# Runs are serialized: each one reads the balances the previous one left. Stats ingestion
+# holds SHARE on the same table, so no report commits halfway through a run
+LOCK_SQL = "LOCK TABLE royalty_statements IN EXCLUSIVE MODE"
+
+# Releases with stats in the month or with adjustments to earlier, settled months
+PERIOD_RELEASES_SQL = """
+    CREATE TEMP TABLE royalty_period_releases ON COMMIT DROP AS
+    SELECT r.id, r.user_id
+    FROM releases r
+    WHERE EXISTS (
+        SELECT 1 FROM release_stats_daily s
+        WHERE s.release_id = r.id AND s.stat_date >= %(start)s AND s.stat_date < %(end)s
+    ) OR EXISTS (
+        SELECT 1 FROM royalty_adjustments a
+        WHERE a.release_id = r.id AND a.statement_id IS NULL
+    )
+"""
+
+# One row per credited name, with the number of names sharing its role on that track.
+# A name matching the account's artist name is the account itself.
+CREDITS_SQL = """
+    CREATE TEMP TABLE royalty_credits ON COMMIT DROP AS
+    SELECT c.track_id, c.release_id, c.user_id, c.role, c.names,
+           CASE WHEN lower(c.name) = lower(trim(u.artist_name)) THEN '' ELSE left(c.name, 255) END AS name
+    FROM (
+        SELECT t.id AS track_id, t.release_id, p.user_id, c.role, trim(c.name) AS name, 1 AS names
+        FROM royalty_period_releases p
+        JOIN release_tracks t ON t.release_id = p.id
+        CROSS JOIN LATERAL (
+            VALUES ('music_author', t.music_author), ('lyrics_author', t.lyrics_author), ('producer', t.producer)
+        ) AS c(role, name)
+        WHERE trim(c.name) <> ''
+        UNION ALL
+        SELECT t.id, t.release_id, p.user_id, 'additional_artists', trim(a.name), count(*) OVER (PARTITION BY t.id)
+        FROM royalty_period_releases p
+        JOIN release_tracks t ON t.release_id = p.id
+        CROSS JOIN LATERAL unnest(string_to_array(t.additional_artists, ',')) AS a(name)
+        WHERE trim(a.name) <> ''
+    ) c
+    JOIN users u ON u.id = c.user_id
+"""
+
+PAYEES_SQL = """
+    INSERT INTO royalty_payees (user_id, name)
+    SELECT DISTINCT user_id, name FROM royalty_credits
+    UNION
+    SELECT DISTINCT user_id, '' FROM royalty_period_releases
+    ON CONFLICT (user_id, lower(name)) DO NOTHING
+"""
+
+RELEASE_COLUMNS_SQL = """
+    SELECT r.id, p.id
+    FROM royalty_period_releases r
+    JOIN royalty_payees p ON p.user_id = r.user_id AND lower(p.name) = ''
+"""
+
+CREDIT_COLUMNS_SQL = """
+    SELECT c.track_id, c.release_id, p.id, (s.share_bps / c.names)::int4
+    FROM royalty_credits c
+    JOIN unnest(%(roles)s::text[], %(shares)s::int[]) AS s(role, share_bps) USING (role)
+    JOIN royalty_payees p ON p.user_id = c.user_id AND lower(p.name) = lower(c.name)
+    WHERE s.share_bps > 0
+"""
+
+PAYEE_COLUMNS_SQL = """
+    SELECT id, balance_kopecks FROM royalty_payees
+    WHERE user_id IN (SELECT user_id FROM royalty_period_releases)
+"""
+
+# Revenue is DECIMAL(14, 2), so revenue * 100 is an exact kopeck count. A duplicated ISRC
+# within a release maps to its first track, as in stats ingestion, so no row is counted twice.
+# Open adjustments (late or restated rows of settled months, possibly negative) are paid
+# alongside the month's own rows.
+STAT_COLUMNS_SQL = """
+    WITH tracks AS (
+        SELECT DISTINCT ON (t.release_id, t.isrc) t.release_id, t.isrc, t.id
+        FROM release_tracks t
+        JOIN royalty_period_releases r ON r.id = t.release_id
+        WHERE t.isrc IS NOT NULL
+        ORDER BY t.release_id, t.isrc, t.id
+    )
+    SELECT s.release_id, COALESCE(t.id, 0), (s.revenue * 100)::int8
+    FROM (
+        SELECT release_id, isrc, revenue FROM release_stats_daily
+        WHERE stat_date >= %(start)s AND stat_date < %(end)s
+        UNION ALL
+        SELECT release_id, isrc, revenue FROM royalty_adjustments
+        WHERE statement_id IS NULL
+    ) s
+    LEFT JOIN tracks t ON t.release_id = s.release_id AND t.isrc = s.isrc
+"""
+
+SETTLE_ADJUSTMENTS_SQL = "UPDATE royalty_adjustments SET statement_id = %s WHERE statement_id IS NULL"
+
+STATEMENT_SQL = """
+    INSERT INTO royalty_statements (period_start, period_end, rows_read, revenue_kopecks, unmatched_kopecks, paid_kopecks)
+    VALUES (%(start)s, %(end)s, %(rows)s, %(revenue)s, %(unmatched)s, %(paid)s)
+    RETURNING id
+"""
+
+APPLY_BALANCES_SQL = """
+    UPDATE royalty_payees p
+    SET balance_kopecks = l.closing_kopecks, updated_at = CURRENT_TIMESTAMP
+    FROM royalty_statement_lines l
+    WHERE l.statement_id = %s AND p.id = l.payee_id
+"""
+
+BALANCES_SQL = "SELECT name, balance_kopecks FROM royalty_payees WHERE user_id = %s ORDER BY name"
+
+LINES_SQL = """
+    SELECT p.name, l.opening_kopecks, l.earned_kopecks, l.paid_kopecks, l.closing_kopecks
+    FROM royalty_statements s
+    JOIN royalty_statement_lines l ON l.statement_id = s.id
+    JOIN royalty_payees p ON p.id = l.payee_id
+    WHERE s.period_start = %(start)s AND p.user_id = %(user_id)s
+    ORDER BY p.name
+"""
+
+LATEST_SQL = """
+    SELECT max(s.period_start)
+    FROM royalty_payees p
+    JOIN royalty_statement_lines l ON l.payee_id = p.id
+    JOIN royalty_statements s ON s.id = l.statement_id
+    WHERE p.user_id = %s
+"""
+
+
+class StatementError(Exception):
+    '''
+    The statement cannot be run for that month (already run, out of order, not over yet).
+    '''
+
+
+def parse_role_shares(raw: str) -> Dict[str, int]:
+    shares: Dict[str, int] = {}
+    for item in raw.split(','):
+        role, _, bps = item.strip().partition(':')
+        if role not in ROLES or not bps.isdigit():
+            raise ValueError(f'Invalid role share: {item!r}')
+        shares[role] = int(bps)
+    if sum(shares.values()) > BASIS_POINTS:
+        raise ValueError('Role shares add up to more than 10000 basis points')
+    return shares
+
+
+ROLE_SHARES = parse_role_shares(DEFAULT_ROLE_SHARES)
+
+
+def month_start(value: str) -> date:
+    try:
+        return date.fromisoformat(f'{value}-01')
+    except ValueError:
+        raise ValueError('month must be YYYY-MM')
+
+
+def next_month(start: date) -> date:
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def lines_copy_buffer(statement_id: int, lines: Dict[str, np.ndarray]) -> io.StringIO:
+    table = np.column_stack([np.full(len(lines['payee_id']), statement_id, dtype=np.int64)] + [lines[name] for name in LINE_COLUMNS])
+    buffer = io.StringIO()
+    np.savetxt(buffer, table, fmt='%d', delimiter='\t')
+    buffer.seek(0)
+    return buffer
+
+
+def run_statement(conn: Any, start: date, role_shares: Optional[Dict[str, int]] = None,
+                  min_payout: int = MIN_PAYOUT_KOPECKS) -> Dict[str, Any]:
+    '''
+    Computes and records one month's statement in a single transaction: the month's stat
+    rows plus open adjustments to earlier months are paid. Stat rows and
+    split rules are read as columns (COPY BINARY) into a Ledger, and the lines plus the
+    carried-forward balances are written back. Either the whole month lands or nothing does.
+    '''
+    end = next_month(start)
+    if end > date.today():
+        raise StatementError(f'{start:%Y-%m} is not over yet')
+    shares = ROLE_SHARES if role_shares is None else role_shares
+    params = {'start': start, 'end': end}
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(LOCK_SQL)
+            cur.execute("SELECT max(period_start) FROM royalty_statements")
+            last = cur.fetchone()[0]
+            if last is not None and start != next_month(last):
+                raise StatementError(f'Statements exist up to {last:%Y-%m}; the next month to run is {next_month(last):%Y-%m}')
+
+            cur.execute(PERIOD_RELEASES_SQL, params)
+            cur.execute(CREDITS_SQL)
+            cur.execute(PAYEES_SQL)
+            releases = fetch_columns(cur, RELEASE_COLUMNS_SQL, RELEASE_COLUMNS)
+            credits = fetch_columns(cur, cur.mogrify(CREDIT_COLUMNS_SQL, {
+                'roles': list(shares), 'shares': list(shares.values())
+            }).decode(), CREDIT_COLUMNS)
+            payees = fetch_columns(cur, PAYEE_COLUMNS_SQL, PAYEE_COLUMNS)
+            ledger = Ledger(releases, credits, payees)
+            timings['rules'] = time.perf_counter() - started
+
+            copy_columns(cur, cur.mogrify(STAT_COLUMNS_SQL, params).decode(), STAT_COLUMNS, ledger.add)
+            timings['stats'] = time.perf_counter() - started - timings['rules']
+            lines = ledger.close(min_payout)
+
+            revenue = int(ledger.release_kopecks.sum())
+            paid = int(lines['paid'].sum())
+            cur.execute(STATEMENT_SQL, dict(params, rows=ledger.rows, revenue=revenue,
+                                            unmatched=ledger.unmatched_kopecks, paid=paid))
+            statement_id = cur.fetchone()[0]
+            cur.copy_expert(
+                'COPY royalty_statement_lines (statement_id, payee_id, opening_kopecks, earned_kopecks, paid_kopecks, closing_kopecks) FROM STDIN',
+                lines_copy_buffer(statement_id, lines)
+            )
+            cur.execute(APPLY_BALANCES_SQL, (statement_id,))
+            cur.execute(SETTLE_ADJUSTMENTS_SQL, (statement_id,))
+            adjustments = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        'statementId': statement_id,
+        'month': f'{start:%Y-%m}',
+        'rowsRead': ledger.rows,
+        'adjustments': adjustments,
+        'releases': len(ledger.releases),
+        'credits': len(credits['track_id']),
+        'revenueKopecks': revenue,
+        'unmatchedKopecks': ledger.unmatched_kopecks,
+        'paidKopecks': paid,
+        'payouts': int((lines['paid'] > 0).sum()),
+        'carriedKopecks': int(lines['closing'].sum()),
+        'payees': len(lines['payee_id']),
+        'seconds': {name: round(value, 3) for name, value in dict(timings, total=time.perf_counter() - started).items()},
+    }
+
+
+def user_statement(conn: Any, user_id: Any, start: Optional[date]) -> Dict[str, Any]:
+    '''
+    The account's current balances and its lines on the given month's statement
+    (the latest one it appears on by default).
+    '''
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if start is None:
+            cur.execute(LATEST_SQL, (user_id,))
+            start = cur.fetchone()['max']
+        lines: List[Dict[str, Any]] = []
+        if start is not None:
+            cur.execute(LINES_SQL, {'start': start, 'user_id': user_id})
+            lines = cur.fetchall()
+        cur.execute(BALANCES_SQL, (user_id,))
+        balances = cur.fetchall()
+    return {
+        'month': f'{start:%Y-%m}' if start else None,
+        'minPayoutKopecks': MIN_PAYOUT_KOPECKS,
+        'lines': [{
+            'payee': line['name'] or None, 'openingKopecks': line['opening_kopecks'], 'earnedKopecks': line['earned_kopecks'],
+            'paidKopecks': line['paid_kopecks'], 'closingKopecks': line['closing_kopecks'],
+        } for line in lines],
+        'balances': [{'payee': row['name'] or None, 'balanceKopecks': row['balance_kopecks']} for row in balances],
+    }
+
+
+if __name__ == '__main__':
+    import json
+    import psycopg2
+
+    if len(sys.argv) != 2:
+        print('Usage: python statements.py YYYY-MM', file=sys.stderr)
+        sys.exit(1)
+
+    connection = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    try:
+        print(json.dumps(run_statement(connection, month_start(sys.argv[1]))))
+    finally:
+        connection.close()
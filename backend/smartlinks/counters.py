@@ -0,0 +1,117 @@
+import os
+import time
+import atexit
+import threading
+from datetime import date
+from typing import Dict, List, Tuple
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+from db import connection
+
+FLUSH_EVERY = int(os.environ.get('SMARTLINK_FLUSH_EVERY', '500'))
+FLUSH_INTERVAL_SECONDS = float(os.environ.get('SMARTLINK_FLUSH_INTERVAL', '10'))
+
+# Rows are sorted before the upsert so concurrent instances lock keys in the same order
+FLUSH_SQL = """
+    INSERT INTO smartlink_clicks (smartlink_id, click_date, platform, clicks)
+    VALUES %s
+    ON CONFLICT (smartlink_id, click_date, platform)
+    DO UPDATE SET clicks = smartlink_clicks.clicks + EXCLUDED.clicks
+"""
+
+ClickKey = Tuple[int, date, str]
+
+
+def write_each(cur: psycopg2.extensions.cursor, rows: List[Tuple[int, date, str, int]]) -> int:
+    '''
+    Upserts rows one by one, each behind a savepoint, and skips those the table
+    rejects (a platform name wider than the column, a count out of range).
+    '''
+    written = 0
+    for row in rows:
+        cur.execute('SAVEPOINT click_row')
+        try:
+            execute_values(cur, FLUSH_SQL, [row])
+        except psycopg2.DataError:
+            cur.execute('ROLLBACK TO SAVEPOINT click_row')
+            continue
+        cur.execute('RELEASE SAVEPOINT click_row')
+        written += 1
+    return written
+
+
+class ClickBuffer:
+    '''
+    Counts page views and platform redirects in memory and writes them as a single
+    upsert once flush_every hits or flush_interval seconds have accumulated.
+    Counts from a failed flush are merged back and retried with the next one; rows
+    the table itself rejects are dropped, so one bad key cannot block every later flush.
+    '''
+
+    def __init__(self, flush_every: int = FLUSH_EVERY, flush_interval: float = FLUSH_INTERVAL_SECONDS) -> None:
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._counts: Dict[ClickKey, int] = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {'hits': 0, 'flushes': 0, 'rows_written': 0, 'rows_dropped': 0, 'flush_errors': 0}
+
+    def add(self, smartlink_id: int, platform: str = '') -> None:
+        key = (smartlink_id, date.today(), platform)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._pending += 1
+            self._stats['hits'] += 1
+
+    def _due(self) -> bool:
+        if self._pending >= self.flush_every:
+            return True
+        return self._pending > 0 and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush(self, force: bool = False) -> int:
+        with self._lock:
+            if self._flushing or not self._counts or not (force or self._due()):
+                return 0
+            counts, self._counts = self._counts, {}
+            pending, self._pending = self._pending, 0
+            self._last_flush = time.monotonic()
+            self._flushing = True
+
+        rows = [key + (clicks,) for key, clicks in sorted(counts.items())]
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                try:
+                    execute_values(cur, FLUSH_SQL, rows)
+                    written = len(rows)
+                except psycopg2.DataError:
+                    # One bad row fails the whole batch: write the rest one at a time instead
+                    conn.rollback()
+                    written = write_each(cur, rows)
+                conn.commit()
+        except psycopg2.Error:
+            with self._lock:
+                for key, clicks in counts.items():
+                    self._counts[key] = self._counts.get(key, 0) + clicks
+                self._pending += pending
+                self._stats['flush_errors'] += 1
+            return 0
+        finally:
+            with self._lock:
+                self._flushing = False
+
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['rows_written'] += written
+            self._stats['rows_dropped'] += len(rows) - written
+        return written
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, pending=self._pending, keys=len(self._counts))
+
+
+clicks = ClickBuffer()
+atexit.register(clicks.flush, True)
@@ -0,0 +1,138 @@
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+from psycopg2.extras import RealDictCursor
+from db import pool, connection
+from cache import TTLCache
+from counters import clicks
+from runtime import Router, Request, BadRequest, NotFound, JSON_HEADERS, CORS_HEADERS, respond, dumps
+from tracing import instrument_pool
+
+MAX_SLUG_LENGTH = 100
+# Width of smartlink_clicks.platform (V0005): longer names could never be counted
+MAX_PLATFORM_NAME_LENGTH = 100
+BROWSER_MAX_AGE_SECONDS = int(os.environ.get('SMARTLINK_MAX_AGE', '60'))
+
+# slug -> (smartlink id, precomputed JSON body, lower-cased platform name -> (name, url))
+ResolvedLink = Tuple[int, str, Dict[str, Tuple[str, str]]]
+
+links = TTLCache(
+    max_size=int(os.environ.get('SMARTLINK_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('SMARTLINK_CACHE_TTL', '300'))
+)
+# Unknown slugs are remembered briefly so scanners and typos don't reach the database
+missing = TTLCache(
+    max_size=int(os.environ.get('SMARTLINK_MISSING_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('SMARTLINK_MISSING_TTL', '30'))
+)
+# slug -> lock held while that slug loads; entries go away once the link is cached
+_load_locks: Dict[str, threading.Lock] = {}
+_load_locks_guard = threading.Lock()
+
+LINK_HEADERS = {**JSON_HEADERS, 'Cache-Control': f'public, max-age={BROWSER_MAX_AGE_SECONDS}'}
+
+router = Router(route_key=lambda request: request.params.get('mode'))
+
+instrument_pool(pool)
+
+def is_http_url(url: Any) -> bool:
+    return isinstance(url, str) and url.lower().startswith(('https://', 'http://'))
+
+def build_link(slug: str, row: Dict[str, Any]) -> ResolvedLink:
+    platforms = [
+        {'name': str(platform['name']), 'url': platform['url']}
+        for platform in row['platforms'] or []
+        if isinstance(platform, dict) and platform.get('name') and is_http_url(platform.get('url'))
+        and len(str(platform['name'])) <= MAX_PLATFORM_NAME_LENGTH
+    ]
+    body = dumps({
+        'slug': slug,
+        'releaseName': row['release_name'],
+        'artistName': row['artist_name'],
+        'coverUrl': row['cover_url'],
+        'platforms': platforms
+    })
+    return row['id'], body, {platform['name'].lower(): (platform['name'], platform['url']) for platform in platforms}
+
+def resolve(slug: str) -> Optional[ResolvedLink]:
+    link = links.get(slug)
+    if link is not None:
+        return link
+    if missing.get(slug) is not None:
+        return None
+
+    # One loader per slug, so a burst on a cold slug costs a single query without
+    # holding up other slugs
+    with _load_locks_guard:
+        lock = _load_locks.setdefault(slug, threading.Lock())
+    try:
+        with lock:
+            link = links.get(slug)
+            if link is not None:
+                return link
+            if missing.get(slug) is not None:
+                return None
+            with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    "SELECT id, release_name, artist_name, cover_url, platforms FROM smartlinks WHERE slug = %s AND archived IS NOT TRUE",
+                    (slug,)
+                )
+                row = cur.fetchone()
+            if row is None:
+                missing.set(slug, True)
+                return None
+            link = build_link(slug, row)
+            links.set(slug, link)
+            return link
+    finally:
+        with _load_locks_guard:
+            if _load_locks.get(slug) is lock:
+                del _load_locks[slug]
+
+def slug_param(request: Request) -> str:
+    slug = (request.params.get('slug') or '').strip()
+    if not slug:
+        raise BadRequest('slug required')
+    if len(slug) > MAX_SLUG_LENGTH:
+        raise NotFound('Smart link not found')
+    return slug
+
+@router.route('GET', 'stats')
+def get_stats(request: Request) -> Dict[str, Any]:
+    return respond(200, {
+        'links': links.stats(),
+        'missing': missing.stats(),
+        'clicks': clicks.stats(),
+        'pool': pool.stats()
+    })
+
+@router.route('GET')
+def resolve_link(request: Request) -> Dict[str, Any]:
+    slug = slug_param(request)
+    link = resolve(slug)
+    if link is None:
+        raise NotFound('Smart link not found')
+    smartlink_id, body, targets = link
+
+    platform = request.params.get('platform')
+    if platform:
+        target = targets.get(platform.strip().lower())
+        if target is None:
+            raise NotFound('Platform not found')
+        name, url = target
+        clicks.add(smartlink_id, name)
+        response = respond(302, headers={**CORS_HEADERS, 'Location': url, 'Cache-Control': 'no-store'})
+    else:
+        clicks.add(smartlink_id)
+        response = respond(200, headers=LINK_HEADERS, body=body)
+
+    clicks.flush()
+    return response
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Public smart link resolver with cached payloads and batched click counters
+    Args: event with httpMethod, queryStringParameters (slug, optional platform to redirect)
+    Returns: HTTP response with smart link JSON, or 302 redirect to the chosen platform
+    '''
+    return router.dispatch(event, context)
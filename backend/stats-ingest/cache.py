@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    '''
+    Bounded in-process LRU cache whose entries also expire after ttl seconds.
+    Lives at module level so it survives between warm invocations.
+    '''
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_group(self, group: Hashable) -> None:
+        with self._lock:
+            for key in [k for k in self._data if isinstance(k, tuple) and k[0] == group]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, size=len(self._data))
+
+
+class SharedTier:
+    '''
+    Optional Redis-compatible second tier shared by all instances. Every call
+    is best effort: a slow or missing server only costs a local miss.
+    '''
+
+    def __init__(self, client: Any, ttl: int, errors: Tuple[type, ...]) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.errors = errors
+
+    @classmethod
+    def from_env(cls, ttl: int) -> Optional['SharedTier']:
+        url = os.environ.get('REDIS_URL')
+        if not url:
+            return None
+        try:
+            import redis
+        except ImportError:
+            return None
+        client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        return cls(client, ttl, (redis.RedisError,))
+
+    def get(self, key: str, field: str) -> Optional[str]:
+        try:
+            value = self.client.hget(key, field)
+        except self.errors:
+            return None
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, field: str, value: str) -> None:
+        try:
+            pipe = self.client.pipeline()
+            pipe.hset(key, field, value)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except self.errors:
+            pass
+
+    def delete(self, *keys: str) -> None:
+        if not keys:
+            return
+        try:
+            self.client.delete(*keys)
+        except self.errors:
+            pass
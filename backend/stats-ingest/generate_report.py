@@ -0,0 +1,53 @@
+import argparse
+import csv
+import os
+import random
+import sys
+from datetime import date, timedelta
+from typing import List
+
+PLATFORMS = ('Spotify', 'Apple Music', 'VK Музыка', 'Яндекс Музыка', 'YouTube Music', 'Deezer')
+
+
+def load_isrcs(limit: int) -> List[str]:
+    import psycopg2
+
+    conn = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT DISTINCT isrc FROM release_tracks WHERE isrc IS NOT NULL LIMIT %s", (limit,))
+            return [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Write a synthetic DSP stream report to stdout')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--date', type=date.fromisoformat, default=date.today() - timedelta(days=1))
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--isrcs', type=int, default=10000, help='number of distinct ISRCs to report on')
+    parser.add_argument('--from-db', action='store_true', help='use ISRCs from release_tracks (DATABASE_URL)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    isrcs = load_isrcs(args.isrcs) if args.from_db else [f'RUOLP{n:07d}' for n in range(args.isrcs)]
+    if not isrcs:
+        sys.exit('No ISRCs to report on')
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(('date', 'platform', 'isrc', 'streams', 'revenue'))
+    for n in range(args.rows):
+        streams = int(rng.paretovariate(1.2) * 10)
+        writer.writerow((
+            (args.date - timedelta(days=n % args.days)).isoformat(),
+            rng.choice(PLATFORMS),
+            rng.choice(isrcs),
+            streams,
+            f'{streams * rng.uniform(0.002, 0.006):.4f}'
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import io
+import os
+import hmac
+from typing import Dict, Any
+import psycopg2
+from db import connection, pool
+from ingest import ingest_report
+from tracing import instrument_pool
+from runtime import Router, Request, BadRequest, Forbidden, HttpError, respond
+
+# Reports overwrite streams and revenue that feed analytics and royalty payouts, so only the ingest job may post them
+WORKER_KEY = os.environ.get('STATS_INGEST_KEY', '')
+
+router = Router(allow_headers=('Content-Type', 'X-Worker-Key'))
+
+instrument_pool(pool)
+
+def require_worker_key(request: Request) -> None:
+    if not WORKER_KEY:
+        raise HttpError('Ingest key is not configured', 503)
+    if not hmac.compare_digest((request.header('X-Worker-Key') or '').encode(), WORKER_KEY.encode()):
+        raise Forbidden('Worker key required')
+
+@router.route('POST')
+def ingest(request: Request) -> Dict[str, Any]:
+    require_worker_key(request)
+    body = request.body
+    if not body.strip():
+        raise BadRequest('Report body required')
+
+    report_name = request.params.get('name') or 'upload.csv'
+    with connection() as conn:
+        try:
+            summary = ingest_report(conn, io.StringIO(body, newline=''), report_name)
+        except (ValueError, psycopg2.DataError) as e:
+            raise BadRequest(str(e))
+    return respond(200, {'success': True, **summary})
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Ingest a daily DSP stream/revenue CSV report into release_stats_daily
+    Args: event with httpMethod, headers (X-Worker-Key), queryStringParameters (name), body with CSV report
+    Returns: HTTP response with ingestion batch summary
+    '''
+    return router.dispatch(event, context)
@@ -0,0 +1,302 @@
+import csv
+import hashlib
+import io
+import os
+import sys
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Any, Iterator, IO, Optional
+from cache import SharedTier
+
+REPORT_COLUMNS = ('date', 'platform', 'isrc', 'streams', 'revenue')
+
+# The releases function's shared listing cache; new streams and revenue change the listings of
+# every account touched. Instances' in-process copies still lag by up to RELEASES_CACHE_TTL seconds
+listings = SharedTier.from_env(ttl=int(os.environ.get('RELEASES_CACHE_TTL', '30')))
+
+STAGING_DDL = """
+    CREATE TEMP TABLE stats_staging (
+        stat_date DATE NOT NULL,
+        platform VARCHAR(100) NOT NULL,
+        isrc VARCHAR(50) NOT NULL,
+        streams BIGINT NOT NULL,
+        revenue NUMERIC NOT NULL
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE stats_touched (
+        stat_date DATE NOT NULL,
+        release_id INTEGER NOT NULL
+    ) ON COMMIT DROP
+"""
+
+ROLLUP_SQL = """
+    WITH mapping AS (
+        SELECT DISTINCT ON (isrc) isrc, release_id
+        FROM release_tracks
+        WHERE isrc IN (SELECT DISTINCT isrc FROM stats_staging)
+        ORDER BY isrc, release_id
+    ),
+    staged AS (
+        SELECT s.stat_date, s.platform, s.isrc, m.release_id,
+               sum(s.streams) AS streams, round(sum(s.revenue), 2) AS revenue
+        FROM stats_staging s
+        JOIN mapping m USING (isrc)
+        GROUP BY s.stat_date, s.platform, s.isrc, m.release_id
+    ),
+    previous AS (
+        SELECT d.stat_date, d.platform, d.isrc, d.release_id, d.streams, d.revenue, s.release_id AS new_release_id
+        FROM release_stats_daily d
+        JOIN staged s USING (stat_date, platform, isrc)
+    ),
+    upserted AS (
+        INSERT INTO release_stats_daily (stat_date, platform, isrc, release_id, streams, revenue, batch_id)
+        SELECT stat_date, platform, isrc, release_id, streams, revenue, %(batch_id)s FROM staged
+        ON CONFLICT (stat_date, platform, isrc) DO UPDATE
+        SET release_id = EXCLUDED.release_id,
+            streams = EXCLUDED.streams,
+            revenue = EXCLUDED.revenue,
+            batch_id = EXCLUDED.batch_id
+        WHERE (release_stats_daily.release_id, release_stats_daily.streams, release_stats_daily.revenue)
+              IS DISTINCT FROM (EXCLUDED.release_id, EXCLUDED.streams, EXCLUDED.revenue)
+        RETURNING stat_date, platform, isrc, release_id, revenue
+    ),
+    touched AS (
+        INSERT INTO stats_touched (stat_date, release_id)
+        SELECT stat_date, release_id FROM upserted
+        UNION
+        SELECT stat_date, release_id FROM previous WHERE release_id <> new_release_id
+        RETURNING 1
+    ),
+    -- Rows dated in a month a statement already settled keep the difference for the next one
+    adjusted AS (
+        INSERT INTO royalty_adjustments (batch_id, stat_date, platform, isrc, release_id, revenue)
+        SELECT %(batch_id)s, stat_date, platform, isrc, release_id, sum(revenue)
+        FROM (
+            SELECT stat_date, platform, isrc, release_id, revenue FROM upserted
+            UNION ALL
+            SELECT p.stat_date, p.platform, p.isrc, p.release_id, -p.revenue
+            FROM previous p
+            JOIN upserted u USING (stat_date, platform, isrc)
+        ) changes
+        WHERE stat_date < (SELECT max(period_end) FROM royalty_statements)
+        GROUP BY stat_date, platform, isrc, release_id
+        HAVING sum(revenue) <> 0
+        RETURNING 1
+    ),
+    deltas AS (
+        SELECT release_id, sum(streams) AS streams, sum(revenue) AS revenue
+        FROM (
+            SELECT release_id, streams, revenue FROM staged
+            UNION ALL
+            SELECT release_id, -streams, -revenue FROM previous
+        ) changes
+        GROUP BY release_id
+        HAVING sum(streams) <> 0 OR sum(revenue) <> 0
+    ),
+    updated AS (
+        UPDATE releases r
+        SET streams = COALESCE(r.streams, 0) + d.streams,
+            revenue = COALESCE(r.revenue, 0) + d.revenue,
+            updated_at = CURRENT_TIMESTAMP
+        FROM deltas d
+        WHERE r.id = d.release_id
+        RETURNING r.id
+    )
+    SELECT
+        (SELECT count(*) FROM staged) AS rows_loaded,
+        (SELECT count(*) FROM upserted) AS rows_changed,
+        (SELECT count(*) FROM updated) AS releases_updated,
+        (SELECT count(*) FROM adjusted) AS rows_adjusted,
+        (SELECT count(*) FROM stats_staging s
+         WHERE NOT EXISTS (SELECT 1 FROM mapping m WHERE m.isrc = s.isrc)) AS rows_unmatched
+"""
+
+# Waits out a statement run and keeps the next one from starting until this report commits,
+# so every row lands either in a statement's month or in its adjustments
+SETTLEMENT_LOCK_SQL = "LOCK TABLE royalty_statements IN SHARE MODE"
+
+
+ANALYTICS_REFRESH_SQL = """
+    DELETE FROM analytics_release_daily a
+    USING stats_touched t
+    WHERE a.release_id = t.release_id AND a.stat_date = t.stat_date;
+
+    INSERT INTO analytics_release_daily (user_id, stat_date, release_id, streams, revenue)
+    SELECT r.user_id, d.stat_date, d.release_id, sum(d.streams), sum(d.revenue)
+    FROM (SELECT DISTINCT stat_date, release_id FROM stats_touched) t
+    JOIN release_stats_daily d ON d.release_id = t.release_id AND d.stat_date = t.stat_date
+    JOIN releases r ON r.id = d.release_id
+    GROUP BY r.user_id, d.stat_date, d.release_id;
+
+    CREATE TEMP TABLE stats_touched_users ON COMMIT DROP AS
+    SELECT DISTINCT r.user_id, t.stat_date
+    FROM stats_touched t
+    JOIN releases r ON r.id = t.release_id;
+
+    DELETE FROM analytics_user_daily a
+    USING stats_touched_users u
+    WHERE a.user_id = u.user_id AND a.stat_date = u.stat_date;
+
+    INSERT INTO analytics_user_daily (user_id, stat_date, platform, streams, revenue)
+    SELECT u.user_id, d.stat_date, d.platform, sum(d.streams), sum(d.revenue)
+    FROM stats_touched_users u
+    JOIN releases r ON r.user_id = u.user_id
+    JOIN release_stats_daily d ON d.release_id = r.id AND d.stat_date = u.stat_date
+    GROUP BY u.user_id, d.stat_date, d.platform;
+"""
+
+# Last write before commit, so the row lock is held only for the commit itself
+WATERMARK_SQL = "UPDATE stats_watermark SET version = version + 1, updated_at = CURRENT_TIMESTAMP RETURNING version"
+
+
+def _copy_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class ReportReader:
+    '''
+    Reads a DSP CSV report (date, platform, isrc, streams, revenue) row by row
+    and exposes it as a file-like COPY source, so psycopg2 pulls the report
+    through in small chunks instead of loading it into memory.
+    '''
+
+    def __init__(self, fileobj: IO[str]) -> None:
+        self.rows_read = 0
+        self.rows_rejected = 0
+        self._sha256 = hashlib.sha256()
+        reader = csv.DictReader(fileobj)
+        missing = [c for c in REPORT_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f'Report is missing columns: {", ".join(missing)}')
+        self._lines = self._iter_copy_lines(reader)
+        self._buffer = ''
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def _iter_copy_lines(self, reader: csv.DictReader) -> Iterator[str]:
+        for row in reader:
+            self.rows_read += 1
+            line = self._parse_row(row)
+            if line is None:
+                self.rows_rejected += 1
+                continue
+            self._sha256.update(line.encode())
+            yield line
+
+    def _parse_row(self, row: Dict[str, str]) -> Optional[str]:
+        try:
+            stat_date = date.fromisoformat((row['date'] or '').strip())
+            platform = (row['platform'] or '').strip()
+            isrc = (row['isrc'] or '').strip().upper()
+            streams = int(row['streams'] or 0)
+            revenue = Decimal((row['revenue'] or '0').strip() or '0')
+        except (ValueError, InvalidOperation):
+            return None
+        if not platform or not isrc or streams < 0:
+            return None
+        return '\t'.join((
+            stat_date.isoformat(),
+            _copy_escape(platform[:100]),
+            _copy_escape(isrc[:50]),
+            str(streams),
+            str(revenue)
+        )) + '\n'
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            chunk, self._buffer = self._buffer, ''
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def ensure_partitions(cur: Any) -> None:
+    cur.execute("SELECT DISTINCT date_trunc('month', stat_date)::date FROM stats_staging")
+    for (month,) in cur.fetchall():
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS release_stats_daily_{month:%Y_%m} "
+            f"PARTITION OF release_stats_daily FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+
+
+def ingest_report(conn: Any, fileobj: IO[str], report_name: str) -> Dict[str, Any]:
+    '''
+    Loads one report in a single transaction: COPY into a temp staging table,
+    upsert into release_stats_daily, apply per-release deltas to
+    releases.streams/revenue, record revenue changes to already settled
+    months in royalty_adjustments, rebuild the analytics rollups for the
+    touched days and bump stats_watermark. The touched accounts' shared
+    listing cache entries are dropped once it commits. Re-running the same
+    report changes nothing but the watermark.
+    '''
+    reader = ReportReader(fileobj)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(STAGING_DDL)
+            cur.copy_expert(
+                'COPY stats_staging (stat_date, platform, isrc, streams, revenue) FROM STDIN',
+                reader,
+                size=65536
+            )
+            ensure_partitions(cur)
+            cur.execute(
+                "INSERT INTO stats_ingest_batches (report_name) VALUES (%s) RETURNING id",
+                (report_name,)
+            )
+            batch_id = cur.fetchone()[0]
+            cur.execute(SETTLEMENT_LOCK_SQL)
+            cur.execute(ROLLUP_SQL, {'batch_id': batch_id})
+            rows_loaded, rows_changed, releases_updated, rows_adjusted, rows_unmatched = cur.fetchone()
+            cur.execute(ANALYTICS_REFRESH_SQL)
+            cur.execute("SELECT DISTINCT user_id FROM stats_touched_users")
+            touched_users = [user_id for (user_id,) in cur.fetchall()]
+            cur.execute("""
+                UPDATE stats_ingest_batches
+                SET report_sha256 = %s, rows_read = %s, rows_loaded = %s,
+                    rows_unmatched = %s, releases_updated = %s
+                WHERE id = %s
+            """, (reader.sha256, reader.rows_read, rows_loaded, rows_unmatched, releases_updated, batch_id))
+            cur.execute(WATERMARK_SQL)
+            watermark = cur.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if listings:
+        listings.delete(*(f'releases:{user_id}' for user_id in touched_users))
+
+    return {
+        'batchId': batch_id,
+        'rowsRead': reader.rows_read,
+        'rowsRejected': reader.rows_rejected,
+        'rowsLoaded': rows_loaded,
+        'rowsChanged': rows_changed,
+        'rowsUnmatched': rows_unmatched,
+        'releasesUpdated': releases_updated,
+        'rowsAdjusted': rows_adjusted,
+        'watermark': watermark
+    }
+
+
+if __name__ == '__main__':
+    import json
+    import psycopg2
+
+    if len(sys.argv) < 2:
+        print('Usage: python ingest.py REPORT.csv [REPORT.csv ...]', file=sys.stderr)
+        sys.exit(1)
+
+    connection = psycopg2.connect(os.environ.get('DATABASE_URL'))
+    try:
+        for path in sys.argv[1:]:
+            with io.open(path, newline='', encoding='utf-8') as report:
+                print(json.dumps({'report': path, **ingest_report(connection, report, os.path.basename(path))}))
+    finally:
+        connection.close()
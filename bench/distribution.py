@@ -0,0 +1,117 @@
+import argparse
+import os
+import sys
+import time
+import threading
+from typing import Any, Dict, List
+
+import psycopg2
+
+# Stub platforms answer quickly and retry immediately so a run measures the queue, not the backoff
+BENCH_ENV = {
+    'DISTRIBUTION_STUB_LATENCY_MS': '20',
+    'DISTRIBUTION_STUB_FAILURE_RATE': '0.05',
+    'DISTRIBUTION_BACKOFF_BASE': '0',
+    'DISTRIBUTION_RATE_PER_SECOND': '100000',
+    'DISTRIBUTION_POLL_SECONDS': '0.05',
+}
+
+
+def pick_releases(conn: psycopg2.extensions.connection, count: int) -> List[Any]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, user_id, status FROM releases WHERE status <> 'Удалён' ORDER BY id LIMIT %s", (count,))
+        return cur.fetchall()
+
+
+def reset(conn: psycopg2.extensions.connection, releases: List[Any]) -> None:
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM distribution_jobs WHERE release_id = ANY(%s)", ([release[0] for release in releases],))
+        cur.executemany("UPDATE releases SET status = %s WHERE id = %s", [(status, release_id) for release_id, _, status in releases])
+    conn.commit()
+
+
+def check(conn: psycopg2.extensions.connection, release_ids: List[int], adapters: Dict[str, Any]) -> List[str]:
+    '''
+    Every job must be delivered, each idempotency key handed to its platform exactly
+    once, and every release published.
+    '''
+    problems = []
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT status, count(*) FROM distribution_jobs WHERE release_id = ANY(%s) GROUP BY status",
+            (release_ids,)
+        )
+        statuses = dict(cur.fetchall())
+        cur.execute("SELECT count(*) FROM releases WHERE id = ANY(%s) AND status <> 'Опубликован'", (release_ids,))
+        unpublished = cur.fetchone()[0]
+    if set(statuses) != {'delivered'}:
+        problems.append(f'job statuses {statuses}')
+    duplicated = {key: n for adapter in adapters.values() for key, n in adapter.deliveries.items() if n > 1}
+    if duplicated:
+        problems.append(f'{len(duplicated)} idempotency keys delivered more than once')
+    delivered = sum(len(adapter.deliveries) for adapter in adapters.values())
+    if delivered != statuses.get('delivered', 0):
+        problems.append(f'{delivered} stub deliveries for {statuses.get("delivered", 0)} delivered jobs')
+    if unpublished:
+        problems.append(f'{unpublished} releases not published')
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measure distribution queue throughput per worker count and check exactly-once delivery')
+    parser.add_argument('--releases', type=int, default=100, help='releases submitted per run (each fans out to every platform)')
+    parser.add_argument('--workers', default='1,2,4,8,16', help='comma-separated worker pool sizes')
+    parser.add_argument('--pools', type=int, default=1, help='pools draining the queue at once, like separate function instances')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('BENCH_DATABASE_URL')
+    if not database_url:
+        sys.exit('Set BENCH_DATABASE_URL to a database seeded with bench/seed.py')
+    os.environ['DATABASE_URL'] = database_url
+    for name, value in BENCH_ENV.items():
+        os.environ.setdefault(name, value)
+
+    from run import load_function, make_event
+
+    function = load_function('distribution')
+    adapters = function.modules['adapters'].ADAPTERS
+    WorkerPool = function.modules['worker'].WorkerPool
+
+    conn = psycopg2.connect(database_url)
+    releases = pick_releases(conn, args.releases)
+    release_ids = [release[0] for release in releases]
+    failed = False
+
+    print(f"{'workers':>8s} {'jobs':>7s} {'seconds':>8s} {'jobs/s':>8s} {'retried':>8s}  check")
+    for workers in (int(level) for level in args.workers.split(',')):
+        reset(conn, releases)
+        for adapter in adapters.values():
+            adapter.deliveries.clear()
+        for release_id, user_id, _ in releases:
+            response = function.handler(make_event('POST', body={'userId': user_id, 'releaseId': release_id}), None)
+            if response['statusCode'] != 200:
+                sys.exit(f'Submitting release {release_id} failed: {response["body"]}')
+
+        pools = [WorkerPool(adapters, workers=workers) for _ in range(args.pools)]
+        threads = [threading.Thread(target=pool.run, args=(600, True)) for pool in pools]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stats = {name: sum(pool.stats()[name] for pool in pools) for name in ('delivered', 'retried')}
+
+        problems = check(conn, release_ids, adapters)
+        failed = failed or bool(problems)
+        print(f"{workers:8d} {stats['delivered']:7d} {elapsed:8.2f} {stats['delivered'] / elapsed:8.1f} {stats['retried']:8d}  "
+              f"{'; '.join(problems) or 'ok'}")
+
+    reset(conn, releases)
+    conn.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from run import BENCH_WORKER_KEY, WORKER_KEY_VARS, Function, Scenario, authorize, load_catalog, load_function, make_event, synthetic_scenarios, test_scenarios
+
+FUNCTIONS = ('releases', 'auth', 'analytics', 'smartlinks', 'distribution', 'media', 'royalties')
+
+# Hot-path tables; sequential scans on them are regressions once they hold real data
+WATCHED_TABLES = {
+    'users', 'releases', 'release_tracks', 'smartlinks', 'smartlink_clicks',
+    'release_stats_daily', 'analytics_user_daily', 'analytics_release_daily',
+}
+# Incremental Sort only orders rows within groups its input already arrives in
+SORT_NODES = ('Sort',)
+
+# Caches would hide the statements this check is meant to plan
+UNCACHED_ENV = {
+    'RELEASES_CACHE_SIZE': '0',
+    'ANALYTICS_CACHE_SIZE': '0',
+    'SMARTLINK_CACHE_SIZE': '0',
+    'SMARTLINK_MISSING_CACHE_SIZE': '0',
+    'SMARTLINK_FLUSH_EVERY': '1',
+}
+
+
+class Violation(NamedTuple):
+    fingerprint: str
+    scenario: str
+    reason: str
+    sql: str
+
+
+class PlanCapture:
+    '''
+    Connection factory hook: EXPLAINs every statement a handler sends (on the same
+    connection, before it runs) and keeps the plan with the scenario that caused it.
+    '''
+
+    def __init__(self, tracing: Any) -> None:
+        self.tracing = tracing
+        self.scenario = ''
+        self.plans: List[Tuple[str, str, str, Any]] = []
+        capture = self
+
+        class ExplainingCursorMixin:
+            def execute(self, query: Any, vars: Any = None) -> Any:
+                # Named (server-side) cursors are planned for fast start, so plan them as cursors
+                if self.name:
+                    capture.record(self.connection, 'DECLARE plan_check CURSOR FOR ' + query, vars)
+                else:
+                    capture.record(self.connection, query, vars)
+                return super().execute(query, vars)
+
+        cursor_classes: Dict[type, type] = {}
+
+        class ExplainingConnection(psycopg2.extensions.connection):
+            def cursor(self, *args: Any, **kwargs: Any) -> Any:
+                factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+                explaining = cursor_classes.get(factory)
+                if explaining is None:
+                    explaining = cursor_classes[factory] = type(f'Explaining{factory.__name__}', (ExplainingCursorMixin, factory), {})
+                kwargs['cursor_factory'] = explaining
+                return super().cursor(*args, **kwargs)
+
+        self.connection_factory = ExplainingConnection
+
+    def record(self, conn: Any, query: Any, vars: Any) -> None:
+        text = self.tracing.normalize_sql(query)
+        if text.upper().startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK')) or text == 'SELECT ?':
+            return
+        plan = self.tracing.explain(conn, query, vars)
+        if plan is not None and 'error' not in plan:
+            self.plans.append((self.scenario, self.tracing.fingerprint(text), text, plan[0]['Plan']))
+
+
+def walk(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk(child)
+
+
+def table_rows(conn: psycopg2.extensions.connection) -> Dict[str, float]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p') AND relname = ANY(%s)", (list(WATCHED_TABLES),))
+        return dict(cur.fetchall())
+
+
+def check_plan(plan: Dict[str, Any], rows: Dict[str, float], min_table_rows: int, max_sort_rows: int) -> List[str]:
+    problems = []
+    for node in walk(plan):
+        relation = node.get('Relation Name')
+        if node['Node Type'] == 'Seq Scan' and relation in WATCHED_TABLES and rows.get(relation, 0) >= min_table_rows:
+            problems.append(f'Seq Scan on {relation} (~{int(rows[relation])} rows)')
+        if node['Node Type'] in SORT_NODES and node.get('Plan Rows', 0) > max_sort_rows:
+            problems.append(f"{node['Node Type']} of ~{node['Plan Rows']} rows on {', '.join(node.get('Sort Key', []))}")
+    return problems
+
+
+def heavy_user_scenarios(user_id: int, release_id: int, created_at: Any, encode_cursor: Any) -> List[Scenario]:
+    '''
+    Listing shapes for the account with the largest catalog, where a missing
+    index turns into a full sort rather than a few extra milliseconds.
+    '''
+    params = {'userId': str(user_id)}
+    cursor = encode_cursor(created_at, release_id)
+    return [
+        Scenario('heavy user first page', 'releases', 1, lambda rng: make_event('GET', params)),
+        Scenario('heavy user next page', 'releases', 1, lambda rng: make_event('GET', dict(params, cursor=cursor))),
+        Scenario('heavy user active scope', 'releases', 1, lambda rng: make_event('GET', dict(params, scope='active'))),
+        Scenario('heavy user deleted scope', 'releases', 1, lambda rng: make_event('GET', dict(params, scope='deleted'))),
+        Scenario('heavy user with tracks', 'releases', 1, lambda rng: make_event('GET', dict(params, include='tracks', limit='50'))),
+        Scenario('heavy user export', 'releases', 1, lambda rng: make_event('GET', dict(params, mode='export', format='ndjson'))),
+        Scenario('heavy user search', 'releases', 1, lambda rng: make_event('GET', dict(params, mode='search', q='bench release'))),
+        Scenario('heavy user isrc search', 'releases', 1, lambda rng: make_event('GET', dict(params, mode='search', q='RUBEN001'))),
+        Scenario('heavy user soft delete', 'releases', 1, lambda rng: make_event('DELETE', body={'userId': user_id, 'releaseId': release_id})),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='EXPLAIN every statement the handlers send and fail on seq scans or large sorts')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each synthetic scenario with different random inputs')
+    parser.add_argument('--min-table-rows', type=int, default=1000, help='ignore seq scans on tables smaller than this')
+    parser.add_argument('--max-sort-rows', type=int, default=1000, help='largest sort input tolerated')
+    parser.add_argument('--json', action='store_true', help='print captured plans as JSON')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('BENCH_DATABASE_URL')
+    if not database_url:
+        sys.exit('Set BENCH_DATABASE_URL to a database seeded with bench/seed.py')
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.update(UNCACHED_ENV)
+    os.environ.update({var: BENCH_WORKER_KEY for var in WORKER_KEY_VARS})
+    os.environ.pop('OPENAI_API_KEY', None)
+
+    functions: Dict[str, Function] = {name: load_function(name) for name in FUNCTIONS}
+    capture = PlanCapture(functions['releases'].modules['tracing'])
+    for function in functions.values():
+        function.modules['db'].pool.connection_factory = capture.connection_factory
+
+    catalog = load_catalog(200)
+    if not catalog.users or not catalog.releases:
+        sys.exit('No bench data found; run bench/seed.py first')
+
+    conn = psycopg2.connect(database_url)
+    try:
+        rows = table_rows(conn)
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT r.user_id, r.id, r.created_at FROM releases r
+                   WHERE r.user_id = (SELECT user_id FROM releases GROUP BY user_id ORDER BY count(*) DESC LIMIT 1)
+                   ORDER BY r.created_at DESC, r.id DESC OFFSET 100 LIMIT 1"""
+            )
+            heavy = cur.fetchone()
+    finally:
+        conn.close()
+
+    scenarios: List[Scenario] = [scenario for name in FUNCTIONS for scenario in test_scenarios(name)]
+    for mix in ('browse', 'write', 'viral'):
+        scenarios += synthetic_scenarios(mix, catalog, functions) * args.repeat
+    if heavy:
+        scenarios += heavy_user_scenarios(heavy[0], heavy[1], heavy[2], functions['releases'].modules['index'].encode_cursor)
+
+    tokens = functions['releases'].modules.get('tokens')
+    rng = random.Random(42)
+    for scenario in scenarios:
+        capture.scenario = f'{scenario.function}: {scenario.name}'
+        try:
+            functions[scenario.function].handler(authorize(scenario.build(rng), tokens), None)
+        except Exception as e:
+            # The statement was planned before it ran, so the plan still counts
+            print(f'{capture.scenario}: {type(e).__name__}: {e}'.strip(), file=sys.stderr)
+
+    violations: Dict[Tuple[str, str], Violation] = {}
+    for scenario, fingerprint, text, plan in capture.plans:
+        for reason in check_plan(plan, rows, args.min_table_rows, args.max_sort_rows):
+            violations.setdefault((fingerprint, reason), Violation(fingerprint, scenario, reason, text))
+
+    if args.json:
+        print(json.dumps([
+            {'scenario': scenario, 'fingerprint': fingerprint, 'sql': text, 'plan': plan}
+            for scenario, fingerprint, text, plan in capture.plans
+        ], ensure_ascii=False, indent=2, default=str))
+
+    statements = {fingerprint for _, fingerprint, _, _ in capture.plans}
+    print(f'Planned {len(capture.plans)} statements ({len(statements)} distinct) from {len(scenarios)} requests', file=sys.stderr)
+    if violations:
+        for violation in violations.values():
+            print(f'[{violation.fingerprint}] {violation.reason}\n    via {violation.scenario}\n    {violation.sql[:300]}', file=sys.stderr)
+        sys.exit(1)
+    print('No seq scans on hot tables or large sorts', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
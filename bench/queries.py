@@ -0,0 +1,99 @@
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Tuple
+
+import psycopg2
+
+import run
+from run import authorize, install_query_counter, load_function, make_event
+from plans import UNCACHED_ENV
+
+# Listing shapes whose round trips must not grow with the catalog or the page
+LISTINGS: List[Tuple[str, Dict[str, str]]] = [
+    ('first page', {}),
+    ('full page', {'limit': '500'}),
+    ('next page', {'cursor': ''}),
+    ('active scope', {'scope': 'active'}),
+    ('projection', {'fields': 'title,status,streams'}),
+    ('with tracks', {'include': 'tracks', 'limit': '20'}),
+    ('with tracks, full page', {'include': 'tracks', 'limit': '500'}),
+]
+
+
+def pick_users(conn: psycopg2.extensions.connection) -> List[Tuple[int, int, int, Any]]:
+    '''
+    The smallest and the largest catalog among seeded accounts, each with its
+    newest release for the cursor page to start after.
+    '''
+    with conn.cursor() as cur:
+        cur.execute(
+            """WITH sizes AS (
+                   SELECT user_id, count(*) AS releases FROM releases GROUP BY user_id
+               ), picked AS (
+                   (SELECT * FROM sizes ORDER BY releases, user_id LIMIT 1)
+                   UNION ALL
+                   (SELECT * FROM sizes ORDER BY releases DESC, user_id LIMIT 1)
+               )
+               SELECT p.user_id, p.releases, first.id, first.created_at
+               FROM picked p
+               CROSS JOIN LATERAL (
+                   SELECT r.id, r.created_at FROM releases r WHERE r.user_id = p.user_id
+                   ORDER BY r.created_at DESC, r.id DESC LIMIT 1
+               ) first"""
+        )
+        return cur.fetchall()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Count database round trips per listing request on a small and a large catalog')
+    # BEGIN, the ETag validator, the page itself and the closing ROLLBACK
+    parser.add_argument('--max-queries', type=int, default=4, help='round trips allowed per listing request')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('BENCH_DATABASE_URL')
+    if not database_url:
+        sys.exit('Set BENCH_DATABASE_URL to a database seeded with bench/seed.py')
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.update(UNCACHED_ENV)
+
+    install_query_counter()
+    function = load_function('releases')
+    encode_cursor = function.modules['index'].encode_cursor
+    tokens = function.modules.get('tokens')
+
+    conn = psycopg2.connect(database_url)
+    try:
+        users = pick_users(conn)
+    finally:
+        conn.close()
+    if len(users) < 2 or users[0][1] == users[1][1]:
+        sys.exit('Need accounts with different catalog sizes; run bench/seed.py first')
+
+    problems = []
+    print(f"{'listing':<24}" + ''.join(f'{f"{releases} releases":>16}' for _, releases, _, _ in users))
+    for name, extra in LISTINGS:
+        counts = []
+        for user_id, _, release_id, created_at in users:
+            params = dict(extra, userId=str(user_id))
+            if 'cursor' in params:
+                params['cursor'] = encode_cursor(created_at, release_id)
+            run._counter.queries = 0
+            response = function.handler(authorize(make_event('GET', params), tokens), None)
+            if response['statusCode'] != 200:
+                problems.append(f"{name}: status {response['statusCode']} for user {user_id}")
+            counts.append(run._counter.queries)
+        print(f'{name:<24}' + ''.join(f'{count:>16}' for count in counts))
+        if len(set(counts)) > 1:
+            problems.append(f'{name}: round trips grow with the catalog ({" vs ".join(map(str, counts))})')
+        if max(counts) > args.max_queries:
+            problems.append(f'{name}: {max(counts)} round trips, more than {args.max_queries}')
+
+    if problems:
+        print('\n' + '\n'.join(problems), file=sys.stderr)
+        sys.exit(1)
+    print(f'\nEvery listing takes the same round trips on both catalogs, at most {args.max_queries}')
+
+
+if __name__ == '__main__':
+    main()
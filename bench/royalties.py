@@ -0,0 +1,228 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import psycopg2
+
+PLATFORMS = ('Spotify', 'Apple Music', 'Яндекс Музыка', 'VK Музыка', 'YouTube Music',
+             'Deezer', 'Tidal', 'Amazon Music', 'Звук', 'МТС Музыка')
+
+# One row per (track, platform) for the month, spread over its days so the primary key holds
+SEED_STATS_SQL = """
+    INSERT INTO release_stats_daily (stat_date, platform, isrc, release_id, streams, revenue)
+    SELECT %(start)s::date + (t.id %% %(days)s), p.platform, t.isrc, t.release_id,
+           floor(random() * 1000)::int, round((power(random(), 3) * 20)::numeric, 2)
+    FROM (SELECT id, isrc, release_id FROM release_tracks WHERE isrc IS NOT NULL ORDER BY id LIMIT %(tracks)s) t
+    CROSS JOIN unnest(%(platforms)s::text[]) AS p(platform)
+"""
+
+# Undo a statement the benchmark ran, so the next run starts from the same balances
+UNDO_STATEMENT_SQL = (
+    """UPDATE royalty_payees p SET balance_kopecks = l.opening_kopecks
+       FROM royalty_statement_lines l WHERE l.statement_id = %(id)s AND p.id = l.payee_id""",
+    "DELETE FROM royalty_statement_lines WHERE statement_id = %(id)s",
+    "UPDATE royalty_adjustments SET statement_id = NULL WHERE statement_id = %(id)s",
+    "DELETE FROM royalty_statements WHERE id = %(id)s",
+)
+
+
+def synthetic(rows: int, releases: int, tracks_per_release: int, users: int, seed: int) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any], Any]:
+    '''
+    A catalog shaped like bench/seed.py (skewed owners, two credited names per track,
+    a third of tracks with an extra artist) and a generator of stat-row blocks.
+    '''
+    rng = np.random.default_rng(seed)
+    release_ids = np.arange(1, releases + 1, dtype=np.int64)
+    owners = (np.floor(rng.random(releases) ** 3 * users) + 1).astype(np.int64)
+    track_release = np.repeat(release_ids, tracks_per_release)
+    track_ids = np.arange(1, len(track_release) + 1, dtype=np.int64)
+    # payee ids: owner accounts 1..users, their authors users+1.., producers 2*users+1.., extra artists 3*users+1..
+    author, producer, extra = owners[track_release - 1] + users, owners[track_release - 1] + 2 * users, owners[track_release - 1] + 3 * users
+    with_extra = rng.random(len(track_ids)) < 0.3
+    credits = {
+        'track_id': np.concatenate([track_ids, track_ids, track_ids, track_ids[with_extra]]),
+        'release_id': np.concatenate([track_release, track_release, track_release, track_release[with_extra]]),
+        'payee_id': np.concatenate([author, author, producer, extra[with_extra]]),
+        'share_bps': np.concatenate([np.full(len(track_ids), 2500), np.full(len(track_ids), 2500),
+                                     np.full(len(track_ids), 1000), np.full(int(with_extra.sum()), 1000)]).astype(np.int64),
+    }
+    payees = {'id': np.arange(1, 4 * users + 1, dtype=np.int64),
+              'balance_kopecks': rng.integers(0, 15000, 4 * users).astype(np.int64)}
+
+    def blocks(block_rows: int) -> Any:
+        block_rng = np.random.default_rng(seed + 1)
+        for offset in range(0, rows, block_rows):
+            count = min(block_rows, rows - offset)
+            # a few percent of rows carry ISRCs that match no track (track 0) or a deleted release
+            track = block_rng.integers(1, len(track_ids) + 1, count)
+            release = track_release[track - 1].copy()
+            track[block_rng.random(count) < 0.02] = 0
+            release[block_rng.random(count) < 0.001] = releases + 10
+            yield {'release_id': release, 'track_id': track, 'kopecks': block_rng.integers(0, 2000, count).astype(np.int64)}
+
+    return {'id': release_ids, 'payee_id': owners}, credits, payees, blocks
+
+
+def reference(releases: Dict[str, Any], credits: Dict[str, Any], payees: Dict[str, Any], stats: Any, min_payout: int) -> Dict[int, Tuple[int, ...]]:
+    '''
+    The row-by-row computation the engine replaces, kept deliberately naive.
+    '''
+    owner = dict(zip(releases['id'].tolist(), releases['payee_id'].tolist()))
+    track_credits = defaultdict(list)
+    for track, release, payee, bps in zip(*(credits[name].tolist() for name in ('track_id', 'release_id', 'payee_id', 'share_bps'))):
+        track_credits[track].append((release, payee, bps))
+    release_total: Dict[int, int] = defaultdict(int)
+    track_total: Dict[int, int] = defaultdict(int)
+    for block in stats:
+        for release, track, kopecks in zip(block['release_id'].tolist(), block['track_id'].tolist(), block['kopecks'].tolist()):
+            if release in owner:
+                release_total[release] += kopecks
+                if track in track_credits:
+                    track_total[track] += kopecks
+    earned: Dict[int, int] = defaultdict(int)
+    for release, total in release_total.items():
+        earned[owner[release]] += total
+    for track, total in track_total.items():
+        for release, payee, bps in track_credits[track]:
+            share = total * bps // 10000
+            earned[payee] += share
+            earned[owner[release]] -= share
+    lines = {}
+    for payee, opening in zip(payees['id'].tolist(), payees['balance_kopecks'].tolist()):
+        balance = opening + earned.get(payee, 0)
+        paid = balance if balance >= min_payout else 0
+        if earned.get(payee, 0) or paid:
+            lines[payee] = (opening, earned.get(payee, 0), paid, balance - paid)
+    return lines
+
+
+def bench_engine(args: argparse.Namespace, Ledger: Any, min_payout: int) -> bool:
+    releases, credits, payees, blocks = synthetic(args.rows, args.releases, args.tracks_per_release, args.users, args.seed)
+    print(f"engine: {args.rows:,} stat rows, {len(releases['id']):,} releases, {len(credits['track_id']):,} credits, {len(payees['id']):,} payees")
+
+    started = time.perf_counter()
+    ledger = Ledger(releases, credits, payees)
+    setup = time.perf_counter() - started
+    generated = list(blocks(args.block_rows))
+    tracemalloc.start()
+    started = time.perf_counter()
+    for block in generated:
+        ledger.add(block)
+    lines = ledger.close(min_payout)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total = sum(int(block['kopecks'].sum()) for block in generated)
+    conserved = int(lines['earned'].sum()) + ledger.unmatched_kopecks == total
+    print(f'  setup {setup:.2f}s, add+close {elapsed:.2f}s = {ledger.rows / elapsed / 1e6:.1f}M rows/s, '
+          f'peak +{peak / 2 ** 20:.0f} MiB over the inputs, {int((lines["paid"] > 0).sum()):,} payouts, '
+          f'every kopeck accounted for: {conserved}')
+
+    # Same catalog, first check_rows rows: the engine must match the row-by-row reference exactly
+    sample = []
+    remaining = args.check_rows
+    for block in generated:
+        if remaining <= 0:
+            break
+        sample.append({name: column[:remaining] for name, column in block.items()})
+        remaining -= len(sample[-1]['kopecks'])
+    started = time.perf_counter()
+    expected = reference(releases, credits, payees, sample, min_payout)
+    reference_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    check = Ledger(releases, credits, payees)
+    for block in sample:
+        check.add(block)
+    got = check.close(min_payout)
+    engine_seconds = time.perf_counter() - started
+    actual = {payee: row for payee, *row in zip(*(got[name].tolist() for name in ('payee_id', 'opening', 'earned', 'paid', 'closing')))}
+    matches = {payee: tuple(row) for payee, row in actual.items()} == expected
+    print(f'  reference on {args.check_rows:,} rows: {reference_seconds:.2f}s row by row vs {engine_seconds:.2f}s '
+          f'(setup included), identical lines: {matches}')
+    return conserved and matches
+
+
+def bench_database(args: argparse.Namespace, statements: Any) -> bool:
+    database_url = os.environ.get('BENCH_DATABASE_URL')
+    if not database_url:
+        sys.exit('Set BENCH_DATABASE_URL to a database seeded with bench/seed.py')
+    start = statements.month_start(args.month)
+    end = statements.next_month(start)
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE TABLE IF NOT EXISTS release_stats_daily_{start:%Y_%m} "
+                        f"PARTITION OF release_stats_daily FOR VALUES FROM ('{start}') TO ('{end}')")
+            cur.execute("SELECT count(*) FROM release_stats_daily WHERE stat_date >= %s AND stat_date < %s", (start, end))
+            if cur.fetchone()[0] < args.rows:
+                cur.execute("DELETE FROM release_stats_daily WHERE stat_date >= %s AND stat_date < %s", (start, end))
+                seeding = time.perf_counter()
+                cur.execute(SEED_STATS_SQL, {'start': start, 'days': (end - start).days, 'tracks': args.rows // len(PLATFORMS),
+                                             'platforms': list(PLATFORMS)})
+                print(f'seeded {cur.rowcount:,} stat rows for {args.month} in {time.perf_counter() - seeding:.0f}s')
+            cur.execute("SELECT max(period_start) FROM royalty_statements")
+            last = cur.fetchone()[0]
+            if last is not None and start != statements.next_month(last):
+                sys.exit(f'Statements exist up to {last:%Y-%m}; --month must be {statements.next_month(last):%Y-%m}')
+        conn.commit()
+        with conn.cursor() as cur:
+            cur.execute(f'ANALYZE release_stats_daily_{start:%Y_%m}')
+        conn.commit()
+
+        summary = statements.run_statement(conn, start)
+        print(f"database: {summary['rowsRead']:,} rows, {summary['credits']:,} credits in {summary['seconds']['total']:.2f}s "
+              f"(rules {summary['seconds']['rules']:.2f}s, stats {summary['seconds']['stats']:.2f}s), "
+              f"{summary['payouts']:,} payouts of {summary['payees']:,} payees, {summary['adjustments']:,} adjustments")
+        with conn.cursor() as cur:
+            cur.execute("SELECT sum(earned_kopecks) FROM royalty_statement_lines WHERE statement_id = %s", (summary['statementId'],))
+            earned = cur.fetchone()[0] or 0
+            cur.execute("SELECT COALESCE(sum(s.revenue * 100), 0)::bigint FROM release_stats_daily s JOIN releases r ON r.id = s.release_id "
+                        "WHERE s.stat_date >= %s AND s.stat_date < %s", (start, end))
+            expected = cur.fetchone()[0]
+            cur.execute("SELECT COALESCE(sum(a.revenue * 100), 0)::bigint FROM royalty_adjustments a JOIN releases r ON r.id = a.release_id "
+                        "WHERE a.statement_id = %s", (summary['statementId'],))
+            expected += cur.fetchone()[0]
+            if not args.keep:
+                for sql in UNDO_STATEMENT_SQL:
+                    cur.execute(sql, {'id': summary['statementId']})
+        conn.commit()
+        print(f'  statement lines add up to the period revenue and adjustments: {earned == expected}')
+        return earned == expected
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the royalty engine on synthetic columns, and optionally a full statement run')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--releases', type=int, default=100_000)
+    parser.add_argument('--tracks-per-release', type=int, default=10)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--block-rows', type=int, default=1_000_000, help='rows per block, as the COPY reader hands them over')
+    parser.add_argument('--check-rows', type=int, default=500_000, help='rows also computed row by row and compared')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', action='store_true', help='also seed a month of stats into BENCH_DATABASE_URL and run its statement')
+    parser.add_argument('--month', default='2020-01', help='month seeded and run with --database')
+    parser.add_argument('--keep', action='store_true', help='keep the statement --database ran instead of undoing it')
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL', '')
+    from run import load_function
+
+    function = load_function('royalties')
+    engine = function.modules['engine']
+    ok = bench_engine(args, engine.Ledger, engine.MIN_PAYOUT_KOPECKS)
+    if args.database:
+        ok = bench_database(args, function.modules['statements']) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
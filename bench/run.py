@@ -0,0 +1,484 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import psycopg2
+import psycopg2.extensions
+
+from seed import BENCH_EMAIL_PATTERN, BENCH_PASSWORD
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+# Differences below these floors are treated as noise when comparing to a baseline
+LATENCY_NOISE_MS = 1.0
+QUERIES_NOISE = 0.05
+
+# Internal endpoints refuse requests without a worker key; the harness configures one and plays the job
+BENCH_WORKER_KEY = 'bench-worker-key'
+WORKER_KEY_VARS = ('STATS_INGEST_KEY', 'DISTRIBUTION_WORKER_KEY', 'ROYALTY_WORKER_KEY')
+
+# Emails of accounts registered by replayed auth tests; BENCH_EMAIL_PATTERN covers them too
+REGISTERED_PREFIX = 'bench-register-'
+
+
+class Function(NamedTuple):
+    name: str
+    handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]
+    modules: Dict[str, Any]
+
+
+class Scenario(NamedTuple):
+    name: str
+    function: str
+    weight: int
+    build: Callable[[random.Random], Dict[str, Any]]
+    expected_status: Optional[int] = None
+
+
+class Sample(NamedTuple):
+    scenario: str
+    seconds: float
+    queries: int
+    ok: bool
+    transaction_seconds: float = 0.0
+
+
+_counter = threading.local()
+_cursor_classes: Dict[type, type] = {}
+
+
+def count_query(round_trips: int = 1) -> None:
+    _counter.queries = getattr(_counter, 'queries', 0) + round_trips
+
+
+def add_transaction_time(seconds: float) -> None:
+    _counter.transaction_seconds = getattr(_counter, 'transaction_seconds', 0.0) + seconds
+
+
+class CountingCursorMixin:
+    def _counted(self, call: Callable[..., Any], *args: Any) -> Any:
+        conn = self.connection
+        # psycopg2 sends BEGIN as its own round trip before the first statement of a transaction
+        opens = not conn.autocommit and conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        count_query(2 if opens else 1)
+        started = time.perf_counter()
+        if opens:
+            conn.transaction_started = started
+        try:
+            return call(*args)
+        finally:
+            if conn.autocommit:
+                add_transaction_time(time.perf_counter() - started)
+
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        return self._counted(super().execute, query, vars)
+
+    def executemany(self, query: Any, vars_list: Any) -> Any:
+        return self._counted(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql: Any, file: Any, size: int = 8192) -> Any:
+        return self._counted(super().copy_expert, sql, file, size)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    '''
+    Wraps whatever cursor_factory the handler asks for so every round trip on the
+    calling thread is counted: statements plus the implicit BEGIN and the COMMIT or
+    ROLLBACK. Time from BEGIN to COMMIT (or a whole autocommit statement) is added
+    up as transaction time, an upper bound on how long row locks were held.
+    '''
+
+    transaction_started = 0.0
+
+    def cursor(self, *args: Any, **kwargs: Any) -> Any:
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        counting = _cursor_classes.get(factory)
+        if counting is None:
+            counting = _cursor_classes[factory] = type(f'Counting{factory.__name__}', (CountingCursorMixin, factory), {})
+        kwargs['cursor_factory'] = counting
+        return super().cursor(*args, **kwargs)
+
+    def _end_transaction(self, end: Callable[[], None]) -> None:
+        open_transaction = self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        try:
+            end()
+        finally:
+            if open_transaction:
+                count_query()
+                add_transaction_time(time.perf_counter() - self.transaction_started)
+
+    def commit(self) -> None:
+        self._end_transaction(super().commit)
+
+    def rollback(self) -> None:
+        self._end_transaction(super().rollback)
+
+
+def install_query_counter() -> None:
+    connect = psycopg2.connect
+
+    def counting_connect(dsn: Optional[str] = None, **kwargs: Any) -> psycopg2.extensions.connection:
+        if kwargs.get('connection_factory') is None:
+            kwargs['connection_factory'] = CountingConnection
+        return connect(dsn, **kwargs)
+
+    psycopg2.connect = counting_connect
+
+
+def load_function(name: str) -> Function:
+    '''
+    Imports backend/<name>/index.py the way the platform does. Every function ships
+    its own db.py/runtime.py/cache.py, so those module names are evicted from
+    sys.modules before and after the import to keep the copies apart.
+    '''
+    directory = BACKEND_DIR / name
+    local = {path.stem for path in directory.glob('*.py')}
+    for module in local:
+        sys.modules.pop(module, None)
+    sys.path.insert(0, str(directory))
+    try:
+        index = importlib.import_module('index')
+        modules = {module: sys.modules[module] for module in local if module in sys.modules}
+    finally:
+        sys.path.remove(str(directory))
+        for module in local:
+            sys.modules.pop(module, None)
+    return Function(name, index.handler, modules)
+
+
+def make_event(method: str, params: Optional[Dict[str, str]] = None, body: Any = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    if body is not None and not isinstance(body, str):
+        body = json.dumps(body, ensure_ascii=False)
+    return {
+        'httpMethod': method,
+        'queryStringParameters': params or {},
+        'headers': {'Content-Type': 'application/json', **(headers or {})},
+        'body': body,
+        'isBase64Encoded': False,
+        'requestContext': {'requestId': uuid.uuid4().hex}
+    }
+
+
+def test_scenarios(function: str) -> List[Scenario]:
+    path = BACKEND_DIR / function / 'tests.json'
+    if not path.exists():
+        return []
+    scenarios = []
+    for test in json.loads(path.read_text(encoding='utf-8'))['tests']:
+        url = urlsplit(test.get('path', '/'))
+        params = dict(parse_qsl(url.query))
+        body = test.get('body')
+
+        # Registering the same email twice is a 400, so after the first (warm-up)
+        # request, which keeps the declared email for the login test, replays get a fresh
+        # one in the seed domain, so seed.py --reset removes them with the bench users
+        if isinstance(body, dict) and body.get('action') == 'register':
+            def build(rng: random.Random, test: Dict[str, Any] = test, params: Dict[str, str] = params, body: Dict[str, Any] = body, calls: List[int] = [0]) -> Dict[str, Any]:
+                calls[0] += 1
+                if calls[0] > 1:
+                    body = dict(body, email=f'{REGISTERED_PREFIX}{uuid.uuid4().hex}@example.com')
+                return make_event(test['method'], params, body, test.get('headers'))
+        else:
+            def build(rng: random.Random, test: Dict[str, Any] = test, params: Dict[str, str] = params, body: Any = body) -> Dict[str, Any]:
+                return make_event(test['method'], params, body, test.get('headers'))
+
+        scenarios.append(Scenario(test['name'], function, 1, build, test.get('expectedStatus')))
+    return scenarios
+
+
+class Catalog(NamedTuple):
+    users: List[Tuple[int, str]]
+    releases: List[Tuple[int, int, Any]]
+    slugs: List[str]
+
+
+def load_catalog(sample_size: int) -> Catalog:
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cur:
+            # Replayed registrations carry the tests.json password, so logins only pick seeded users
+            cur.execute(
+                "SELECT id, email FROM users WHERE email LIKE %s AND email NOT LIKE %s ORDER BY id",
+                (BENCH_EMAIL_PATTERN, REGISTERED_PREFIX + '%')
+            )
+            users = cur.fetchall()
+            cur.execute(
+                """SELECT r.id, r.user_id, r.created_at
+                   FROM releases r JOIN users u ON u.id = r.user_id
+                   WHERE u.email LIKE %s
+                   ORDER BY random() LIMIT %s""",
+                (BENCH_EMAIL_PATTERN, sample_size)
+            )
+            releases = cur.fetchall()
+            cur.execute("SELECT slug FROM smartlinks WHERE slug LIKE 'bench-%%' ORDER BY id LIMIT %s", (sample_size,))
+            slugs = [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+    return Catalog(users, releases, slugs)
+
+
+def synthetic_scenarios(mix: str, catalog: Catalog, functions: Dict[str, Function]) -> List[Scenario]:
+    encode_cursor = functions['releases'].modules['index'].encode_cursor
+    user_ids = [user_id for user_id, _ in catalog.users]
+
+    def user(rng: random.Random) -> str:
+        return str(rng.choice(user_ids))
+
+    def page_after(rng: random.Random) -> Dict[str, Any]:
+        release_id, user_id, created_at = rng.choice(catalog.releases)
+        return make_event('GET', {'userId': str(user_id), 'cursor': encode_cursor(created_at, release_id)})
+
+    if mix == 'browse':
+        return [
+            Scenario('releases first page', 'releases', 50, lambda rng: make_event('GET', {'userId': user(rng)}), 200),
+            Scenario('releases next page', 'releases', 15, page_after, 200),
+            Scenario('releases with tracks', 'releases', 10, lambda rng: make_event('GET', {'userId': user(rng), 'limit': '20', 'include': 'tracks'}), 200),
+            Scenario('releases projection', 'releases', 10, lambda rng: make_event('GET', {'userId': user(rng), 'fields': 'title,status,streams'}), 200),
+            Scenario('analytics dashboard', 'analytics', 10, lambda rng: make_event('GET', {'userId': user(rng)}), 200),
+            Scenario('auth login', 'auth', 5, lambda rng: make_event('POST', body={'action': 'login', 'email': rng.choice(catalog.users)[1], 'password': BENCH_PASSWORD}), 200),
+        ]
+
+    if mix == 'write':
+        def create(rng: random.Random) -> Dict[str, Any]:
+            return make_event('POST', body={'userId': int(user(rng)), 'title': f'Bench {rng.random():.6f}', 'genre': 'Pop'})
+
+        def update(rng: random.Random) -> Dict[str, Any]:
+            release_id, user_id, _ = rng.choice(catalog.releases)
+            return make_event('PUT', body={'userId': user_id, 'releaseId': release_id, 'title': f'Bench Release {rng.random():.6f}'})
+
+        def soft_delete(rng: random.Random) -> Dict[str, Any]:
+            release_id, user_id, _ = rng.choice(catalog.releases)
+            return make_event('DELETE', body={'userId': user_id, 'releaseId': release_id})
+
+        releases_by_user: Dict[int, List[int]] = {}
+        for release_id, user_id, _ in catalog.releases:
+            releases_by_user.setdefault(user_id, []).append(release_id)
+
+        def batch_status(rng: random.Random) -> Dict[str, Any]:
+            user_id = rng.choice(list(releases_by_user))
+            release_ids = releases_by_user[user_id]
+            return make_event('PUT', body={'userId': user_id, 'releaseIds': rng.sample(release_ids, min(50, len(release_ids))), 'status': 'На модерации'})
+
+        def list_after_write(rng: random.Random) -> Dict[str, Any]:
+            _, user_id, _ = rng.choice(catalog.releases)
+            return make_event('GET', {'userId': str(user_id)})
+
+        return [
+            Scenario('releases create', 'releases', 25, create, 200),
+            Scenario('releases update', 'releases', 25, update, 200),
+            Scenario('releases soft delete', 'releases', 5, soft_delete, 200),
+            Scenario('releases batch status', 'releases', 5, batch_status, 200),
+            Scenario('releases list after write', 'releases', 40, list_after_write, 200),
+        ]
+
+    if mix == 'viral':
+        # rng.random() ** 4 concentrates traffic on a few hot links, like a post going viral
+        def hot_slug(rng: random.Random) -> str:
+            return catalog.slugs[int(len(catalog.slugs) * rng.random() ** 4)]
+
+        return [
+            Scenario('smartlink resolve', 'smartlinks', 75, lambda rng: make_event('GET', {'slug': hot_slug(rng)}), 200),
+            Scenario('smartlink redirect', 'smartlinks', 15, lambda rng: make_event('GET', {'slug': hot_slug(rng), 'platform': 'Spotify'}), 302),
+            Scenario('smartlink unknown slug', 'smartlinks', 10, lambda rng: make_event('GET', {'slug': f'missing-{rng.randrange(1000)}'}), 404),
+        ]
+
+    raise ValueError(f'Unknown mix: {mix}')
+
+
+def authorize(event: Dict[str, Any], tokens: Any) -> Dict[str, Any]:
+    '''
+    When session keys are configured the releases function insists on a signed token,
+    so requests that name a userId get one issued for that user. Requests that do not
+    set X-Worker-Key themselves get the bench worker key.
+    '''
+    if not any(name.lower() == 'x-worker-key' for name in event['headers']):
+        event['headers']['X-Worker-Key'] = BENCH_WORKER_KEY
+    if tokens is None or not tokens.ACTIVE_KID:
+        return event
+    user_id = (event['queryStringParameters'] or {}).get('userId')
+    if user_id is None and event.get('body'):
+        try:
+            user_id = json.loads(event['body']).get('userId')
+        except (ValueError, AttributeError):
+            user_id = None
+    if user_id not in (None, ''):
+        event['headers']['X-Auth-Token'] = tokens.issue_token(int(user_id))
+    return event
+
+
+def run(scenarios: List[Scenario], functions: Dict[str, Function], concurrency: int, requests: int, duration: Optional[float], seed: int) -> Tuple[List[Sample], float]:
+    tokens = functions['releases'].modules.get('tokens') if 'releases' in functions else None
+    weights = [scenario.weight for scenario in scenarios]
+    remaining = [requests]
+    lock = threading.Lock()
+    results: List[List[Sample]] = [[] for _ in range(concurrency)]
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker(slot: int) -> None:
+        rng = random.Random(seed + slot)
+        samples = results[slot]
+        while True:
+            with lock:
+                if remaining[0] <= 0 or (deadline and time.monotonic() >= deadline):
+                    return
+                remaining[0] -= 1
+            scenario = rng.choices(scenarios, weights)[0]
+            event = authorize(scenario.build(rng), tokens)
+            _counter.queries = 0
+            _counter.transaction_seconds = 0.0
+            started = time.perf_counter()
+            try:
+                response = functions[scenario.function].handler(event, None)
+                ok = scenario.expected_status is None or response['statusCode'] == scenario.expected_status
+            except Exception:
+                ok = False
+            samples.append(Sample(f'{scenario.function}: {scenario.name}', time.perf_counter() - started, _counter.queries, ok, _counter.transaction_seconds))
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [sample for samples in results for sample in samples], time.monotonic() - started
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples: List[Sample], elapsed: Optional[float] = None) -> Dict[str, float]:
+    latencies = sorted(sample.seconds * 1000 for sample in samples)
+    transactions = sorted(sample.transaction_seconds * 1000 for sample in samples)
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample.ok),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries_per_request': round(sum(sample.queries for sample in samples) / len(samples), 3) if samples else 0.0,
+        'transaction_p95_ms': round(percentile(transactions, 95), 3),
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(samples) / elapsed, 1)
+    return summary
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance) and current['p95_ms'] - previous['p95_ms'] > LATENCY_NOISE_MS:
+            regressions.append(f"{key}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if (current['transaction_p95_ms'] > previous.get('transaction_p95_ms', float('inf')) * (1 + tolerance)
+                and current['transaction_p95_ms'] - previous['transaction_p95_ms'] > LATENCY_NOISE_MS):
+            regressions.append(f"{key}: transaction p95 {previous['transaction_p95_ms']}ms -> {current['transaction_p95_ms']}ms")
+        if current['queries_per_request'] - previous['queries_per_request'] > QUERIES_NOISE:
+            regressions.append(f"{key}: queries/request {previous['queries_per_request']} -> {current['queries_per_request']}")
+        if 'throughput_rps' in previous and current.get('throughput_rps', 0) < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {previous['throughput_rps']} -> {current.get('throughput_rps')} rps")
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{key}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'scenario':64s} {'reqs':>6s} {'err':>4s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'q/req':>6s} {'txn95':>8s}")
+    for key, row in results.items():
+        rps = f"{row['throughput_rps']:.1f}" if 'throughput_rps' in row else ''
+        print(f"{key:64s} {row['requests']:6d} {row['errors']:4d} {rps:>8s} "
+              f"{row['p50_ms']:8.2f} {row['p95_ms']:8.2f} {row['p99_ms']:8.2f} {row['queries_per_request']:6.2f} "
+              f"{row.get('transaction_p95_ms', 0.0):8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay tests.json and synthetic mixes against the handlers in-process')
+    parser.add_argument('--functions', default='auth,releases,analytics,stats-ingest,ai-chat,smartlinks,distribution,media,royalties', help='functions whose tests.json is replayed')
+    parser.add_argument('--mix', default='tests,browse,write,viral', help='comma-separated: tests, browse, write, viral')
+    parser.add_argument('--concurrency', default='1,8', help='comma-separated worker counts')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per mix and concurrency level')
+    parser.add_argument('--duration', type=float, help='stop each run after this many seconds')
+    parser.add_argument('--sample', type=int, default=5000, help='seeded releases sampled for synthetic requests')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write results to --baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative p95/throughput change')
+    parser.add_argument('--allow-llm', action='store_true', help='keep OPENAI_API_KEY so ai-chat calls the real API')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('BENCH_DATABASE_URL')
+    if not database_url:
+        sys.exit('Set BENCH_DATABASE_URL to a database seeded with bench/seed.py')
+    os.environ['DATABASE_URL'] = database_url
+    for var in WORKER_KEY_VARS:
+        os.environ[var] = BENCH_WORKER_KEY
+    if not args.allow_llm:
+        os.environ.pop('OPENAI_API_KEY', None)
+
+    install_query_counter()
+    mixes = [mix for mix in args.mix.split(',') if mix]
+    names = [name for name in args.functions.split(',') if name]
+    if any(mix != 'tests' for mix in mixes):
+        names = list(dict.fromkeys(names + ['releases', 'analytics', 'auth', 'smartlinks']))
+    functions = {name: load_function(name) for name in names}
+
+    catalog = None
+    results: Dict[str, Dict[str, float]] = {}
+    for mix in mixes:
+        if mix == 'tests':
+            scenarios = [scenario for name in args.functions.split(',') if name for scenario in test_scenarios(name)]
+        else:
+            catalog = catalog or load_catalog(args.sample)
+            if not catalog.users or not catalog.releases:
+                sys.exit('No bench data found; run bench/seed.py first')
+            scenarios = synthetic_scenarios(mix, catalog, functions)
+
+        # One untimed pass in declaration order warms pools and caches
+        tokens = functions['releases'].modules.get('tokens') if 'releases' in functions else None
+        for scenario in scenarios:
+            functions[scenario.function].handler(authorize(scenario.build(random.Random(args.seed)), tokens), None)
+
+        for concurrency in (int(level) for level in args.concurrency.split(',')):
+            samples, elapsed = run(scenarios, functions, concurrency, args.requests, args.duration, args.seed)
+            key = f'{mix}/c{concurrency}'
+            results[key] = summarize(samples, elapsed)
+            for scenario in scenarios:
+                label = f'{scenario.function}: {scenario.name}'
+                own = [sample for sample in samples if sample.scenario == label]
+                if own:
+                    results[f'{key}/{label}'] = summarize(own)
+
+    print_table(results)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+        print(f'\nBaseline written to {args.baseline}')
+        return
+
+    if args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding='utf-8')), args.tolerance)
+        if regressions:
+            print('\nRegressions against baseline:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f'\nNo regressions against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+BENCH_EMAIL_PATTERN = 'bench-%@example.com'
+BENCH_PASSWORD = 'bench-password'
+GENRES = ('Pop', 'Hip-Hop', 'Rock', 'Electronic', 'R&B', 'Indie', 'Jazz')
+STATUSES = ('Опубликован', 'Опубликован', 'Опубликован', 'На модерации', 'Черновик')
+
+USERS_SQL = """
+    INSERT INTO users (email, password_hash, artist_name)
+    SELECT 'bench-' || n || '@example.com', %(password_hash)s, 'Bench Artist ' || n
+    FROM generate_series(1, %(users)s) AS n
+    ON CONFLICT (email) DO NOTHING
+"""
+
+# Release counts per artist are skewed (power(random(), 3)) so a few accounts
+# own large catalogs, which is what the pagination and cache paths care about
+RELEASES_SQL = """
+    INSERT INTO releases
+        (user_id, title, genre, release_date, description, music_author, lyrics_author,
+         status, streams, revenue, created_at, updated_at)
+    SELECT
+        ids[1 + floor(power(random(), 3) * cardinality(ids))::int],
+        'Bench Release ' || g.n,
+        (%(genres)s::text[])[1 + floor(random() * cardinality(%(genres)s::text[]))::int],
+        DATE '2020-01-01' + floor(random() * 2000)::int,
+        'Synthetic release for load tests',
+        'Bench Author',
+        'Bench Author',
+        (%(statuses)s::text[])[1 + floor(random() * cardinality(%(statuses)s::text[]))::int],
+        floor(power(random(), 4) * 1000000)::int,
+        round((power(random(), 4) * 5000)::numeric, 2),
+        g.ts,
+        g.ts
+    FROM (SELECT array_agg(id) AS ids FROM users WHERE email LIKE %(pattern)s) AS bench,
+         (SELECT n, TIMESTAMP '2020-01-01' + random() * INTERVAL '2000 days' AS ts
+          FROM generate_series(1, %(releases)s) AS n) AS g
+"""
+
+TRACKS_SQL = """
+    INSERT INTO release_tracks
+        (release_id, title, lyrics_author, music_author, producer, isrc,
+         has_explicit_content, track_order, created_at)
+    SELECT
+        r.id,
+        'Track ' || t,
+        'Bench Author',
+        'Bench Author',
+        'Bench Producer',
+        'RUBEN' || to_char(r.id, 'FM00000000') || to_char(t, 'FM00'),
+        random() < 0.1,
+        t,
+        r.created_at
+    FROM releases r
+    JOIN users u ON u.id = r.user_id
+    CROSS JOIN generate_series(1, %(per_release)s) AS t
+    WHERE u.email LIKE %(pattern)s
+"""
+
+SMARTLINKS_SQL = """
+    INSERT INTO smartlinks (user_id, release_name, artist_name, cover_url, platforms, archived, slug, created_at)
+    SELECT
+        r.user_id,
+        r.title,
+        u.artist_name,
+        NULL,
+        json_build_array(
+            json_build_object('name', 'Spotify', 'url', 'https://open.spotify.com/album/bench' || r.id),
+            json_build_object('name', 'Apple Music', 'url', 'https://music.apple.com/album/bench' || r.id),
+            json_build_object('name', 'VK Музыка', 'url', 'https://vk.com/music/album/bench' || r.id),
+            json_build_object('name', 'Яндекс Музыка', 'url', 'https://music.yandex.ru/album/bench' || r.id)
+        )::jsonb,
+        false,
+        'bench-' || r.id,
+        r.created_at
+    FROM releases r
+    JOIN users u ON u.id = r.user_id
+    WHERE u.email LIKE %(pattern)s
+    ORDER BY r.id
+    LIMIT %(smartlinks)s
+"""
+
+RESET_SQL = (
+    "DELETE FROM smartlinks WHERE user_id IN (SELECT id FROM users WHERE email LIKE %(pattern)s)",
+    """DELETE FROM release_tracks WHERE release_id IN (
+           SELECT r.id FROM releases r JOIN users u ON u.id = r.user_id WHERE u.email LIKE %(pattern)s)""",
+    "DELETE FROM releases WHERE user_id IN (SELECT id FROM users WHERE email LIKE %(pattern)s)",
+    "DELETE FROM users WHERE email LIKE %(pattern)s",
+)
+
+
+def seed(conn: psycopg2.extensions.connection, users: int, releases: int, tracks: int, smartlinks: int, seed_value: float) -> None:
+    params = {
+        'pattern': BENCH_EMAIL_PATTERN,
+        'password_hash': hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest(),
+        'genres': list(GENRES),
+        'statuses': list(STATUSES),
+        'users': users,
+        'releases': releases,
+        'per_release': max(1, tracks // max(1, releases)),
+        'smartlinks': smartlinks,
+    }
+    with conn.cursor() as cur:
+        cur.execute('SELECT setseed(%s)', (seed_value,))
+        for label, sql in (
+            ('users', USERS_SQL), ('releases', RELEASES_SQL), ('tracks', TRACKS_SQL), ('smartlinks', SMARTLINKS_SQL)
+        ):
+            started = time.monotonic()
+            cur.execute(sql, params)
+            print(f'{label:9s} {cur.rowcount:>9d} rows in {time.monotonic() - started:.1f}s', file=sys.stderr)
+    conn.commit()
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute('ANALYZE users, releases, release_tracks, smartlinks')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Seed a local Postgres with a synthetic catalog for bench/run.py')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--releases', type=int, default=100000)
+    parser.add_argument('--tracks', type=int, default=1000000)
+    parser.add_argument('--smartlinks', type=int, default=10000)
+    parser.add_argument('--seed', type=float, default=0.42, help='Postgres setseed() value')
+    parser.add_argument('--reset', action='store_true', help='delete previously seeded bench data first')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('BENCH_DATABASE_URL')
+    if not database_url:
+        sys.exit('Set BENCH_DATABASE_URL to a local database; the seeder never reads DATABASE_URL')
+
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cur:
+            if args.reset:
+                for sql in RESET_SQL:
+                    cur.execute(sql, {'pattern': BENCH_EMAIL_PATTERN})
+                conn.commit()
+            cur.execute('SELECT count(*) FROM users WHERE email LIKE %s', (BENCH_EMAIL_PATTERN,))
+            if cur.fetchone()[0]:
+                sys.exit('Bench data already present; pass --reset to reseed')
+        seed(conn, args.users, args.releases, args.tracks, args.smartlinks, args.seed)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+CREATE TABLE IF NOT EXISTS stats_ingest_batches (
+    id SERIAL PRIMARY KEY,
+    report_name VARCHAR(500) NOT NULL,
+    report_sha256 VARCHAR(64),
+    rows_read INTEGER DEFAULT 0,
+    rows_loaded INTEGER DEFAULT 0,
+    rows_unmatched INTEGER DEFAULT 0,
+    releases_updated INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS release_stats_daily (
+    stat_date DATE NOT NULL,
+    platform VARCHAR(100) NOT NULL,
+    isrc VARCHAR(50) NOT NULL,
+    release_id INTEGER NOT NULL,
+    streams BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    batch_id INTEGER,
+    PRIMARY KEY (stat_date, platform, isrc)
+) PARTITION BY RANGE (stat_date);
+
+CREATE INDEX IF NOT EXISTS idx_release_stats_daily_release ON release_stats_daily (release_id, stat_date);
+CREATE INDEX IF NOT EXISTS idx_release_tracks_isrc ON release_tracks (isrc);
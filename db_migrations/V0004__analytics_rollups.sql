@@ -0,0 +1,33 @@
+CREATE TABLE IF NOT EXISTS analytics_user_daily (
+    user_id INTEGER NOT NULL,
+    stat_date DATE NOT NULL,
+    platform VARCHAR(100) NOT NULL,
+    streams BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, stat_date, platform)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_release_daily (
+    user_id INTEGER NOT NULL,
+    stat_date DATE NOT NULL,
+    release_id INTEGER NOT NULL,
+    streams BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (release_id, stat_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_analytics_release_daily_user ON analytics_release_daily (user_id, stat_date);
+
+INSERT INTO analytics_user_daily (user_id, stat_date, platform, streams, revenue)
+SELECT r.user_id, d.stat_date, d.platform, sum(d.streams), sum(d.revenue)
+FROM release_stats_daily d
+JOIN releases r ON r.id = d.release_id
+GROUP BY r.user_id, d.stat_date, d.platform
+ON CONFLICT DO NOTHING;
+
+INSERT INTO analytics_release_daily (user_id, stat_date, release_id, streams, revenue)
+SELECT r.user_id, d.stat_date, d.release_id, sum(d.streams), sum(d.revenue)
+FROM release_stats_daily d
+JOIN releases r ON r.id = d.release_id
+GROUP BY r.user_id, d.stat_date, d.release_id
+ON CONFLICT DO NOTHING;
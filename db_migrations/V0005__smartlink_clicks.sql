@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS smartlink_clicks (
+    smartlink_id INTEGER NOT NULL,
+    click_date DATE NOT NULL,
+    platform VARCHAR(100) NOT NULL DEFAULT '',
+    clicks BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (smartlink_id, click_date, platform)
+);
+
+COMMENT ON COLUMN smartlink_clicks.platform IS 'Redirect target platform; empty string counts page views';
@@ -0,0 +1,19 @@
+-- Listing: WHERE user_id = ? ORDER BY created_at DESC, id DESC with keyset cursor.
+-- INCLUDE lets the count/max(updated_at) version probe run as an index-only scan.
+CREATE INDEX IF NOT EXISTS idx_releases_user_created
+    ON releases (user_id, created_at DESC, id DESC) INCLUDE (updated_at, status);
+
+-- scope=active listings skip soft-deleted releases without visiting them
+CREATE INDEX IF NOT EXISTS idx_releases_user_active
+    ON releases (user_id, created_at DESC, id DESC) INCLUDE (updated_at)
+    WHERE status <> 'Удалён';
+
+-- include=tracks lateral join and permanent delete; rows come out in track order
+CREATE INDEX IF NOT EXISTS idx_release_tracks_release
+    ON release_tracks (release_id, track_order, id);
+
+-- Leading column of idx_releases_user_created; dropping it saves a write per insert
+DROP INDEX IF EXISTS idx_releases_user_id;
+
+ANALYZE releases;
+ANALYZE release_tracks;
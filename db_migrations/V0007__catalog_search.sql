@@ -0,0 +1,25 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 'simple' config: catalog text mixes Russian and English and names must not be stemmed.
+-- Generated columns keep the vectors current on every INSERT/UPDATE without triggers.
+ALTER TABLE releases ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(music_author, '') || ' ' || coalesce(lyrics_author, '')), 'B')
+    ) STORED;
+
+ALTER TABLE release_tracks ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(isrc, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(lyrics_text, '')), 'D')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_releases_search ON releases USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_release_tracks_search ON release_tracks USING gin (search_vector);
+
+-- Typo-tolerant fallback (word_similarity via <%) on titles
+CREATE INDEX IF NOT EXISTS idx_releases_title_trgm ON releases USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_release_tracks_title_trgm ON release_tracks USING gin (title gin_trgm_ops);
+
+ANALYZE releases;
+ANALYZE release_tracks;
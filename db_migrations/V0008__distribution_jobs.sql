@@ -0,0 +1,21 @@
+-- One row per (release, platform) delivery; workers claim rows with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS distribution_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    release_id INTEGER NOT NULL,
+    platform VARCHAR(100) NOT NULL,
+    idempotency_key VARCHAR(200) NOT NULL UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 8,
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_until TIMESTAMP,
+    external_id VARCHAR(200),
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Claim path: due queued jobs, and running jobs whose worker lease expired
+CREATE INDEX IF NOT EXISTS idx_distribution_jobs_due ON distribution_jobs (run_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_distribution_jobs_lease ON distribution_jobs (locked_until) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_distribution_jobs_release ON distribution_jobs (release_id, platform);
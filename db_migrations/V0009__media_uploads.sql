@@ -0,0 +1,43 @@
+-- Stored files, addressed by content: the same bytes uploaded twice are kept and analysed once
+CREATE TABLE IF NOT EXISTS media_objects (
+    sha256 CHAR(64) PRIMARY KEY,
+    md5 CHAR(32) NOT NULL,
+    kind VARCHAR(10) NOT NULL,
+    storage_key VARCHAR(300) NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    format VARCHAR(20) NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    thumbnail_key VARCHAR(300),
+    duration_seconds NUMERIC(10, 3),
+    sample_rate INTEGER,
+    channels SMALLINT,
+    bits_per_sample SMALLINT,
+    rms_dbfs NUMERIC(6, 2),
+    peak_dbfs NUMERIC(6, 2),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Resumable chunked uploads: received_bytes is the offset the next chunk must start at
+CREATE TABLE IF NOT EXISTS media_uploads (
+    id UUID PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    release_id INTEGER NOT NULL,
+    track_id INTEGER,
+    kind VARCHAR(10) NOT NULL,
+    file_name VARCHAR(500) NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    received_bytes BIGINT NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'uploading',
+    sha256 CHAR(64),
+    error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_uploads_release ON media_uploads (release_id);
+CREATE INDEX IF NOT EXISTS idx_media_uploads_sha256 ON media_uploads (sha256, user_id) WHERE sha256 IS NOT NULL;
+
+ALTER TABLE releases ADD COLUMN IF NOT EXISTS cover_sha256 CHAR(64);
+ALTER TABLE releases ADD COLUMN IF NOT EXISTS audio_sha256 CHAR(64);
+ALTER TABLE release_tracks ADD COLUMN IF NOT EXISTS audio_sha256 CHAR(64);
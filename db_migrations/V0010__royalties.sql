@@ -0,0 +1,35 @@
+-- Everyone a release's revenue is paid to: the account itself (name '') and the contributors
+-- credited on its tracks. balance_kopecks is what was earned but not yet paid out.
+CREATE TABLE IF NOT EXISTS royalty_payees (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    balance_kopecks BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_royalty_payees_name ON royalty_payees (user_id, lower(name));
+
+-- One statement per calendar month; balances carry forward, so months run once and in order
+CREATE TABLE IF NOT EXISTS royalty_statements (
+    id SERIAL PRIMARY KEY,
+    period_start DATE NOT NULL UNIQUE,
+    period_end DATE NOT NULL,
+    rows_read BIGINT NOT NULL,
+    revenue_kopecks BIGINT NOT NULL,
+    unmatched_kopecks BIGINT NOT NULL,
+    paid_kopecks BIGINT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS royalty_statement_lines (
+    statement_id INTEGER NOT NULL,
+    payee_id INTEGER NOT NULL,
+    opening_kopecks BIGINT NOT NULL,
+    earned_kopecks BIGINT NOT NULL,
+    paid_kopecks BIGINT NOT NULL,
+    closing_kopecks BIGINT NOT NULL,
+    PRIMARY KEY (statement_id, payee_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_royalty_statement_lines_payee ON royalty_statement_lines (payee_id, statement_id);
@@ -0,0 +1,9 @@
+-- Single row bumped as the last write of every report ingest. The row lock orders the bumps
+-- by commit, so a reader that sees version N also sees every ingest up to N, unlike max(batch id)
+CREATE TABLE IF NOT EXISTS stats_watermark (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO stats_watermark (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
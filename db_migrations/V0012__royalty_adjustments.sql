@@ -0,0 +1,16 @@
+-- Revenue changes to months a statement already settled (late reports, restatements). Stats
+-- ingestion records the difference it made to each row; the next statement pays the ones
+-- still open and stamps them with its id
+CREATE TABLE IF NOT EXISTS royalty_adjustments (
+    id BIGSERIAL PRIMARY KEY,
+    batch_id INTEGER NOT NULL,
+    stat_date DATE NOT NULL,
+    platform VARCHAR(100) NOT NULL,
+    isrc VARCHAR(50) NOT NULL,
+    release_id INTEGER NOT NULL,
+    revenue DECIMAL(14, 2) NOT NULL,
+    statement_id INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_royalty_adjustments_open ON royalty_adjustments (release_id) WHERE statement_id IS NULL;
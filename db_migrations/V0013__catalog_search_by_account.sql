@@ -0,0 +1,12 @@
+-- Catalog search always filters by account. Keying the search indexes on user_id first
+-- hands back only the account's matches, instead of every title in the catalog that
+-- shares trigrams or a frequent word and then filtering by owner
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE INDEX IF NOT EXISTS idx_releases_user_search ON releases USING gin (user_id, search_vector);
+CREATE INDEX IF NOT EXISTS idx_releases_user_title_trgm ON releases USING gin (user_id, title gin_trgm_ops);
+
+DROP INDEX IF EXISTS idx_releases_search;
+DROP INDEX IF EXISTS idx_releases_title_trgm;
+
+ANALYZE releases;
@@ -22,6 +22,7 @@ interface User {
   id: number;
   artistName: string;
   email: string;
+  token?: string;
 }
 
 interface Track {
@@ -66,6 +67,9 @@ interface SmartLink {
 
 const DRAFT_STORAGE_KEY = 'olprod_release_draft';
 
+const authHeaders = (user: User): Record<string, string> =>
+  user.token ? { 'X-Auth-Token': user.token } : {};
+
 const Index = () => {
   const [activeSection, setActiveSection] = useState('home');
   const [dashboardTab, setDashboardTab] = useState('releases');
@@ -247,9 +251,18 @@ const Index = () => {
     if (!user) return;
     
     try {
-      const response = await fetch(`${API_RELEASES}?userId=${user.id}`);
-      const data = await response.json();
-      setReleases(data.releases || []);
+      const loaded: Release[] = [];
+      let cursor: string | null = null;
+      do {
+        const query = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+        const response = await fetch(`${API_RELEASES}?userId=${user.id}&limit=500${query}`, {
+          headers: authHeaders(user)
+        });
+        const data = await response.json();
+        loaded.push(...(data.releases || []));
+        cursor = data.nextCursor || null;
+      } while (cursor);
+      setReleases(loaded);
     } catch (error) {
       console.error('Error loading releases:', error);
     }
@@ -271,7 +284,7 @@ const Index = () => {
       const data = await response.json();
 
       if (response.ok && data.success) {
-        setUser(data.user);
+        setUser({ ...data.user, token: data.token || undefined });
         setIsAuthOpen(false);
         toast({ title: 'Успешно!', description: 'Вы вошли в систему' });
       } else {
@@ -303,7 +316,7 @@ const Index = () => {
       const data = await response.json();
 
       if (response.ok && data.success) {
-        setUser(data.user);
+        setUser({ ...data.user, token: data.token || undefined });
         setIsAuthOpen(false);
         toast({ title: 'Успешно!', description: `Добро пожаловать, ${regArtistName}!` });
       } else {
@@ -465,7 +478,7 @@ const Index = () => {
     try {
       const response = await fetch(API_RELEASES, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders(user) },
         body: JSON.stringify({
           userId: user.id,
           ...newRelease,
@@ -520,7 +533,7 @@ const Index = () => {
     try {
       const response = await fetch(API_RELEASES, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders(user) },
         body: JSON.stringify({
           userId: user.id,
           releaseId: releaseId,